@@ -0,0 +1,62 @@
+"""@package async_food2fork_client
+This package includes the asyncio Food2Fork API Client
+"""
+import asyncio
+
+from api.async_rest_client import AsyncRESTClient
+from api.food2fork_client import Food2ForkClient
+
+class AsyncFood2ForkClient(AsyncRESTClient, Food2ForkClient):
+    """
+    This class provides coroutine versions of the Food2ForkClient requests with the same (status, dict) results.
+    Requests made from many tasks overlap on one thread, bounded by MAX_CONCURRENCY.
+
+    Usage:
+        client = AsyncFood2ForkClient()
+        status, obj_data = await client.api_get_recipe('035865')
+    """
+    def __init__(self, max_concurrency=None, api_domain=None, use_ssl=None):
+        """
+        Constructor function
+
+        :param max_concurrency: (Optional)
+            see AsyncRESTClient
+        :param api_domain, use_ssl: (Optional)
+            see Food2ForkClient
+        """
+        super(AsyncFood2ForkClient, self).__init__(max_concurrency, use_ssl)
+        self._api_domain = api_domain or Food2ForkClient.API_DOMAIN
+
+    async def api_search(self, q=None, sort=None, page=None):
+        """
+        Coroutine version of Food2ForkClient.api_search
+
+        :return:
+            response status, response dict
+        """
+        return await self._do_async_url_encoded_post(self._api_domain,
+                                                     Food2ForkClient.API_SEARCH_URL,
+                                                     self._search_params(q, sort, page))
+
+    async def api_get_recipe(self, rId):
+        """
+        Coroutine version of Food2ForkClient.api_get_recipe
+
+        :return:
+            response status, response dict
+        """
+        return await self._do_async_url_encoded_post(self._api_domain,
+                                                     Food2ForkClient.API_GET_RECIPE_URL,
+                                                     self._get_recipe_params(rId))
+
+    async def api_get_recipes(self, rIds):
+        """
+        Retrieves many recipes concurrently
+
+        :param rIds:
+            The recipe identifiers
+
+        :return:
+            list of (response status, response dict), in the same order as rIds
+        """
+        return list(await asyncio.gather(*[self.api_get_recipe(rId) for rId in rIds]))
@@ -0,0 +1,172 @@
+"""@package async_rest_client
+This package includes an asyncio REST client
+"""
+import asyncio
+import ssl
+import time
+import urllib.parse
+import zlib
+
+from api.rest_client import BasicRESTClient
+from telemetry.metrics import METRICS
+
+class AsyncRESTClient(BasicRESTClient):
+    """
+    This class extends BasicRESTClient with coroutine requests built on asyncio streams, so many requests can overlap on one thread.
+    At most MAX_CONCURRENCY requests are in flight at once, the rest wait on a semaphore.
+    """
+    MAX_CONCURRENCY = 10
+
+    def __init__(self, max_concurrency=None, use_ssl=None):
+        """
+        Constructor function
+
+        :param max_concurrency: (Optional)
+            The maximum number of requests in flight, MAX_CONCURRENCY by default
+        :param use_ssl: (Optional)
+            see BasicRESTClient
+        """
+        super(AsyncRESTClient, self).__init__(use_ssl=use_ssl)
+        self._max_concurrency = max_concurrency or AsyncRESTClient.MAX_CONCURRENCY
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._ssl_context = ssl.create_default_context() if self._use_ssl else None
+
+    def _get_semaphore(self):
+        """
+        Accessor function for self._semaphore
+        asyncio primitives belong to one event loop, so a new semaphore is created if the client is used from another loop
+
+        :return:
+            asyncio.Semaphore
+        """
+        loop = asyncio.get_running_loop()
+        if self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+            self._semaphore_loop = loop
+        return self._semaphore
+
+    def _split_host(self, api_domain):
+        """
+        This function splits an optional port off the domain, like http.client does
+
+        :param api_domain:
+            the domain of the request (e.g. www.google.com or localhost:8080)
+
+        :return:
+            host, port
+        """
+        host, sep, port = api_domain.rpartition(':')
+        if sep and port.isdigit():
+            return host, int(port)
+        return api_domain, 443 if self._use_ssl else 80
+
+    async def _read_body(self, reader, headers):
+        """
+        This function reads a response body, chunked or not
+
+        :param reader:
+            asyncio.StreamReader positioned after the response headers
+        :param headers:
+            dict of response headers (lowercase names)
+
+        :return:
+            the body bytes
+
+        Exceptions:
+            raises asyncio.IncompleteReadError if the connection was closed before the end of the body
+            raises ValueError if a chunk size or the Content-Length is malformed
+        """
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            body = bytearray()
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    return bytes(body)
+                body += await reader.readexactly(size)
+                await reader.readline()
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length']))
+        return await reader.read()
+
+    async def _async_request(self, api_domain, method, api_url, body, headers):
+        """
+        This function sends one request on a new connection and reads the whole response
+
+        :return:
+            response status, response reason, body bytes (-1, None, b'' if the status line is missing or malformed, or the
+            body is cut off or malformed)
+        """
+        host, port = self._split_host(api_domain)
+        reader, writer = await asyncio.open_connection(host, port, ssl=self._ssl_context,
+                                                       server_hostname=host if self._ssl_context else None)
+        try:
+            request_lines = ["%s %s HTTP/1.1" % (method, api_url), "Host: %s" % (api_domain,), "Connection: close",
+                             "Content-Length: %s" % (len(body),)]
+            request_lines += ["%s: %s" % (name, value,) for name, value in headers.items()]
+            writer.write(("\r\n".join(request_lines) + "\r\n\r\n").encode('latin-1') + body)
+            await writer.drain()
+            status_line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+            version, _, status_reason = status_line.partition(' ')
+            status, _, reason = status_reason.partition(' ')
+            if not version.startswith('HTTP/') or len(status) != 3 or not status.isdigit():
+                # The server closed the connection without answering, or didn't answer HTTP
+                return -1, None, b''
+            response_headers = {}
+            while True:
+                line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+                if line == '':
+                    break
+                name, _, value = line.partition(':')
+                response_headers[name.strip().lower()] = value.strip()
+            try:
+                data = await self._read_body(reader, response_headers)
+            except (asyncio.IncompleteReadError, ValueError):
+                return -1, None, b''
+            decompressor = self._decompressor(response_headers.get('content-encoding'))
+            if decompressor:
+                data = decompressor.decompress(data) + self._flush_decompressor(decompressor)
+            return int(status), reason, data
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def _do_async_url_encoded_post(self, api_domain, api_url, api_url_params):
+        """
+        Coroutine version of BasicRESTClient._do_url_encoded_post
+
+        :param api_domain:
+            the domain of the request (e.g. www.google.com)
+
+        :param api_url:
+            the endpoint path (e.g. /api/endpoint)
+
+        :param api_url_params:
+            a dictionary of URL parameters to be encoded
+
+        :return:
+            response status, response dict
+
+        Exceptions:
+            raises asyncio.TimeoutError if the request takes longer than REQUEST_TIMEOUT
+            raises OSError if the connection fails
+        """
+        body = urllib.parse.urlencode(api_url_params).encode('ascii')
+        start = time.perf_counter()
+        async with self._get_semaphore():
+            try:
+                status, reason, data = await asyncio.wait_for(self._async_request(api_domain, "POST", api_url, body,
+                                                                                  self._post_headers()),
+                                                              AsyncRESTClient.REQUEST_TIMEOUT)
+            except zlib.error:
+                status, reason, data = -1, None, None
+        # Coroutines interleave on one thread, so they are timed without nesting spans
+        METRICS.observe('rest_request_seconds', time.perf_counter() - start, domain=api_domain, url=api_url, status=status,
+                        mode='async')
+        if status != 200:
+            return status, reason
+        return self._safe_json_decode(data)
@@ -0,0 +1,121 @@
+"""@package caching_food2fork_client
+This package includes the caching Food2Fork API Client
+"""
+from api.food2fork_client import Food2ForkClient
+from api.response_cache import ResponseCache
+
+class CachingFood2ForkClient(Food2ForkClient):
+    """
+    This class serves repeated Food2Fork requests from a ResponseCache instead of the live API.
+
+    Recipes are cached by rId for RECIPE_TTL seconds, searches by their normalized (q, sort, page) for SEARCH_TTL seconds.
+    Keys start with the scheme and api domain, so responses of another server (e.g. a stand-in) sharing the cache file are
+    never served for Food2Fork's.
+    Only successful responses with a payload are cached (a 'recipes' list for searches, a 'recipe' dict for recipes), errors
+    always go back to the API next time, including the ones Food2Fork returns with a 200 status, e.g. {"error": "limit"}.
+    """
+    CACHE_PATH = './food2fork_cache.sqlite'
+    RECIPE_TTL = 7 * 24 * 60 * 60
+    SEARCH_TTL = 24 * 60 * 60
+
+    def __init__(self, cache=None, api_domain=None, use_ssl=None):
+        """
+        Constructor function
+
+        :param cache: (Optional)
+            The ResponseCache to use, one backed by CACHE_PATH by default
+        :param api_domain, use_ssl: (Optional)
+            see Food2ForkClient
+
+        Exceptions:
+            see Food2ForkClient
+        """
+        super(CachingFood2ForkClient, self).__init__(api_domain, use_ssl)
+        self._cache = cache if cache is not None else ResponseCache(CachingFood2ForkClient.CACHE_PATH)
+
+    def _key_prefix(self):
+        """
+        :return:
+            the start of every cache key, the scheme and api domain (e.g. 'https://food2fork.com/')
+        """
+        return '%s://%s/' % ('https' if self._use_ssl else 'http', self._api_domain,)
+
+    def _search_key(self, q=None, sort=None, page=None, max_recipes=None):
+        """
+        This function normalizes the search parameters into a cache key.
+        The ingredient order, case and duplicates don't change the results, so they don't change the key either.
+        Truncated (max_recipes) results are kept apart from full pages
+
+        :return:
+            cache key
+        """
+        ingredients = sorted(set(x.strip().lower() for x in (q or '').split(',') if x.strip() != ''))
+        key = '%ssearch:%s|%s|%s' % (self._key_prefix(), ','.join(ingredients), (sort or '').lower(), page or 1,)
+        if max_recipes is not None:
+            key += '|first:%s' % (max_recipes,)
+        return key
+
+    def _recipe_key(self, rId):
+        """
+        :return:
+            cache key of a recipe
+        """
+        return '%srecipe:%s' % (self._key_prefix(), rId,)
+
+    def _cached_request(self, key, ttl, request, payload_key, payload_type):
+        """
+        This function serves a request from the cache or performs it and caches the response if it was successful
+
+        :param key:
+            The cache key
+        :param ttl:
+            Seconds until a cached response expires
+        :param request:
+            Callable performing the request, returning response status, response dict
+        :param payload_key:
+            The member a successful response has, e.g. 'recipes'
+        :param payload_type:
+            The type of that member, e.g. list
+
+        :return:
+            response status, response dict
+        """
+        obj_data = self._cache.get(key)
+        if obj_data is not None:
+            return 200, obj_data
+        resp_status, obj_data = request()
+        if resp_status == 200 and isinstance(obj_data, dict) and isinstance(obj_data.get(payload_key), payload_type):
+            self._cache.put(key, obj_data, ttl)
+        return resp_status, obj_data
+
+    def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+        """
+        Cached version of Food2ForkClient.api_search
+        """
+        return self._cached_request(self._search_key(q, sort, page, max_recipes),
+                                    CachingFood2ForkClient.SEARCH_TTL,
+                                    lambda: super(CachingFood2ForkClient, self).api_search(q, sort, page, max_recipes),
+                                    'recipes', list)
+
+    def api_get_recipe(self, rId):
+        """
+        Cached version of Food2ForkClient.api_get_recipe
+        """
+        return self._cached_request(self._recipe_key(rId),
+                                    CachingFood2ForkClient.RECIPE_TTL,
+                                    lambda: super(CachingFood2ForkClient, self).api_get_recipe(rId),
+                                    'recipe', dict)
+
+    def cache_stats(self):
+        """
+        :return:
+            dict with the response cache counters, see ResponseCache.stats()
+        """
+        return self._cache.stats()
+
+    def close(self):
+        """
+        Closes the pooled connections and the response cache
+        """
+        super(CachingFood2ForkClient, self).close()
+        self._cache.close()
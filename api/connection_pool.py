@@ -0,0 +1,99 @@
+"""@package connection_pool
+This package includes a keep-alive connection pool for http.client
+"""
+import http.client
+import threading
+import time
+
+class ConnectionPool:
+    """
+    This class keeps idle http.client connections open per host, so consecutive requests to the same host
+    don't pay DNS, TCP and TLS setup again.
+
+    At most MAX_IDLE_PER_HOST idle connections are kept per host, and connections that have been idle for more than
+    IDLE_TIMEOUT seconds are closed instead of being reused.
+    """
+    MAX_IDLE_PER_HOST = 4
+    IDLE_TIMEOUT = 30.0
+
+    def __init__(self, connection_factory=http.client.HTTPSConnection, max_idle_per_host=None, idle_timeout=None):
+        """
+        Constructor function
+
+        :param connection_factory: (Optional)
+            The callable that creates a connection to a host, http.client.HTTPSConnection by default
+        :param max_idle_per_host: (Optional)
+            The maximum number of idle connections kept per host, MAX_IDLE_PER_HOST by default
+        :param idle_timeout: (Optional)
+            Seconds an idle connection can be reused for, IDLE_TIMEOUT by default
+        """
+        self._connection_factory = connection_factory
+        self._max_idle_per_host = max_idle_per_host if max_idle_per_host is not None else ConnectionPool.MAX_IDLE_PER_HOST
+        self._idle_timeout = idle_timeout if idle_timeout is not None else ConnectionPool.IDLE_TIMEOUT
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, host):
+        """
+        This function gets a connection to host, reusing the most recently released idle connection if there is one
+
+        :param host:
+            The host (e.g. www.google.com)
+
+        :return:
+            connection, True if it was reused (it may have been dropped by the server since) or False if it is new
+        """
+        expired = []
+        conn = None
+        with self._lock:
+            idle = self._idle.get(host, [])
+            now = time.monotonic()
+            while len(idle) > 0:
+                idle_conn, released_at = idle.pop()
+                if now - released_at <= self._idle_timeout:
+                    conn = idle_conn
+                    break
+                expired.append(idle_conn)
+        for expired_conn in expired:
+            expired_conn.close()
+        if conn is not None:
+            return conn, True
+        return self._connection_factory(host), False
+
+    def release(self, host, conn):
+        """
+        This function returns a connection to the pool once its response has been fully read.
+        The connection is closed instead if the pool is full for this host.
+
+        :param host:
+            The host the connection is for
+        :param conn:
+            The connection
+        """
+        with self._lock:
+            idle = self._idle.setdefault(host, [])
+            if len(idle) < self._max_idle_per_host:
+                idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def num_idle(self, host):
+        """
+        :param host:
+            The host
+
+        :return:
+            the number of idle connections to host
+        """
+        with self._lock:
+            return len(self._idle.get(host, []))
+
+    def close(self):
+        """
+        Closes all idle connections
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for connections in idle.values():
+            for conn, _ in connections:
+                conn.close()
@@ -2,6 +2,7 @@
 This package includes the Food2Fork API Client
 """
 from api.rest_client import BasicRESTClient
+from api.search_iterator import SearchIterator
 import json
 
 class Food2ForkClient(BasicRESTClient):
@@ -16,16 +17,23 @@ class Food2ForkClient(BasicRESTClient):
     API_SEARCH_URL = '/api/search'
     API_GET_RECIPE_URL = '/api/get'
 
-    def __init__(self):
+    def __init__(self, api_domain=None, use_ssl=None):
         """
         Constructor function
 
         Loads the 'credentials.json' file and initializes self._api_key to the 'food2fork_api_key' stored in the file.
 
+        :param api_domain: (Optional)
+            The host (and optional port) to send requests to, API_DOMAIN by default (e.g. a local stand-in server)
+        :param use_ssl: (Optional)
+            see BasicRESTClient
+
         Exceptions:
             raises KeyError if parameter is not present
             raises FileNotFoundError if file is not present
         """
+        super(Food2ForkClient, self).__init__(use_ssl=use_ssl)
+        self._api_domain = api_domain or Food2ForkClient.API_DOMAIN
         self._api_key = None
         with open('./credentials.json') as f:
             cred_dict = json.load(f)
@@ -42,7 +50,34 @@ class Food2ForkClient(BasicRESTClient):
         """
         return {'key': self._api_key}
 
-    def api_search(self, q=None, sort=None, page=None):
+    def _search_params(self, q=None, sort=None, page=None):
+        """
+        This function builds the URL parameters of a search request, see api_search
+
+        :return:
+            dict containing the URL parameters
+        """
+        api_url_params = self._create_cred_params()
+        if q:
+            api_url_params['q'] = q
+        if sort:
+            api_url_params['sort'] = sort
+        if page:
+            api_url_params['page'] = page
+        return api_url_params
+
+    def _get_recipe_params(self, rId):
+        """
+        This function builds the URL parameters of a get recipe request, see api_get_recipe
+
+        :return:
+            dict containing the URL parameters
+        """
+        api_url_params = self._create_cred_params()
+        api_url_params['rId'] = rId
+        return api_url_params
+
+    def api_search(self, q=None, sort=None, page=None, max_recipes=None):
         """
         Performs a search of the Food2Fork recipe database
 
@@ -56,19 +91,39 @@ class Food2ForkClient(BasicRESTClient):
         :param page: (Optional)
             The default maximum per page is 30, to receive beyond this, specify the page number
 
+        :param max_recipes: (Optional)
+            Only decode the first max_recipes recipes and stop reading the response there
+
         :return:
             response status, response dict
         """
-        api_url_params = self._create_cred_params()
-        if q:
-            api_url_params['q'] = q
-        if sort:
-            api_url_params['sort'] = sort
-        if page:
-            api_url_params['page'] = page
-        return self._do_url_encoded_post(Food2ForkClient.API_DOMAIN,
+        if max_recipes is not None:
+            return self._do_url_encoded_post_partial(self._api_domain,
+                                                     Food2ForkClient.API_SEARCH_URL,
+                                                     self._search_params(q, sort, page),
+                                                     'recipes',
+                                                     max_recipes)
+        return self._do_url_encoded_post(self._api_domain,
                                          Food2ForkClient.API_SEARCH_URL,
-                                         api_url_params)
+                                         self._search_params(q, sort, page))
+
+    def iter_search(self, q=None, sort=None, max_results=None, lookahead=None):
+        """
+        Iterates over the recipes of a search across result pages, fetching the next pages in the background
+
+        :param q: (Optional)
+            see api_search
+        :param sort: (Optional)
+            see api_search
+        :param max_results: (Optional)
+            The maximum number of recipes to yield, all of them by default
+        :param lookahead: (Optional)
+            The number of pages to fetch ahead, see SearchIterator.LOOKAHEAD
+
+        :return:
+            SearchIterator yielding recipe dicts, it raises SearchPageException if a page could not be retrieved
+        """
+        return SearchIterator(self, q, sort, max_results, lookahead)
 
     def api_get_recipe(self, rId):
         """
@@ -80,8 +135,6 @@ class Food2ForkClient(BasicRESTClient):
         :return:
             response status, response dict
         """
-        api_url_params = self._create_cred_params()
-        api_url_params['rId'] = rId
-        return self._do_url_encoded_post(Food2ForkClient.API_DOMAIN,
+        return self._do_url_encoded_post(self._api_domain,
                                          Food2ForkClient.API_GET_RECIPE_URL,
-                                         api_url_params)
+                                         self._get_recipe_params(rId))
@@ -0,0 +1,176 @@
+"""@package partial_json
+This package includes the PartialArrayDecoder class, an incremental JSON decoder that can stop before the end of a document
+"""
+import json
+from json.decoder import JSONDecodeError
+
+class IncompleteJSON(Exception):
+    """
+    Raised internally when more text is needed to decode the next value
+    """
+    pass
+
+class PartialArrayDecoder:
+    """
+    This class decodes a JSON object incrementally and stops as soon as the first max_items items of one of its array
+    members have been decoded, e.g. the first recipe of {"count": 30, "recipes": [...]}
+
+    The members before the array are decoded in full, the members after it are never read.
+    Text is fed in as it arrives with feed(), which returns True once the decoder has everything it needs.
+    """
+    WHITESPACE = ' \t\n\r'
+
+    def __init__(self, array_key, max_items):
+        """
+        Constructor function
+
+        :param array_key:
+            The name of the top level array member to truncate
+        :param max_items:
+            The number of items of the array to decode
+        """
+        self._array_key = array_key
+        self._max_items = max_items
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._state = 'object_start'
+        self._key = None
+        self._result = {}
+        self._done = False
+
+    def _skip_whitespace(self):
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in PartialArrayDecoder.WHITESPACE:
+            self._pos += 1
+        if self._pos == len(self._buffer):
+            raise IncompleteJSON()
+
+    def _expect(self, chars):
+        """
+        Consumes one of chars after optional whitespace
+
+        :return:
+            the consumed character
+        """
+        self._skip_whitespace()
+        char = self._buffer[self._pos]
+        if char not in chars:
+            raise JSONDecodeError("Expecting one of %r" % (chars,), self._buffer, self._pos)
+        self._pos += 1
+        return char
+
+    def _value(self):
+        """
+        Decodes the next value
+        A value that ends exactly at the end of the buffer may be cut short (e.g. a number), so it only counts once more text
+        (or the end of the document) has arrived
+        """
+        self._skip_whitespace()
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except JSONDecodeError:
+            if self._eof:
+                raise
+            raise IncompleteJSON()
+        if end == len(self._buffer) and not self._eof:
+            raise IncompleteJSON()
+        self._pos = end
+        return value
+
+    def _step(self):
+        """
+        Runs the state machine until the decoder is done or needs more text.
+        The position only moves forward once a whole token has been consumed, so an IncompleteJSON leaves it at a token start.
+        """
+        while not self._done:
+            if self._state == 'object_start':
+                self._expect('{')
+                self._state = 'key_or_end'
+            elif self._state == 'key_or_end':
+                self._skip_whitespace()
+                if self._buffer[self._pos] == '}':
+                    self._pos += 1
+                    self._done = True
+                    return
+                self._state = 'key'
+            elif self._state == 'key':
+                start = self._pos
+                self._key = self._value()
+                try:
+                    self._expect(':')
+                except IncompleteJSON:
+                    self._pos = start
+                    raise
+                if self._key == self._array_key:
+                    self._state = 'array_start'
+                else:
+                    self._state = 'member_value'
+            elif self._state == 'member_value':
+                self._result[self._key] = self._value()
+                self._state = 'member_end'
+            elif self._state == 'member_end':
+                if self._expect(',}') == '}':
+                    self._done = True
+                    return
+                self._state = 'key'
+            elif self._state == 'array_start':
+                self._expect('[')
+                self._result[self._key] = []
+                self._state = 'item_or_end'
+                if self._max_items <= 0:
+                    self._done = True
+            elif self._state == 'item_or_end':
+                self._skip_whitespace()
+                if self._buffer[self._pos] == ']':
+                    self._pos += 1
+                    self._state = 'member_end'
+                    continue
+                self._state = 'item'
+            elif self._state == 'item':
+                items = self._result[self._key]
+                items.append(self._value())
+                if len(items) >= self._max_items:
+                    self._done = True
+                    return
+                self._state = 'item_end'
+            elif self._state == 'item_end':
+                if self._expect(',]') == ']':
+                    self._state = 'member_end'
+                else:
+                    self._state = 'item'
+
+    def feed(self, text, eof=False):
+        """
+        Feeds the next piece of the document
+
+        :param text:
+            The next piece of the document
+        :param eof:
+            True if this is the last piece
+
+        :return:
+            True - done, result() is ready and the rest of the document is not needed
+            False - more text is needed
+
+        Exceptions:
+            raises JSONDecodeError if the document is not valid JSON (or ends early)
+        """
+        if self._done:
+            return True
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        self._eof = eof
+        try:
+            self._step()
+        except IncompleteJSON:
+            if eof:
+                raise JSONDecodeError("Unexpected end of document", self._buffer, self._pos)
+        return self._done
+
+    def result(self):
+        """
+        :return:
+            dict with the members decoded so far, the array member holding at most max_items items
+        """
+        return self._result
@@ -0,0 +1,259 @@
+"""@package recipe_mirror
+This package includes the local SQLite mirror of Food2Fork recipes: RecipeMirror, RecipeSync and LocalRecipeSource
+"""
+from api.food2fork_client import Food2ForkClient
+import argparse
+import json
+import sqlite3
+import threading
+import time
+
+class RecipeMirror:
+    """
+    This class stores full Food2Fork recipes in a SQLite database, with an FTS5 full-text index over their ingredients.
+
+    Ingredient queries are matched per word with the porter stemmer, so 'tomatoes' finds '2 ripe tomatoes, chopped'.
+    The connection can be shared by threads, a lock serializes access to it.
+    """
+    PATH = './recipes.sqlite'
+
+    def __init__(self, path=None):
+        """
+        Constructor function
+
+        Opens (creating if needed) the database
+
+        :param path: (Optional)
+            The path of the SQLite database, PATH by default
+
+        Exceptions:
+            raises sqlite3.Error if the database can't be opened or SQLite was built without FTS5
+        """
+        self._conn = sqlite3.connect(path or RecipeMirror.PATH, timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS recipes (recipe_id TEXT PRIMARY KEY, social_rank REAL, '
+                               'search_rank INTEGER, summary TEXT, recipe TEXT, synced_at REAL)')
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts USING fts5(recipe_id UNINDEXED, ingredients, "
+                               "tokenize='porter unicode61')")
+            self._conn.commit()
+
+    def has_recipe(self, recipe_id):
+        """
+        :return:
+            True - the recipe is in the mirror
+            False - it isn't
+        """
+        with self._lock:
+            return self._conn.execute('SELECT 1 FROM recipes WHERE recipe_id = ?', (recipe_id,)).fetchone() is not None
+
+    def add_recipe(self, summary, recipe, search_rank=None):
+        """
+        This function stores a recipe (replacing it if it is already there) and indexes its ingredients
+
+        :param summary:
+            The recipe as returned in search results
+        :param recipe:
+            The full recipe as returned by Food2ForkClient.api_get_recipe (obj_data['recipe'])
+        :param search_rank: (Optional)
+            The position of the recipe in the search it was synced from, used for the trendingness sort
+        """
+        recipe_id = str(recipe.get('recipe_id', summary.get('recipe_id')))
+        with self._lock:
+            self._conn.execute('INSERT OR REPLACE INTO recipes VALUES (?, ?, ?, ?, ?, ?)',
+                               (recipe_id, float(recipe.get('social_rank', summary.get('social_rank')) or 0), search_rank,
+                                json.dumps(summary), json.dumps(recipe), time.time()))
+            self._conn.execute('DELETE FROM recipes_fts WHERE recipe_id = ?', (recipe_id,))
+            self._conn.execute('INSERT INTO recipes_fts VALUES (?, ?)', (recipe_id, '\n'.join(recipe.get('ingredients', []))))
+            self._conn.commit()
+
+    def get_recipe(self, recipe_id):
+        """
+        :return:
+            the full recipe dict, None if it is not in the mirror
+        """
+        with self._lock:
+            row = self._conn.execute('SELECT recipe FROM recipes WHERE recipe_id = ?', (recipe_id,)).fetchone()
+        return json.loads(row[0]) if row is not None else None
+
+    def all_recipes(self):
+        """
+        This function reads every recipe of the mirror, e.g. to index them in memory
+
+        :return:
+            list of (summary, full recipe) pairs, by rating
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT summary, recipe FROM recipes ORDER BY social_rank DESC, search_rank').fetchall()
+        return [(json.loads(summary), json.loads(recipe)) for summary, recipe in rows]
+
+    def _match_query(self, ingredients):
+        """
+        This function builds the FTS5 query requiring every ingredient, each one as a phrase
+
+        :return:
+            FTS5 MATCH expression
+        """
+        return ' AND '.join('"%s"' % (ingredient.replace('"', '""'),) for ingredient in ingredients)
+
+    def search(self, ingredients, sort=None, offset=0, limit=30):
+        """
+        This function finds the recipes having all of the ingredients
+
+        :param ingredients:
+            list of ingredients, all recipes if empty
+        :param sort: (Optional)
+            r - by rating (the default)
+            t - by trendingness (the order of the search they were synced from)
+        :param offset: (Optional)
+            Number of results to skip
+        :param limit: (Optional)
+            Maximum number of results
+
+        :return:
+            list of recipe summaries, as in search results
+        """
+        order = 'search_rank IS NULL, search_rank, social_rank DESC' if sort == 't' else 'social_rank DESC, search_rank'
+        with self._lock:
+            if len(ingredients) == 0:
+                rows = self._conn.execute('SELECT summary FROM recipes ORDER BY %s LIMIT ? OFFSET ?' % (order,),
+                                          (limit, offset)).fetchall()
+            else:
+                rows = self._conn.execute('SELECT summary FROM recipes WHERE recipe_id IN '
+                                          '(SELECT recipe_id FROM recipes_fts WHERE recipes_fts MATCH ?) '
+                                          'ORDER BY %s LIMIT ? OFFSET ?' % (order,),
+                                          (self._match_query(ingredients), limit, offset)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM recipes').fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database
+        """
+        with self._lock:
+            self._conn.close()
+
+class RecipeSync:
+    """
+    This class copies recipes from Food2Fork into a RecipeMirror.
+
+    Search results are paged through with Food2ForkClient.iter_search, and only the recipes that are not in the mirror yet
+    are retrieved with api_get_recipe, so syncing again costs one search request per page plus the new recipes.
+    """
+
+    def __init__(self, client, mirror):
+        """
+        Constructor function
+
+        :param client:
+            The Food2ForkClient (or subclass) to pull from
+        :param mirror:
+            The RecipeMirror to fill
+        """
+        self._client = client
+        self._mirror = mirror
+
+    def sync(self, q=None, sort='r', max_results=None):
+        """
+        This function pulls the recipes of a search into the mirror
+
+        :param q: (Optional)
+            see Food2ForkClient.api_search
+        :param sort: (Optional)
+            see Food2ForkClient.api_search, by rating by default
+        :param max_results: (Optional)
+            The maximum number of search results to go through, all of them by default
+
+        :return:
+            dict with the number of search results seen, recipes fetched, recipes skipped (already mirrored) and failures
+
+        Exceptions:
+            raises SearchPageException if a page of search results could not be retrieved
+        """
+        counts = {'seen': 0, 'fetched': 0, 'skipped': 0, 'failed': 0}
+        for summary in self._client.iter_search(q, sort, max_results):
+            counts['seen'] += 1
+            recipe_id = summary.get('recipe_id')
+            if recipe_id is None:
+                counts['failed'] += 1
+                continue
+            if self._mirror.has_recipe(recipe_id):
+                counts['skipped'] += 1
+                continue
+            resp_status, obj_data = self._client.api_get_recipe(recipe_id)
+            if resp_status != 200 or not isinstance(obj_data, dict) or not isinstance(obj_data.get('recipe'), dict):
+                counts['failed'] += 1
+                continue
+            self._mirror.add_recipe(summary, obj_data['recipe'], counts['seen'] if sort == 't' else None)
+            counts['fetched'] += 1
+        return counts
+
+class LocalRecipeSource:
+    """
+    This class answers Food2ForkClient api_search and api_get_recipe requests from a RecipeMirror, offline.
+    Responses have the same shape as the live API's, so it can stand in for the client (e.g. in TakeHomeApplication).
+    """
+    PAGE_SIZE = 30
+
+    def __init__(self, mirror=None):
+        """
+        Constructor function
+
+        :param mirror: (Optional)
+            The RecipeMirror, or the path of its database, RecipeMirror.PATH by default
+        """
+        self._mirror = mirror if isinstance(mirror, RecipeMirror) else RecipeMirror(mirror)
+
+    def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+        """
+        see Food2ForkClient.api_search
+        Every comma separated ingredient of q must be in the recipe
+        """
+        ingredients = [x.strip() for x in (q or '').split(',') if x.strip() != '']
+        limit = LocalRecipeSource.PAGE_SIZE if max_recipes is None else min(max_recipes, LocalRecipeSource.PAGE_SIZE)
+        offset = (max(int(page or 1), 1) - 1) * LocalRecipeSource.PAGE_SIZE
+        recipes = self._mirror.search(ingredients, sort, offset, limit)
+        return 200, {'count': len(recipes), 'recipes': recipes}
+
+    def api_get_recipe(self, rId):
+        """
+        see Food2ForkClient.api_get_recipe
+        A recipe that is not in the mirror is a 404
+        """
+        recipe = self._mirror.get_recipe(rId)
+        if recipe is None:
+            return 404, 'Recipe not found'
+        return 200, {'recipe': recipe}
+
+    def last_retry_after(self):
+        """
+        :return:
+            None, local responses never ask to wait
+        """
+        return None
+
+    def close(self):
+        """
+        Closes the mirror
+        """
+        self._mirror.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pull Food2Fork recipes into a local mirror')
+    parser.add_argument('--db', default=RecipeMirror.PATH, help='the mirror database')
+    parser.add_argument('-q', '--query', help='comma separated ingredients to search for, everything by default')
+    parser.add_argument('--sort', default='r', choices=['r', 't'], help='r - by rating, t - by trendingness')
+    parser.add_argument('--max-results', type=int, help='the maximum number of search results to go through')
+    args = parser.parse_args()
+    client = Food2ForkClient()
+    mirror = RecipeMirror(args.db)
+    try:
+        counts = RecipeSync(client, mirror).sync(args.query, args.sort, args.max_results)
+        print("Seen %(seen)s, fetched %(fetched)s, already mirrored %(skipped)s, failed %(failed)s" % counts)
+        print("%s recipes in %s" % (len(mirror), args.db,))
+    finally:
+        client.close()
+        mirror.close()
@@ -0,0 +1,178 @@
+"""@package response_cache
+This package includes the ResponseCache class
+"""
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+class ResponseCache:
+    """
+    This class provides a TTL + LRU cache of decoded JSON responses, optionally backed by a SQLite file so it survives restarts.
+
+    Entries are kept in memory as JSON bytes, so every hit returns a fresh copy and the size of an entry is known.
+    The least recently used entries are evicted once the entries take more than MAX_MEMORY_BYTES in memory or
+    MAX_DISK_BYTES (zlib compressed) on disk. Expired entries are never returned.
+    """
+    MAX_MEMORY_BYTES = 8 * 1024 * 1024
+    MAX_DISK_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path=None, max_memory_bytes=None, max_disk_bytes=None):
+        """
+        Constructor function
+
+        :param path: (Optional)
+            The path of the SQLite store, no on-disk store if None
+        :param max_memory_bytes: (Optional)
+            In-memory byte budget, MAX_MEMORY_BYTES by default
+        :param max_disk_bytes: (Optional)
+            On-disk byte budget, MAX_DISK_BYTES by default
+        """
+        self._path = path
+        self._max_memory_bytes = max_memory_bytes or ResponseCache.MAX_MEMORY_BYTES
+        self._max_disk_bytes = max_disk_bytes or ResponseCache.MAX_DISK_BYTES
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._conn = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def _get_conn(self):
+        """
+        Accessor function for self._conn
+        Opens the SQLite store on first use. If it can't be opened, the cache keeps working in memory only.
+
+        :return:
+            sqlite3 connection, None if there is no on-disk store
+        """
+        if self._conn is None and self._path is not None:
+            try:
+                conn = sqlite3.connect(self._path, timeout=5, check_same_thread=False)
+                conn.execute('CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, expires_at REAL, '
+                             'last_used REAL, size INTEGER, data BLOB)')
+                conn.execute('CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)')
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error:
+                self._path = None
+        return self._conn
+
+    def _remember(self, key, expires_at, data):
+        """
+        Adds an entry to the in-memory LRU, evicting the least recently used entries while it is over budget
+        """
+        self._forget(key)
+        if len(data) > self._max_memory_bytes:
+            return
+        self._entries[key] = (expires_at, data)
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self._max_memory_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _forget(self, key):
+        """
+        Removes an entry from the in-memory LRU, if it is there
+        """
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._memory_bytes -= len(entry[1])
+
+    def _evict_disk(self, conn):
+        """
+        Deletes expired entries and then the least recently used entries while the store is over budget
+        """
+        conn.execute('DELETE FROM responses WHERE expires_at < ?', (time.time(),))
+        total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self._max_disk_bytes:
+            return
+        for key, size in conn.execute('SELECT key, size FROM responses ORDER BY last_used').fetchall():
+            conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            if total <= self._max_disk_bytes:
+                return
+
+    def get(self, key):
+        """
+        This function looks up an unexpired response, first in memory then on disk
+
+        :param key:
+            The cache key
+
+        :return:
+            the decoded response (a new copy on every call), None if it is not cached
+        """
+        with self._lock:
+            now = time.time()
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, data = entry
+                if expires_at >= now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return json.loads(data)
+                self._forget(key)
+            conn = self._get_conn()
+            if conn is not None:
+                row = conn.execute('SELECT expires_at, data FROM responses WHERE key = ?', (key,)).fetchone()
+                if row is not None and row[0] >= now:
+                    data = zlib.decompress(row[1])
+                    self._remember(key, row[0], data)
+                    conn.execute('UPDATE responses SET last_used = ? WHERE key = ?', (now, key))
+                    conn.commit()
+                    self._hits += 1
+                    self._disk_hits += 1
+                    return json.loads(data)
+            self._misses += 1
+            return None
+
+    def put(self, key, obj, ttl):
+        """
+        This function caches a response, in memory and on disk
+
+        :param key:
+            The cache key
+        :param obj:
+            The decoded response, it must be JSON serializable
+        :param ttl:
+            Seconds until the response expires
+        """
+        data = json.dumps(obj, separators=(',', ':')).encode('utf-8')
+        now = time.time()
+        with self._lock:
+            self._remember(key, now + ttl, data)
+            conn = self._get_conn()
+            if conn is not None:
+                compressed = zlib.compress(data)
+                try:
+                    conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                                 (key, now + ttl, now, len(compressed), compressed))
+                    self._evict_disk(conn)
+                    conn.commit()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self):
+        """
+        :return:
+            dict with the hits (of which disk_hits came from the on-disk store), misses, in-memory entries and bytes
+        """
+        with self._lock:
+            return {'hits': self._hits,
+                    'disk_hits': self._disk_hits,
+                    'misses': self._misses,
+                    'size': len(self._entries),
+                    'memory_bytes': self._memory_bytes}
+
+    def close(self):
+        """
+        Closes the on-disk store, if it was opened
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,16 +1,111 @@
 """@package rest_client
 This package includes a basic REST client
 """
+import codecs
+import functools
 import http.client
+import threading
 import urllib.parse
+import zlib
 
 import json
 from json.decoder import JSONDecodeError
 
+from api.connection_pool import ConnectionPool
+from api.partial_json import PartialArrayDecoder
+from api.retry_policy import parse_retry_after
+from telemetry.metrics import METRICS
+
+class DeflateDecompressor:
+    """
+    This class incrementally decompresses a deflate Content-Encoding body. The body should be zlib wrapped (RFC 1950), but
+    some servers send raw deflate data (RFC 1951), so it falls back to that when the zlib header is missing.
+    It has the interface of a zlib decompress object (decompress, flush and eof).
+    """
+
+    def __init__(self):
+        """
+        Constructor function
+        """
+        self._decompressor = zlib.decompressobj(zlib.MAX_WBITS)
+        ## The input read until the zlib header was checked, None once it has been
+        self._head = b''
+
+    @property
+    def eof(self):
+        return self._decompressor.eof
+
+    def decompress(self, data):
+        """
+        :return:
+            the decompressed bytes available so far
+
+        Exceptions:
+            raises zlib.error if the data is corrupt
+        """
+        if self._head is None:
+            return self._decompressor.decompress(data)
+        self._head += data
+        try:
+            decompressed = self._decompressor.decompress(data)
+        except zlib.error:
+            # No zlib header, so raw deflate data
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            decompressed = self._decompressor.decompress(self._head)
+            self._head = None
+            return decompressed
+        if len(self._head) >= 2:
+            self._head = None
+        return decompressed
+
+    def flush(self):
+        return self._decompressor.flush()
+
 class BasicRESTClient:
     """
     This class provides basic functionally for a REST client using http.client
+    Connections are kept alive between requests in a per-host ConnectionPool
+    Responses may be gzip/deflate compressed, they are decompressed incrementally as they are read
     """
+    ACCEPT_ENCODING = 'gzip, deflate'
+    USE_SSL = True
+    REQUEST_TIMEOUT = 30
+    READ_CHUNK_SIZE = 16 * 1024
+    ## Unread bytes of a partly decoded response that are read anyway to keep its connection alive
+    DRAIN_LIMIT = 64 * 1024
+    ## Errors that mean a reused keep-alive connection was dropped by the server while it was idle
+    STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                               ConnectionResetError, BrokenPipeError, ConnectionAbortedError)
+
+    def __init__(self, use_ssl=None):
+        """
+        Constructor function
+
+        Initializes the keep-alive connection pool
+
+        :param use_ssl: (Optional)
+            False to talk plain HTTP (e.g. to a local stand-in server), USE_SSL by default
+        """
+        self._use_ssl = use_ssl if use_ssl is not None else self.USE_SSL
+        connection_class = http.client.HTTPSConnection if self._use_ssl else http.client.HTTPConnection
+        self._connection_pool = ConnectionPool(functools.partial(connection_class, timeout=self.REQUEST_TIMEOUT))
+        self._local = threading.local()
+
+    def last_retry_after(self):
+        """
+        Accessor function for the Retry-After of the last response received by the calling thread
+
+        :return:
+            seconds to wait, None if the response had no (valid) Retry-After header
+        """
+        return getattr(self._local, 'retry_after', None)
+
+    def close(self):
+        """
+        Closes all pooled connections
+        """
+        self._connection_pool.close()
+
     def _safe_json_decode(self, data):
         """
         This function safely decodes a JSON string into an object.
@@ -45,16 +140,230 @@ class BasicRESTClient:
         :return:
             response status, response dict
         """
-        params = urllib.parse.urlencode(api_url_params)
-        headers = {
-            'Content-type': 'application/x-www-form-urlencoded',
-            'Accept': 'application/json'
-        }
-        conn = http.client.HTTPSConnection(api_domain)
-        conn.request("POST", api_url, params, headers)
-        response = conn.getresponse()
+        with METRICS.span('rest_request', domain=api_domain, url=api_url) as span:
+            resp_status, obj_data = self._url_encoded_post(api_domain, api_url, api_url_params)
+            span.set_label('status', resp_status)
+        return resp_status, obj_data
+
+    def _do_url_encoded_post_partial(self, api_domain, api_url, api_url_params, array_key, max_items):
+        """
+        This function performs a 'POST' request like _do_url_encoded_post, but decodes the JSON response as it streams in and
+        stops reading as soon as the first max_items items of the array_key member have been decoded (see PartialArrayDecoder)
+
+        :param api_domain:
+            the domain of the request (e.g. www.google.com)
+
+        :param api_url:
+            the endpoint path (e.g. /api/endpoint)
+
+        :param api_url_params:
+            a dictionary of URL parameters to be encoded
+
+        :param array_key:
+            the name of the top level array member to truncate
+
+        :param max_items:
+            the number of items of the array to decode
+
+        :return:
+            response status, response dict (with at most max_items items in the array_key member)
+        """
+        with METRICS.span('rest_request', domain=api_domain, url=api_url, partial=True) as span:
+            resp_status, obj_data = self._url_encoded_post_partial(api_domain, api_url, api_url_params, array_key, max_items)
+            span.set_label('status', resp_status)
+        return resp_status, obj_data
+
+    def _url_encoded_post(self, api_domain, api_url, api_url_params):
+        """
+        see _do_url_encoded_post, without the instrumentation
+        """
+        # A request that fails before its response arrives must not report the previous response's Retry-After
+        self._local.retry_after = None
+        conn, response = self._send_request(api_domain, "POST", api_url,
+                                            urllib.parse.urlencode(api_url_params), self._post_headers())
+        self._local.retry_after = parse_retry_after(response.getheader('Retry-After'))
+        try:
+            data = b''.join(self._iter_body(response))
+        except zlib.error:
+            conn.close()
+            return -1, None
+        except Exception:
+            conn.close()
+            raise
+        self._finish_response(api_domain, conn, response)
         if response.status != 200:
             return response.status, response.reason
-        data = response.read()
-        conn.close()
-        return self._safe_json_decode(data)
\ No newline at end of file
+        return self._safe_json_decode(data)
+
+    def _url_encoded_post_partial(self, api_domain, api_url, api_url_params, array_key, max_items):
+        """
+        see _do_url_encoded_post_partial, without the instrumentation
+        """
+        self._local.retry_after = None
+        conn, response = self._send_request(api_domain, "POST", api_url,
+                                            urllib.parse.urlencode(api_url_params), self._post_headers())
+        self._local.retry_after = parse_retry_after(response.getheader('Retry-After'))
+        decoder = PartialArrayDecoder(array_key, max_items)
+        text_decoder = codecs.getincrementaldecoder('utf-8')()
+        done = False
+        try:
+            if response.status != 200:
+                for _ in self._iter_body(response):
+                    pass
+                self._finish_response(api_domain, conn, response)
+                return response.status, response.reason
+            for chunk in self._iter_body(response):
+                if decoder.feed(text_decoder.decode(chunk)):
+                    done = True
+                    break
+            if not done:
+                decoder.feed(text_decoder.decode(b'', final=True), eof=True)
+        except (JSONDecodeError, UnicodeDecodeError, zlib.error):
+            conn.close()
+            return -1, None
+        except Exception:
+            conn.close()
+            raise
+        if done:
+            self._finish_partial_response(api_domain, conn, response)
+        else:
+            self._finish_response(api_domain, conn, response)
+        return 200, decoder.result()
+
+    def _post_headers(self):
+        """
+        :return:
+            dict of the headers sent with every urlencoded 'POST' request
+        """
+        return {
+            'Content-type': 'application/x-www-form-urlencoded',
+            'Accept': 'application/json',
+            'Accept-Encoding': BasicRESTClient.ACCEPT_ENCODING
+        }
+
+    def _decompressor(self, content_encoding):
+        """
+        This function creates an incremental decompressor for a Content-Encoding
+
+        :param content_encoding:
+            the Content-Encoding header value (may be None)
+
+        :return:
+            zlib decompress object (DeflateDecompressor for deflate), None if the body is not compressed
+        """
+        encoding = (content_encoding or '').strip().lower()
+        if encoding in ('gzip', 'x-gzip'):
+            return zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if encoding == 'deflate':
+            return DeflateDecompressor()
+        return None
+
+    def _flush_decompressor(self, decompressor):
+        """
+        This function flushes a decompressor once the whole body has been fed to it
+
+        :return:
+            the remaining decompressed bytes
+
+        Exceptions:
+            raises zlib.error if the compressed body was truncated
+        """
+        data = decompressor.flush()
+        if not decompressor.eof:
+            raise zlib.error('Compressed response body is truncated')
+        return data
+
+    def _iter_body(self, response):
+        """
+        This generator reads a response body in READ_CHUNK_SIZE pieces and decompresses them as they arrive
+
+        :param response:
+            http.client.HTTPResponse
+
+        :return:
+            generator of (decompressed) body pieces
+
+        Exceptions:
+            raises zlib.error if the body is corrupt or truncated
+        """
+        decompressor = self._decompressor(response.getheader('Content-Encoding'))
+        while True:
+            chunk = response.read(BasicRESTClient.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield decompressor.decompress(chunk) if decompressor else chunk
+        if decompressor:
+            yield self._flush_decompressor(decompressor)
+
+    def _finish_response(self, api_domain, conn, response):
+        """
+        This function returns the connection to the pool once its response has been fully read, or closes it if the server
+        asked for that
+
+        :param api_domain:
+            the domain of the request
+        :param conn:
+            the connection
+        :param response:
+            the fully read response
+        """
+        if response.will_close:
+            conn.close()
+        else:
+            self._connection_pool.release(api_domain, conn)
+
+    def _finish_partial_response(self, api_domain, conn, response):
+        """
+        This function returns the connection of a response that was only decoded in part to the pool, like _finish_response.
+        The body has often been read to the end anyway (a short body fits in one read), otherwise what is left is read
+        first if it is known to be at most DRAIN_LIMIT bytes. If more is left, the connection is closed instead.
+
+        :param api_domain:
+            the domain of the request
+        :param conn:
+            the connection
+        :param response:
+            the partly read response
+        """
+        if not response.isclosed() and response.length is not None and response.length <= BasicRESTClient.DRAIN_LIMIT:
+            try:
+                response.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                return
+        if response.isclosed():
+            self._finish_response(api_domain, conn, response)
+        else:
+            conn.close()
+
+    def _send_request(self, api_domain, method, api_url, body, headers):
+        """
+        This function sends a request on a pooled connection and waits for the response headers.
+        If a reused connection turns out to have been dropped by the server, it is retried once on a new connection.
+
+        :param api_domain:
+            the domain of the request (e.g. www.google.com)
+        :param method:
+            the HTTP method
+        :param api_url:
+            the endpoint path (e.g. /api/endpoint)
+        :param body:
+            the request body
+        :param headers:
+            dict of request headers
+
+        :return:
+            connection, response (the body has not been read yet)
+        """
+        while True:
+            conn, reused = self._connection_pool.acquire(api_domain)
+            try:
+                conn.request(method, api_url, body, headers)
+                return conn, conn.getresponse()
+            except BasicRESTClient.STALE_CONNECTION_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+            except Exception:
+                conn.close()
+                raise
\ No newline at end of file
@@ -0,0 +1,187 @@
+"""@package retry_policy
+This package includes the RetryPolicy and CircuitBreaker classes used to retry failed API requests
+"""
+from email.utils import parsedate_to_datetime
+import datetime
+import random
+import threading
+import time
+
+def parse_retry_after(value):
+    """
+    This function parses a Retry-After header value
+
+    :param value:
+        The header value, either a number of seconds or an HTTP date (may be None)
+
+    :return:
+        seconds to wait (>= 0), None if there is no valid value
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=datetime.timezone.utc)
+    return max((retry_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+class CircuitBreaker:
+    """
+    This class stops requests to a service that keeps failing, so callers fail fast instead of waiting on retries.
+
+    States:
+        closed - requests are allowed, FAILURE_THRESHOLD consecutive failures open the circuit
+        open - requests are refused until RESET_TIMEOUT seconds have passed
+        half open - one trial request is allowed, success closes the circuit and failure opens it again
+    """
+    FAILURE_THRESHOLD = 5
+    RESET_TIMEOUT = 30.0
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None):
+        """
+        Constructor function
+
+        :param failure_threshold: (Optional)
+            Consecutive failures that open the circuit, FAILURE_THRESHOLD by default
+        :param reset_timeout: (Optional)
+            Seconds the circuit stays open, RESET_TIMEOUT by default
+        """
+        self._failure_threshold = failure_threshold or CircuitBreaker.FAILURE_THRESHOLD
+        self._reset_timeout = reset_timeout if reset_timeout is not None else CircuitBreaker.RESET_TIMEOUT
+        self._state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def state(self):
+        """
+        Accessor function for self._state
+        :return:
+            closed, open or half open
+        """
+        with self._lock:
+            return self._state
+
+    def allow_request(self):
+        """
+        :return:
+            True - the request may be sent
+            False - the circuit is open, fail fast
+        """
+        with self._lock:
+            if self._state == CircuitBreaker.CLOSED:
+                return True
+            if self._state == CircuitBreaker.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                self._state = CircuitBreaker.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        """
+        Closes the circuit
+        """
+        with self._lock:
+            self._state = CircuitBreaker.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        """
+        Counts a failure, opening the circuit if the threshold is reached or the half open trial failed
+        """
+        with self._lock:
+            self._failures += 1
+            if self._state == CircuitBreaker.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+
+class RetryPolicy:
+    """
+    This class decides whether a failed request is worth retrying and how long to wait before the next attempt.
+
+    Waits grow exponentially from BASE_DELAY and are capped at MAX_DELAY, with full jitter (a random wait between 0 and the
+    exponential delay) so many clients don't retry in lockstep. A server's Retry-After is honored as the minimum wait,
+    unless it is longer than MAX_RETRY_AFTER, then the request is not retried at all.
+    """
+    BASE_DELAY = 0.5
+    MAX_DELAY = 5.0
+    MAX_RETRY_AFTER = 30.0
+    ## Status used for requests that failed with a connection error instead of an HTTP status
+    CONNECTION_ERROR = -2
+    ## Statuses that can succeed on a later attempt. -1 is an undecodable (e.g. truncated) response
+    RETRYABLE_STATUSES = frozenset([-2, -1, 408, 425, 429, 500, 502, 503, 504])
+
+    def __init__(self, base_delay=None, max_delay=None, circuit_breaker=None, rand=random.random):
+        """
+        Constructor function
+
+        :param base_delay: (Optional)
+            The delay before the first retry (before jitter), BASE_DELAY by default
+        :param max_delay: (Optional)
+            The longest delay (before jitter), MAX_DELAY by default
+        :param circuit_breaker: (Optional)
+            The CircuitBreaker to report to, a new one by default
+        :param rand: (Optional)
+            Callable returning a float in [0, 1), random.random by default
+        """
+        self._base_delay = base_delay if base_delay is not None else RetryPolicy.BASE_DELAY
+        self._max_delay = max_delay if max_delay is not None else RetryPolicy.MAX_DELAY
+        self.circuit_breaker = circuit_breaker if circuit_breaker is not None else CircuitBreaker()
+        self._rand = rand
+
+    def is_retryable(self, resp_status, retry_after=None):
+        """
+        :param resp_status:
+            The response status of the failed request
+        :param retry_after: (Optional)
+            The server's Retry-After in seconds
+
+        :return:
+            True - the request may succeed if it is retried
+            False - fatal (e.g. a bad api key), retrying won't help
+        """
+        if retry_after is not None and retry_after > RetryPolicy.MAX_RETRY_AFTER:
+            return False
+        return resp_status in RetryPolicy.RETRYABLE_STATUSES
+
+    def delay(self, attempt, retry_after=None, max_delay=None):
+        """
+        This function computes how long to wait before retrying
+
+        :param attempt:
+            The number of attempts that have failed so far (1 for the first retry)
+        :param retry_after: (Optional)
+            The server's Retry-After in seconds
+        :param max_delay: (Optional)
+            Override the longest delay (before jitter)
+
+        :return:
+            seconds to wait
+        """
+        max_delay = max_delay if max_delay is not None else self._max_delay
+        backoff = min(max_delay, self._base_delay * (2 ** max(attempt - 1, 0)))
+        delay = backoff * self._rand()
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def record(self, resp_status):
+        """
+        This function reports the outcome of a request to the circuit breaker.
+        Only retryable failures mean the service is down, fatal ones (e.g. a 404) count as the service being up.
+
+        :param resp_status:
+            The response status
+        """
+        if resp_status == 200 or not self.is_retryable(resp_status):
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
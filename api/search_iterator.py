@@ -0,0 +1,138 @@
+"""@package search_iterator
+This package includes the SearchIterator class, which iterates over the recipes of a search across result pages
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+
+class SearchPageException(Exception):
+    """
+    Raised by SearchIterator when a page of results could not be retrieved
+    """
+    def __init__(self, page, resp_status, response):
+        super(SearchPageException, self).__init__("Search page %s failed, status: %s" % (page, resp_status,))
+        self.page = page
+        self.resp_status = resp_status
+        self.response = response
+
+class SearchIterator:
+    """
+    This class yields the recipes of a search one by one, across as many result pages as needed.
+
+    While the consumer is processing a page, the next `lookahead` pages are already being fetched on background threads.
+    Iteration ends after max_results recipes or on the first page with fewer than PAGE_SIZE recipes.
+    close() (called automatically when the consumer stops iterating) cancels every fetch that has not started yet;
+    a request that is already in flight is left to finish and its page is discarded.
+    """
+    PAGE_SIZE = 30
+    LOOKAHEAD = 2
+
+    def __init__(self, client, q=None, sort=None, max_results=None, lookahead=None):
+        """
+        Constructor function
+
+        :param client:
+            The Food2ForkClient (or subclass) used to fetch the pages, it must be safe to use from several threads
+        :param q: (Optional)
+            see Food2ForkClient.api_search
+        :param sort: (Optional)
+            see Food2ForkClient.api_search
+        :param max_results: (Optional)
+            The maximum number of recipes to yield, no limit by default
+        :param lookahead: (Optional)
+            The number of pages to fetch ahead of the page being consumed, LOOKAHEAD by default
+        """
+        self._client = client
+        self._q = q
+        self._sort = sort
+        self._max_results = max_results
+        self._lookahead = max(1, lookahead if lookahead is not None else SearchIterator.LOOKAHEAD)
+        self._executor = None
+        self._pending = deque()
+        self._next_page = 1
+        self._last_page = None
+        if max_results is not None:
+            self._last_page = max(1, -(-max_results // SearchIterator.PAGE_SIZE))
+        self._cancelled = threading.Event()
+
+    def _fetch(self, page):
+        """
+        Fetches one page of results, unless the iterator was closed in the meantime
+
+        :return:
+            response status, response dict (None, None if cancelled)
+        """
+        if self._cancelled.is_set():
+            return None, None
+        max_recipes = None
+        if self._max_results is not None and page == self._last_page:
+            remaining = self._max_results - (page - 1) * SearchIterator.PAGE_SIZE
+            if remaining < SearchIterator.PAGE_SIZE:
+                max_recipes = remaining
+        if max_recipes is not None:
+            return self._client.api_search(self._q, self._sort, page, max_recipes)
+        return self._client.api_search(self._q, self._sort, page)
+
+    def _schedule(self):
+        """
+        Submits page fetches until `lookahead` pages are outstanding or the last page has been submitted
+        """
+        if self._executor is None:
+            # One more worker than the lookahead for the page being waited on
+            self._executor = ThreadPoolExecutor(max_workers=self._lookahead + 1)
+        while len(self._pending) < self._lookahead and (self._last_page is None or self._next_page <= self._last_page):
+            self._pending.append((self._next_page, self._executor.submit(self._fetch, self._next_page)))
+            self._next_page += 1
+
+    def __iter__(self):
+        """
+        Yields the recipes in result order
+
+        Exceptions:
+            raises SearchPageException if a page could not be retrieved
+        """
+        num_results = 0
+        try:
+            while not self._cancelled.is_set():
+                if len(self._pending) == 0:
+                    self._schedule()
+                    if len(self._pending) == 0:
+                        return
+                page, future = self._pending.popleft()
+                # Keep `lookahead` pages in flight while this one is consumed
+                self._schedule()
+                resp_status, response = future.result()
+                if resp_status is None:
+                    return
+                if resp_status != 200 or not isinstance(response, dict):
+                    raise SearchPageException(page, resp_status, response)
+                recipes = response.get('recipes') or []
+                if len(recipes) < SearchIterator.PAGE_SIZE:
+                    # Nothing after a short page, the pages fetched ahead are not needed
+                    self._last_page = page
+                for recipe in recipes:
+                    if self._max_results is not None and num_results >= self._max_results:
+                        return
+                    num_results += 1
+                    yield recipe
+                if page == self._last_page:
+                    return
+        finally:
+            self.close()
+
+    def close(self):
+        """
+        Stops the iteration, cancelling the page fetches that have not started yet
+        """
+        self._cancelled.set()
+        for _, future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,297 @@
+"""@package bitmap_index
+This package includes the IngredientBitmapIndex class, which ranks recipes by the number of ingredients the user lacks,
+and CoverageRecipeSource, which serves that ranking through the Food2ForkClient api_search/api_get_recipe contract
+"""
+import re
+
+## Words of an ingredient line that don't name the ingredient
+STOP_WORDS = frozenset([
+    'a', 'an', 'and', 'as', 'at', 'for', 'from', 'in', 'into', 'of', 'on', 'or', 'the', 'to', 'with', 'without',
+    'about', 'large', 'medium', 'small', 'fresh', 'freshly', 'chopped', 'diced', 'minced', 'sliced', 'ground', 'finely',
+    'cup', 'cups', 'c', 'tablespoon', 'tablespoons', 'tbsp', 'tbs', 'teaspoon', 'teaspoons', 'tsp', 'ounce', 'ounces',
+    'oz', 'pound', 'pounds', 'lb', 'lbs', 'g', 'gram', 'grams', 'kg', 'ml', 'l', 'liter', 'pinch', 'dash', 'can', 'cans',
+    'package', 'packages', 'pkg', 'clove', 'cloves', 'slice', 'slices', 'piece', 'pieces', 'whole', 'taste', 'optional',
+    'plus', 'more', 'divided', 'such', 'x', 'inch'
+])
+
+def normalize_terms(text):
+    """
+    This function splits an ingredient into its normalized terms: lowercase words, without stop words, units or numbers,
+    reduced to their singular form
+
+    :param text:
+        An ingredient line or a supplied ingredient
+    :return:
+        list of terms, in order
+    """
+    terms = []
+    for word in re.findall('[a-z]+', text.lower()):
+        if word in STOP_WORDS or len(word) < 2:
+            continue
+        if word.endswith('ies') and len(word) > 4:
+            word = word[:-3] + 'y'
+        elif word.endswith(('oes', 'ches', 'shes', 'xes', 'sses')):
+            word = word[:-2]
+        elif word.endswith('s') and not word.endswith('ss') and len(word) > 3:
+            word = word[:-1]
+        terms.append(word)
+    return terms
+
+class IngredientBitmapIndex:
+    """
+    This class indexes recipes by the terms of their ingredients to rank them by how many ingredients the user lacks.
+
+    Every recipe gets an ordinal and every term maps to one bitmap (a Python int) of recipe ordinals per ingredient line
+    position: bit i of the bitmap at position k is set if line k of recipe i uses the term. A supplied ingredient covers a
+    line if all of its terms are on it (intersection), the covered lines are the union over the supplied ingredients, and
+    they are summed with bit-sliced counters, so a query only does a few big integer operations per supplied ingredient
+    and line position instead of looking at every recipe. The number of missing ingredients is the recipe's ingredient
+    count minus its covered lines, so a line covered by several supplied ingredients (e.g. 'chicken' and 'chicken broth')
+    is only counted once.
+    """
+
+    def __init__(self):
+        """
+        Constructor function
+        """
+        self._recipes = []
+        ## Term: list of bitmaps, the one at position k has the recipes whose line k uses the term
+        self._term_bitmaps = {}
+        ## Bit slices of the ingredient counts, slice j has the recipes whose count has bit j set
+        self._count_slices = []
+
+    @classmethod
+    def build(cls, recipes):
+        """
+        This function indexes many recipes
+
+        :param recipes:
+            iterable of (summary, recipe) pairs, see add_recipe
+        :return:
+            IngredientBitmapIndex
+        """
+        index = cls()
+        for summary, recipe in recipes:
+            index.add_recipe(summary, recipe)
+        return index
+
+    def add_recipe(self, summary, recipe):
+        """
+        This function indexes a recipe
+
+        :param summary:
+            The recipe as returned in search results, it is returned by top_recipes
+        :param recipe:
+            The full recipe as returned by Food2ForkClient.api_get_recipe (obj_data['recipe']), it must have 'ingredients'
+        :return:
+            the recipe's ordinal
+        """
+        ordinal = len(self._recipes)
+        bit = 1 << ordinal
+        self._recipes.append((summary, recipe))
+        for position, line in enumerate(recipe['ingredients']):
+            for term in set(normalize_terms(line)):
+                bitmaps = self._term_bitmaps.setdefault(term, [])
+                if len(bitmaps) <= position:
+                    bitmaps.extend([0] * (position + 1 - len(bitmaps)))
+                bitmaps[position] |= bit
+        count = len(recipe['ingredients'])
+        j = 0
+        while count > 0:
+            if j == len(self._count_slices):
+                self._count_slices.append(0)
+            if count & 1:
+                self._count_slices[j] |= bit
+            count >>= 1
+            j += 1
+        return ordinal
+
+    def _ingredient_line_bitmaps(self, ingredient):
+        """
+        :return:
+            list of bitmaps, the one at position k has the recipes whose line k has every term of the ingredient
+            (empty if it has no terms)
+        """
+        bitmaps = None
+        for term in normalize_terms(ingredient):
+            term_bitmaps = self._term_bitmaps.get(term, [])
+            bitmaps = list(term_bitmaps) if bitmaps is None else [a & b for a, b in zip(bitmaps, term_bitmaps)]
+            if not any(bitmaps):
+                return []
+        return bitmaps or []
+
+    def _add_to_counter(self, slices, bitmap):
+        """
+        Adds 1 to the bit-sliced counter of every recipe in the bitmap (ripple carry)
+        """
+        carry = bitmap
+        for j in range(len(slices)):
+            if carry == 0:
+                return
+            slices[j], carry = slices[j] ^ carry, slices[j] & carry
+        if carry != 0:
+            slices.append(carry)
+
+    def _subtract(self, minuend, subtrahend, mask):
+        """
+        Subtracts two bit-sliced counters (ripple borrow), the subtrahend must not be greater than the minuend
+
+        :return:
+            bit slices of the difference
+        """
+        difference = []
+        borrow = 0
+        for j in range(max(len(minuend), len(subtrahend))):
+            a = minuend[j] if j < len(minuend) else 0
+            b = subtrahend[j] if j < len(subtrahend) else 0
+            difference.append(a ^ b ^ borrow)
+            borrow = ((mask ^ a) & (b | borrow)) | (b & borrow)
+        return difference
+
+    def _equal_to(self, slices, value, mask):
+        """
+        :return:
+            bitmap of the recipes (of mask) whose bit-sliced counter equals value
+        """
+        if value >> len(slices) != 0:
+            return 0
+        bitmap = mask
+        for j, bit_slice in enumerate(slices):
+            bitmap &= bit_slice if (value >> j) & 1 else mask ^ (bit_slice & mask)
+            if bitmap == 0:
+                return 0
+        return bitmap
+
+    def _ordinals(self, bitmap):
+        """
+        This generator yields the ordinals set in a bitmap, lowest first
+        """
+        while bitmap:
+            low = bitmap & -bitmap
+            yield low.bit_length() - 1
+            bitmap ^= low
+
+    def top_recipes(self, ingredients, n=10, offset=0):
+        """
+        This function ranks the recipes having at least one of the ingredients by the number of ingredients they lack,
+        then by the number of supplied ingredients they have, then in the order they were added
+
+        :param ingredients:
+            The supplied ingredients
+        :param n: (Optional)
+            Maximum number of recipes to return
+        :param offset: (Optional)
+            Number of ranked recipes to skip
+
+        :return:
+            list of (summary, recipe, missing ingredient count, supplied ingredients had) tuples, best first
+        """
+        ingredients = set(ingredients)
+        matched_slices = []
+        ## Bitmap per line position of the recipes whose line is covered by a supplied ingredient
+        covered = []
+        candidates = 0
+        for ingredient in ingredients:
+            bitmap = 0
+            for position, line_bitmap in enumerate(self._ingredient_line_bitmaps(ingredient)):
+                if position == len(covered):
+                    covered.append(0)
+                covered[position] |= line_bitmap
+                bitmap |= line_bitmap
+            candidates |= bitmap
+            self._add_to_counter(matched_slices, bitmap)
+        covered_slices = []
+        for line_bitmap in covered:
+            self._add_to_counter(covered_slices, line_bitmap)
+        count_slices = [x & candidates for x in self._count_slices]
+        missing_slices = self._subtract(count_slices, covered_slices, candidates)
+        results = []
+        remaining = candidates
+        missing = 0
+        while remaining != 0 and len(results) < n:
+            missing_bitmap = self._equal_to(missing_slices, missing, remaining)
+            remaining &= ~missing_bitmap
+            for matched in range(len(ingredients), 0, -1):
+                if missing_bitmap == 0:
+                    break
+                bitmap = self._equal_to(matched_slices, matched, missing_bitmap)
+                missing_bitmap &= ~bitmap
+                for ordinal in self._ordinals(bitmap):
+                    if offset > 0:
+                        offset -= 1
+                        continue
+                    summary, recipe = self._recipes[ordinal]
+                    results.append((summary, recipe, missing, matched))
+                    if len(results) >= n:
+                        return results
+            missing += 1
+        return results
+
+    def recipes(self):
+        """
+        This generator yields the indexed recipes in ordinal order
+
+        :return:
+            generator of (summary, recipe) pairs
+        """
+        yield from self._recipes
+
+    def __len__(self):
+        return len(self._recipes)
+
+class CoverageRecipeSource:
+    """
+    This class serves the IngredientBitmapIndex ranking with the Food2ForkClient api_search and api_get_recipe contract,
+    so it can stand in for the client (e.g. in TakeHomeApplication). The sort parameter is ignored, results are always
+    ranked by the fewest missing ingredients. Search results get a 'missing_ingredients' count.
+    """
+    PAGE_SIZE = 30
+
+    def __init__(self, index):
+        """
+        Constructor function
+
+        :param index:
+            The IngredientBitmapIndex of the recipes
+        """
+        self._index = index
+        self._recipes_by_id = {}
+        for summary, recipe in index.recipes():
+            self._recipes_by_id[str(recipe.get('recipe_id', summary.get('recipe_id')))] = recipe
+
+    def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+        """
+        see Food2ForkClient.api_search
+        """
+        ingredients = [x.strip() for x in (q or '').split(',') if x.strip() != '']
+        limit = CoverageRecipeSource.PAGE_SIZE if max_recipes is None else min(max_recipes, CoverageRecipeSource.PAGE_SIZE)
+        offset = (max(int(page or 1), 1) - 1) * CoverageRecipeSource.PAGE_SIZE
+        recipes = []
+        for summary, _, missing, _ in self._index.top_recipes(ingredients, limit, offset):
+            summary = dict(summary)
+            summary['missing_ingredients'] = missing
+            recipes.append(summary)
+        return 200, {'count': len(recipes), 'recipes': recipes}
+
+    def api_get_recipe(self, rId):
+        """
+        see Food2ForkClient.api_get_recipe
+        A recipe that is not in the index is a 404
+        """
+        recipe = self._recipes_by_id.get(str(rId))
+        if recipe is None:
+            return 404, 'Recipe not found'
+        return 200, {'recipe': recipe}
+
+    def last_retry_after(self):
+        """
+        :return:
+            None, local responses never ask to wait
+        """
+        return None
+
+    def close(self):
+        """
+        Nothing to close, the index is in memory
+        """
+        pass
@@ -0,0 +1,119 @@
+"""@package ingredient_matcher
+This package includes the IngredientMatcher class, an Aho-Corasick automaton matching supplied ingredients in recipe lines
+"""
+from collections import deque
+
+class IngredientMatcher:
+    """
+    This class finds which of a list of ingredients occur (case insensitively, as substrings) in a line of text.
+
+    The ingredients are compiled once into an Aho-Corasick automaton, after which each line is lowercased once and scanned
+    in a single pass, whatever the number of ingredients. The same matcher can be reused for every recipe diffed against
+    the same ingredients.
+    """
+
+    def __init__(self, ingredients):
+        """
+        Constructor function
+
+        :param ingredients:
+            The ingredients to match, in the order matches are reported
+        """
+        self._ingredients = list(ingredients)
+        ## Transitions of each state, state 0 is the root
+        self._goto = [{}]
+        self._fail = [0]
+        ## Indices of the ingredients ending at each state, including those reached through failure links
+        self._output = [()]
+        ## An empty ingredient is found in every line
+        self._always = tuple(i for i, ingredient in enumerate(self._ingredients) if ingredient == '')
+        for i, ingredient in enumerate(self._ingredients):
+            if ingredient != '':
+                self._add(ingredient.lower(), i)
+        self._build_failure_links()
+
+    def _add(self, pattern, index):
+        """
+        Adds a pattern to the trie
+        """
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] = self._output[state] + (index,)
+
+    def _build_failure_links(self):
+        """
+        Links every state to the state of its longest proper suffix in the trie (breadth first) and merges their outputs
+        """
+        queue = deque(self._goto[0].values())
+        while len(queue) > 0:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail != 0 and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                fail = self._goto[fail].get(char, 0)
+                self._fail[next_state] = fail
+                self._output[next_state] = self._output[next_state] + self._output[fail]
+
+    def _scan(self, line):
+        """
+        This generator runs the automaton over the line
+
+        :return:
+            generator of the ingredient index tuples found at each position (with repeats)
+        """
+        if len(self._always) > 0:
+            yield self._always
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for char in line.lower():
+            while state != 0 and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield output[state]
+
+    def matches(self, line):
+        """
+        :param line:
+            The text to search, e.g. a recipe ingredient line
+
+        :return:
+            list of the ingredients found in the line, in the order they were given
+        """
+        found = set()
+        for indices in self._scan(line):
+            found.update(indices)
+        return [self._ingredients[i] for i in sorted(found)]
+
+    def contains_any(self, line):
+        """
+        :param line:
+            The text to search
+
+        :return:
+            True - at least one ingredient is in the line (stops scanning at the first one)
+            False - none is
+        """
+        for _ in self._scan(line):
+            return True
+        return False
+
+    def ingredients(self):
+        """
+        Accessor function for self._ingredients
+        :return:
+            list of the ingredients the matcher was built from
+        """
+        return list(self._ingredients)
@@ -1,41 +1,156 @@
 """@package run_tests
 This package includes the main entry point for the test suites
 """
+import json
 import sys
+import time
 from tests.api import APITestSuite
+from tests.bench import BenchmarkTestSuite
 from tests.spellcheck import SpellCheckTestSuite
+from tests.recipes import RecipesTestSuite
+from tests.telemetry import TelemetryTestSuite
 from tests.user_interface import UserInterfaceTestSuite
+from tests.test_base import ParallelTestRunner, format_slowest
+from telemetry.profiling import Profiler
+
+BENCH_RESULTS_PATH = './bench_results.json'
+SLOWEST_TESTS = 10
+
+def pop_option(args, name, default):
+    """
+    Removes an option and its (optional, integer) value from the arguments
+
+    :param args:
+        list of arguments, modified in place
+    :param name:
+        The option, e.g. --parallel
+    :param default:
+        The value if the option is given without one
+    :return:
+        The value, None if the option is not given
+    """
+    if name not in args:
+        return None
+    i = args.index(name)
+    del args[i]
+    if i < len(args) and args[i].isdigit():
+        return int(args.pop(i))
+    return default
+
+def profile_suites(suites, output_dir, timings):
+    """
+    Runs the suites one after another under a Profiler, each suite as a section, and writes the profiles
+
+    :param suites:
+        list of TestSuite subclasses
+    :param output_dir:
+        The directory of the pstats files and allocation report
+    :param timings:
+        list to append the test timings to, see TestSuite.run_suite
+    :return:
+        list of (title of test suite, number of passing tests, total number of tests)
+    """
+    profiler = Profiler()
+    profiler.start()
+    results = []
+    for suite in suites:
+        with profiler.section(suite.TITLE):
+            results.append(suite.run_suite(timings))
+    profiler.stop()
+    print("--- Profile ---")
+    for line in profiler.summary():
+        print(line)
+    for path in profiler.write(output_dir):
+        print("Wrote %s" % (path,))
+    return results
+
+def run_benchmarks(results_path):
+    """
+    Runs the microbenchmarks, prints a table of the results and writes them as JSON
+
+    :param results_path:
+        The path of the JSON results file
+    """
+    suite_title, results = BenchmarkTestSuite.run_suite()
+    print("--- %s ---" % (suite_title,))
+    for line in BenchmarkTestSuite.format_table(results):
+        print(line)
+    with open(results_path, 'w') as f:
+        json.dump({'suite': suite_title, 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+    print("Results written to %s" % (results_path,))
 
 def main(args):
     """
     Main Entry point of unit tests
-    Usage: python3 run_tests.py <test>
+    Usage: python3 run_tests.py <test> [--parallel [N]] [--slowest [N]] [--profile DIR]
+           python3 run_tests.py bench [results.json]
 
     :param args:
-        test
+        test and options
 
     test:
         all - all tests
         api - api tests
         spellcheck - spellcheck tests
+        recipes - recipes tests
+        telemetry - metrics and tracing tests
         user_interface - UI/State Machine tests
+        bench - microbenchmarks (not part of all), the results are also written as JSON to results.json
+    options:
+        --parallel [N] - run the tests on N worker processes (ParallelTestRunner.WORKERS by default)
+        --slowest [N] - list the N slowest tests with their wall time (SLOWEST_TESTS by default, implied by --parallel)
+        --profile DIR - run the suites serially under cProfile and tracemalloc and write a pstats file per suite and an
+                        allocation report to DIR
     """
-    if len(args) != 1:
+    args = list(args)
+    profile_dir = None
+    if '--profile' in args:
+        i = args.index('--profile')
+        del args[i]
+        profile_dir = args.pop(i) if i < len(args) else ''
+    workers = pop_option(args, '--parallel', ParallelTestRunner.WORKERS)
+    slowest = pop_option(args, '--slowest', SLOWEST_TESTS)
+    if (len(args) != 1 and not (len(args) == 2 and args[0] == 'bench')) or profile_dir == '':
         print("Invalid number of arguments")
-        print("Usage: python3 run_tests.py <test>")
-        print("test: all, api, spellcheck, user_interface")
+        print("Usage: python3 run_tests.py <test> [--parallel [N]] [--slowest [N]] [--profile DIR]")
+        print("test: all, api, spellcheck, recipes, telemetry, user_interface, bench")
         return
     test = args[0]
-    results = []
+    if test == 'bench':
+        run_benchmarks(args[1] if len(args) == 2 else BENCH_RESULTS_PATH)
+        return
+    suites = []
     if test == 'api' or test == 'all':
-        results.append(APITestSuite.run_suite())
+        suites.append(APITestSuite)
     if test == 'spellcheck' or test == 'all':
-        results.append(SpellCheckTestSuite.run_suite())
+        suites.append(SpellCheckTestSuite)
+    if test == 'recipes' or test == 'all':
+        suites.append(RecipesTestSuite)
+    if test == 'telemetry' or test == 'all':
+        suites.append(TelemetryTestSuite)
     if test == 'user_interface' or test == 'all':
-        results.append(UserInterfaceTestSuite.run_suite())
+        suites.append(UserInterfaceTestSuite)
+    start = time.perf_counter()
+    if profile_dir is not None:
+        timings = []
+        results = profile_suites(suites, profile_dir, timings)
+        workers = None
+    elif workers is not None:
+        runner = ParallelTestRunner(workers)
+        results = runner.run(suites)
+        timings = runner.timings
+    else:
+        timings = []
+        results = [suite.run_suite(timings) for suite in suites]
+    elapsed = time.perf_counter() - start
     print("--- Test Report ---")
     for (suite_title, num_success, total_tests) in results:
         print("%s - Passed: %s/%s" % (suite_title, num_success, total_tests,))
+    if slowest is not None or workers is not None:
+        print("--- Slowest Tests (%.3f seconds in total%s) ---" %
+              (elapsed, ', %s workers' % (workers,) if workers is not None else '',))
+        for line in format_slowest(timings, slowest or SLOWEST_TESTS):
+            print(line)
 
 if __name__ == '__main__':
-    main(sys.argv[1:])
\ No newline at end of file
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+"""@package background_loader
+This package includes the BackgroundDictionaryLoader class
+"""
+from spellcheck.english_dict import EnglishDictionary
+import threading
+import time
+
+class BackgroundDictionaryLoader:
+    """
+    This class loads an EnglishDictionary on a background thread, so the load can overlap with other work (e.g. waiting on input).
+    Callers only block in get() if the load has not finished yet.
+    """
+    def __init__(self, factory=EnglishDictionary):
+        """
+        Constructor function
+
+        Starts loading the dictionary right away
+
+        :param factory: (Optional)
+            The callable that creates the dictionary, EnglishDictionary by default
+        """
+        self._factory = factory
+        self._dictionary = None
+        self._exception = None
+        self._load_started = time.perf_counter()
+        self._load_finished = None
+        self._wait_time = 0.0
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._load, name='dictionary-loader', daemon=True)
+        self._thread.start()
+
+    def _load(self):
+        """
+        Thread target, creates the dictionary and stores it (or the exception that was raised)
+        """
+        try:
+            self._dictionary = self._factory()
+        except Exception as e:
+            self._exception = e
+        self._load_finished = time.perf_counter()
+        self._done.set()
+
+    def is_loaded(self):
+        """
+        :return:
+            True - the load has finished (successfully or not)
+            False - still loading
+        """
+        return self._done.is_set()
+
+    def get(self):
+        """
+        Accessor function for the dictionary, blocks until the load has finished
+
+        :return:
+            The loaded dictionary
+
+        Exceptions:
+            raises whatever exception the dictionary constructor raised
+        """
+        if not self._done.is_set():
+            wait_start = time.perf_counter()
+            self._done.wait()
+            # Only count the time until the load finished, not the time it took this thread to be scheduled again
+            self._wait_time += max(self._load_finished - wait_start, 0.0)
+        if self._exception is not None:
+            raise self._exception
+        return self._dictionary
+
+    def load_time(self):
+        """
+        :return:
+            seconds the load took, None if it has not finished
+        """
+        if self._load_finished is None:
+            return None
+        return self._load_finished - self._load_started
+
+    def wait_time(self):
+        """
+        :return:
+            total seconds callers spent blocked in get()
+        """
+        return self._wait_time
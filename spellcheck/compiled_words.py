@@ -0,0 +1,173 @@
+"""@package compiled_words
+This package includes the compiled word list format used to load the dictionary quickly
+
+Usage: python3 -m spellcheck.compiled_words [dictionary.json] [dictionary.words]
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+
+class StaleCompiledWordsException(Exception):
+    pass
+
+class CompiledWordList:
+    """
+    This class provides read-only access to a compiled word list file through mmap.
+
+    File layout (all integers little endian):
+        header  - magic, version, source file size, source file mtime (ns), number of words
+        offsets - one uint32 per word, the position of the word's record in the file
+        records - one per word, sorted by their UTF-8 bytes: uint16 length followed by the UTF-8 bytes
+
+    Only the words are kept (no definitions), and nothing is parsed up front, so loading is close to free.
+    Lookups are done by binary search over the offsets table.
+    """
+    MAGIC = b'EDWL'
+    VERSION = 1
+    HEADER = struct.Struct('<4sHHQQI')
+    OFFSET = struct.Struct('<I')
+    LENGTH = struct.Struct('<H')
+
+    @classmethod
+    def build(cls, json_path, out_path):
+        """
+        This function compiles the words (keys) of a JSON dictionary file into a word list file.
+
+        :param json_path:
+            The path of the JSON dictionary
+        :param out_path:
+            The path of the compiled word list to write
+
+        :return:
+            the number of words written
+
+        Exceptions:
+            raises JSONDecodeError if file is not a valid JSON string
+            raises FileNotFoundError if file is not present
+        """
+        with open(json_path) as f:
+            words = json.load(f)
+        return cls.write(words, out_path, json_path)
+
+    @classmethod
+    def write(cls, words, out_path, source_path):
+        """
+        This function writes a compiled word list file.
+        The file is written to a temporary path first and then renamed, so readers never see a partial file.
+
+        :param words:
+            An iterable of the words to write
+        :param out_path:
+            The path of the compiled word list to write
+        :param source_path:
+            The JSON dictionary the words came from, its size and modification time are recorded to detect staleness
+
+        :return:
+            the number of words written
+        """
+        src_stat = os.stat(source_path)
+        words = sorted(word.encode('utf-8') for word in words)
+        offsets = []
+        records = bytearray()
+        records_start = cls.HEADER.size + cls.OFFSET.size * len(words)
+        for word in words:
+            offsets.append(records_start + len(records))
+            records += cls.LENGTH.pack(len(word))
+            records += word
+        tmp_path = out_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, 0, src_stat.st_size, src_stat.st_mtime_ns, len(words)))
+            f.write(b''.join(cls.OFFSET.pack(offset) for offset in offsets))
+            f.write(records)
+        os.replace(tmp_path, out_path)
+        return len(words)
+
+    def __init__(self, path, source_path=None):
+        """
+        Constructor function
+
+        Memory maps the compiled word list and validates its header
+
+        :param path:
+            The path of the compiled word list
+        :param source_path: (Optional)
+            The JSON dictionary the list was compiled from. If it is present and has changed since, the list is stale
+
+        Exceptions:
+            raises FileNotFoundError if file is not present
+            raises ValueError if the file is not a compiled word list
+            raises StaleCompiledWordsException if the source file changed since the list was compiled
+        """
+        self._mmap = None
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < CompiledWordList.HEADER.size:
+                raise ValueError("Not a compiled word list: %s" % (path,))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _, src_size, src_mtime_ns, self._count = CompiledWordList.HEADER.unpack_from(self._mmap, 0)
+        if magic != CompiledWordList.MAGIC or version != CompiledWordList.VERSION:
+            self.close()
+            raise ValueError("Not a compiled word list: %s" % (path,))
+        if source_path is not None and os.path.exists(source_path):
+            src_stat = os.stat(source_path)
+            if src_stat.st_size != src_size or src_stat.st_mtime_ns != src_mtime_ns:
+                self.close()
+                raise StaleCompiledWordsException("%s is older than %s" % (path, source_path,))
+
+    def close(self):
+        """
+        Unmaps the file
+        """
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def _word_at(self, i):
+        """
+        This function reads the i-th word's UTF-8 bytes
+
+        :param i:
+            The index of the word (in sorted order)
+
+        :return:
+            bytes of the word
+        """
+        (offset,) = CompiledWordList.OFFSET.unpack_from(self._mmap, CompiledWordList.HEADER.size + CompiledWordList.OFFSET.size * i)
+        (length,) = CompiledWordList.LENGTH.unpack_from(self._mmap, offset)
+        start = offset + CompiledWordList.LENGTH.size
+        return self._mmap[start:start + length]
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, word):
+        """
+        Binary search for word
+
+        :param word:
+            The word to look up (case sensitive)
+
+        :return:
+            True - the word is in the list
+            False - the word is not in the list
+        """
+        key = word.encode('utf-8')
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < self._count and self._word_at(lo) == key
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self._word_at(i).decode('utf-8')
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    json_path = args[0] if len(args) > 0 else './dictionary.json'
+    out_path = args[1] if len(args) > 1 else os.path.splitext(json_path)[0] + '.words'
+    print("Compiled %s words into %s" % (CompiledWordList.build(json_path, out_path), out_path,))
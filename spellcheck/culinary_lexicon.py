@@ -0,0 +1,59 @@
+"""@package culinary_lexicon
+This package includes the CulinaryLexicon class, a small list of food words that is spell checked before the full dictionary
+"""
+from spellcheck.suggestion_index import NGramIndex
+
+## Common single word ingredient names and cooking terms (uppercase, like the dictionary keys)
+CULINARY_WORDS = frozenset("""
+ALLSPICE ALMOND ALMONDS ANCHOVIES ANCHOVY ANISE APPLE APPLES APRICOT APRICOTS ARROWROOT ARTICHOKE ARTICHOKES ARUGULA
+ASPARAGUS AVOCADO AVOCADOS BACON BAGEL BAGELS BAGUETTE BAKING BALSAMIC BANANA BANANAS BARLEY BASIL BASMATI BAY BEAN
+BEANS BEEF BEER BEET BEETS BELL BERRIES BISCUIT BISCUITS BLACKBERRIES BLUEBERRIES BOK BOURBON BRANDY BREAD
+BREADCRUMBS BREAST BREASTS BRISKET BROCCOLI BROTH BROWN BRUSSELS BUCKWHEAT BULGUR BUN BUNS BUTTER BUTTERMILK
+BUTTERNUT CABBAGE CAKE CANTALOUPE CAPERS CARAMEL CARDAMOM CARROT CARROTS CASHEW CASHEWS CAULIFLOWER CAYENNE CELERY
+CHARD CHEDDAR CHEESE CHERRIES CHERRY CHESTNUTS CHICKEN CHICKPEAS CHILE CHILES CHILI CHILIES CHIPOTLE CHIVES
+CHOCOLATE CHORIZO CIDER CILANTRO CINNAMON CITRUS CLAMS CLOVE CLOVES COCOA COCONUT COD COFFEE COGNAC COLLARD CORN
+CORNMEAL CORNSTARCH COUSCOUS CRAB CRACKERS CRANBERRIES CRANBERRY CREAM CUCUMBER CUCUMBERS CUMIN CURRANTS CURRY
+CUSTARD DATES DILL DOUGH DUCK DUMPLINGS EDAMAME EGG EGGPLANT EGGPLANTS EGGS ENDIVE ESPRESSO EXTRACT FARRO FENNEL
+FETA FIG FIGS FILLET FILLETS FISH FLANK FLAXSEED FLOUR FRUIT GARLIC GELATIN GHEE GIN GINGER GOAT GORGONZOLA GOUDA
+GRAHAM GRANOLA GRAPE GRAPEFRUIT GRAPES GRAVY GREENS GRITS GROUND GRUYERE HALIBUT HAM HAZELNUTS HERBS HONEY
+HORSERADISH HUMMUS JALAPENO JALAPENOS JAM JELLY KALE KETCHUP KIDNEY KIWI LAMB LARD LEEK LEEKS LEGS LEMON LEMONGRASS
+LEMONS LENTILS LETTUCE LIME LIMES LINGUINE LIQUEUR LOBSTER MACARONI MANGO MANGOES MAPLE MARGARINE MARINARA MARJORAM
+MARSHMALLOWS MASCARPONE MAYONNAISE MEAT MEATBALLS MELON MILK MINT MISO MOLASSES MOZZARELLA MUSHROOM MUSHROOMS MUSSELS
+MUSTARD NECTARINES NOODLES NUTMEG NUTS OATMEAL OATS OIL OKRA OLIVE OLIVES ONION ONIONS ORANGE ORANGES OREGANO ORZO
+OYSTERS PANCETTA PAPRIKA PARMESAN PARSLEY PARSNIPS PASTA PASTRY PEA PEACH PEACHES PEANUT PEANUTS PEAR PEARS PEAS
+PECAN PECANS PECORINO PENNE PEPPER PEPPERCORNS PEPPERONI PEPPERS PESTO PICKLES PIE PINE PINEAPPLE PISTACHIOS PITA
+PIZZA PLUMS POLENTA POMEGRANATE PORK POTATO POTATOES POWDER PROSCIUTTO PRUNES PUMPKIN QUINOA RADISH RADISHES RAISINS
+RASPBERRIES RHUBARB RIB RIBS RICE RICOTTA ROSEMARY RUM RYE SAFFRON SAGE SALAD SALAMI SALMON SALSA SALT SARDINES SAUCE
+SAUSAGE SAUSAGES SCALLIONS SCALLOPS SESAME SHALLOT SHALLOTS SHERRY SHORTENING SHRIMP SIRLOIN SODA SOUR SOY SOYBEANS
+SPAGHETTI SPINACH SQUASH SQUID STEAK STOCK STRAWBERRIES SUGAR SYRUP TAHINI TAMARIND TARRAGON TARTAR TEA TEQUILA THIGHS
+THYME TILAPIA TOFU TOMATILLOS TOMATO TOMATOES TORTILLA TORTILLAS TUNA TURKEY TURMERIC TURNIPS VANILLA VEAL VEGETABLE
+VEGETABLES VENISON VERMOUTH VINEGAR VODKA WALNUT WALNUTS WASABI WATER WATERCRESS WATERMELON WHEAT WHISKEY WINE
+WORCESTERSHIRE YAM YAMS YEAST YOGURT ZEST ZUCCHINI
+""".split())
+
+class CulinaryLexicon:
+    """
+    This class provides spell checking against CULINARY_WORDS.
+    It is small enough to be fuzzy matched in a fraction of the time of the full dictionary, and it only suggests food words.
+    """
+    def __init__(self, words=CULINARY_WORDS):
+        """
+        Constructor function
+
+        :param words: (Optional)
+            The lexicon words (uppercase), CULINARY_WORDS by default
+        """
+        self._words = frozenset(words)
+        self._index = NGramIndex(self._words)
+
+    def __len__(self):
+        return len(self._words)
+
+    def __contains__(self, word):
+        return word in self._words
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        """
+        See NGramIndex.get_close_matches
+        """
+        return self._index.get_close_matches(word, n, cutoff)
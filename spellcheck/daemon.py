@@ -0,0 +1,481 @@
+"""@package daemon
+This package includes the spell check daemon, which keeps an EnglishDictionary (and its suggestion index) loaded and
+serves it over a Unix domain socket, and DaemonSpellChecker, the client that stands in for EnglishDictionary.
+
+Protocol (every message is a frame):
+    frame    - 4 byte big-endian payload length, 1 byte code, payload (UTF-8)
+    requests - code C (spell_check), payload: the word
+               code M (spell_check_many), payload: the words (at least one), one per line
+               code P (ping), no payload
+    replies  - code 0 (ok), payload: one line per word, '1' if it is spelled correctly, otherwise '0' followed by its
+               tab separated suggestions (nothing for a ping)
+               code 1 (error), payload: the error message
+A connection can carry any number of requests, each answered in order.
+
+Usage:
+    python3 -m spellcheck.daemon --socket ./spellcheck.sock
+"""
+from spellcheck.english_dict import EnglishDictionary, report_spell_check_many
+from telemetry.metrics import METRICS
+import argparse
+import os
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import weakref
+
+## The socket the daemon listens on and clients connect to by default
+SOCKET_PATH = './spellcheck.sock'
+## Largest payload accepted, in bytes
+MAX_PAYLOAD = 1024 * 1024
+
+_HEADER = struct.Struct('!IB')
+REQUEST_SPELL_CHECK = ord('C')
+REQUEST_SPELL_CHECK_MANY = ord('M')
+REQUEST_PING = ord('P')
+REPLY_OK = 0
+REPLY_ERROR = 1
+
+class SpellCheckProtocolException(Exception):
+    """
+    Raised when a frame is malformed or the daemon replies with an error
+    """
+    pass
+
+def _read_exactly(stream, size):
+    """
+    :return:
+        size bytes read from a file-like object, b'' if it was at its end
+
+    Exceptions:
+        raises SpellCheckProtocolException if it ends part way
+    """
+    data = stream.read(size)
+    if len(data) not in (0, size):
+        raise SpellCheckProtocolException('Connection closed part way through a frame')
+    return data
+
+def read_frame(stream):
+    """
+    This function reads one frame
+
+    :param stream:
+        A binary file-like object, e.g. socket.makefile('rb')
+    :return:
+        code, payload bytes; None if the stream ended before the frame
+
+    Exceptions:
+        raises SpellCheckProtocolException if the frame is malformed or too large
+    """
+    header = _read_exactly(stream, _HEADER.size)
+    if header == b'':
+        return None
+    length, code = _HEADER.unpack(header)
+    if length > MAX_PAYLOAD:
+        raise SpellCheckProtocolException('Frame of %s bytes is too large' % (length,))
+    payload = _read_exactly(stream, length) if length > 0 else b''
+    if len(payload) != length:
+        raise SpellCheckProtocolException('Connection closed part way through a frame')
+    return code, payload
+
+def encode_frame(code, payload=b''):
+    """
+    :return:
+        the frame bytes
+    """
+    return _HEADER.pack(len(payload), code) + payload
+
+def encode_results(results):
+    """
+    :param results:
+        list of spell_check results
+    :return:
+        the reply payload
+    """
+    lines = ['1' if correct else '0' + '\t'.join(suggestions) for correct, _, suggestions in results]
+    return '\n'.join(lines).encode('utf-8')
+
+def decode_results(words, payload):
+    """
+    :param words:
+        The words that were checked
+    :param payload:
+        The reply payload
+    :return:
+        list of spell_check results, one per word
+
+    Exceptions:
+        raises SpellCheckProtocolException if the payload doesn't have one line per word
+    """
+    lines = payload.decode('utf-8').split('\n')
+    if len(lines) != len(words):
+        raise SpellCheckProtocolException('Expected %s results, got %s' % (len(words), len(lines),))
+    results = []
+    for word, line in zip(words, lines):
+        if line.startswith('1'):
+            results.append((True, word, []))
+        else:
+            results.append((False, word, line[1:].split('\t') if len(line) > 1 else []))
+    return results
+
+class SpellCheckRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Answers the requests of one connection until the client closes it (or the daemon stops)
+    """
+
+    def setup(self):
+        super(SpellCheckRequestHandler, self).setup()
+        with self.server.connections_lock:
+            self.server.connections.add(self.connection)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.connection)
+        super(SpellCheckRequestHandler, self).finish()
+
+    def handle(self):
+        dictionary = self.server.dictionary
+        while True:
+            try:
+                frame = read_frame(self.rfile)
+            except SpellCheckProtocolException as e:
+                self.wfile.write(encode_frame(REPLY_ERROR, str(e).encode('utf-8')))
+                return
+            if frame is None:
+                return
+            code, payload = frame
+            try:
+                if code == REQUEST_SPELL_CHECK:
+                    reply = encode_results([dictionary.spell_check(payload.decode('utf-8'))])
+                elif code == REQUEST_SPELL_CHECK_MANY:
+                    words = payload.decode('utf-8').split('\n')
+                    reply = encode_results(dictionary.spell_check_many(words))
+                elif code == REQUEST_PING:
+                    reply = b''
+                else:
+                    self.wfile.write(encode_frame(REPLY_ERROR, b'Unknown request'))
+                    continue
+            except UnicodeDecodeError:
+                self.wfile.write(encode_frame(REPLY_ERROR, b'Payload is not UTF-8'))
+                continue
+            self.wfile.write(encode_frame(REPLY_OK, reply))
+
+class SpellCheckDaemon:
+    """
+    This class serves an EnglishDictionary over a Unix domain socket, one thread per connection.
+    The dictionary and its suggestion index are loaded once, before the socket starts accepting connections.
+    """
+
+    def __init__(self, path=None, dictionary=None):
+        """
+        Constructor function
+
+        Loads the dictionary (unless one is given) and binds the socket. A socket file left behind by a daemon that is no
+        longer running is replaced, the socket is only accessible to the current user.
+
+        :param path: (Optional)
+            The socket path, SOCKET_PATH by default
+        :param dictionary: (Optional)
+            The dictionary to serve, a new EnglishDictionary by default
+
+        Exceptions:
+            raises OSError if another daemon is listening on the path or it can't be bound
+        """
+        self._path = path or SOCKET_PATH
+        if os.path.exists(self._path):
+            if is_daemon_running(self._path):
+                raise OSError('A spell check daemon is already running on %s' % (self._path,))
+            os.unlink(self._path)
+        self._dictionary = dictionary if dictionary is not None else EnglishDictionary()
+        self._dictionary.warm_up()
+        self._server = socketserver.ThreadingUnixStreamServer(self._path, SpellCheckRequestHandler)
+        self._server.daemon_threads = True
+        self._server.dictionary = self._dictionary
+        self._server.connections = set()
+        self._server.connections_lock = threading.Lock()
+        os.chmod(self._path, 0o600)
+        self._thread = None
+
+    def path(self):
+        return self._path
+
+    def start(self):
+        """
+        Starts serving on a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='spellcheck-daemon', daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stops serving, drops the open connections, removes the socket file and closes the dictionary
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+        with self._server.connections_lock:
+            for connection in self._server.connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        try:
+            os.unlink(self._path)
+        except OSError:
+            pass
+        self._dictionary.close()
+
+class _ThreadConnection:
+    """
+    This class holds a thread's connection to the daemon in the thread's threading.local, it is dropped with the
+    thread's locals when the thread exits, see DaemonSpellChecker._connect
+    """
+
+    def __init__(self, connection):
+        """
+        Constructor function
+
+        :param connection:
+            socket, reader
+        """
+        self.connection = connection
+
+class DaemonSpellChecker:
+    """
+    This class is a client of the spell check daemon with the EnglishDictionary interface (spell_check,
+    spell_check_many and close). Each thread using it gets its own connection, so requests of several threads are
+    answered concurrently by the daemon instead of queueing on one connection, and the connection is closed once the
+    thread exits.
+    Replies are waited for without a timeout, since checking many misspelled words can take a while: a daemon that stops
+    closes its connections, and the client then switches to the fallback dictionary (when it has one).
+    """
+    CONNECT_TIMEOUT = 5
+
+    def __init__(self, path=None, fallback=None):
+        """
+        Constructor function
+
+        Connects to the daemon
+
+        :param path: (Optional)
+            The socket path, SOCKET_PATH by default
+        :param fallback: (Optional)
+            callable creating the dictionary to use if the daemon stops answering, e.g. EnglishDictionary
+
+        Exceptions:
+            raises OSError if the daemon is not running
+        """
+        self._path = path or SOCKET_PATH
+        self._fallback = fallback
+        self._dictionary = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        ## (socket, reader) of every live thread's connection, to close them all
+        self._connections = []
+        self._connect()
+
+    def _connect(self):
+        """
+        This function opens the calling thread's connection
+
+        :return:
+            socket, reader
+
+        Exceptions:
+            raises OSError if the daemon is not running
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(DaemonSpellChecker.CONNECT_TIMEOUT)
+            sock.connect(self._path)
+            sock.settimeout(None)
+        except OSError:
+            sock.close()
+            raise
+        connection = (sock, sock.makefile('rb'))
+        with self._lock:
+            self._connections.append(connection)
+        holder = _ThreadConnection(connection)
+        weakref.finalize(holder, DaemonSpellChecker._release, self._lock, self._connections, connection)
+        self._local.connection = holder
+        return connection
+
+    @staticmethod
+    def _release(lock, connections, connection):
+        """
+        This function closes a connection whose thread exited, unless close() already did
+
+        :param lock:
+            The client's lock
+        :param connections:
+            The client's list of open connections
+        :param connection:
+            socket, reader
+        """
+        with lock:
+            if connection not in connections:
+                return
+            connections.remove(connection)
+        sock, rfile = connection
+        rfile.close()
+        sock.close()
+
+    def _request(self, code, payload=b''):
+        """
+        This function sends a request on the calling thread's connection and waits for its reply
+
+        :return:
+            reply payload
+
+        Exceptions:
+            raises OSError if the connection failed
+            raises SpellCheckProtocolException if the daemon replied with an error or the connection was closed
+        """
+        holder = getattr(self._local, 'connection', None)
+        sock, rfile = holder.connection if holder is not None else self._connect()
+        sock.sendall(encode_frame(code, payload))
+        frame = read_frame(rfile)
+        if frame is None:
+            raise SpellCheckProtocolException('The daemon closed the connection')
+        reply_code, reply = frame
+        if reply_code != REPLY_OK:
+            raise SpellCheckProtocolException(reply.decode('utf-8', 'replace'))
+        return reply
+
+    def _fallback_dictionary(self, e):
+        """
+        :return:
+            the fallback dictionary, created on first use
+
+        Exceptions:
+            re-raises e if there is no fallback
+        """
+        if self._fallback is None:
+            raise e
+        with self._lock:
+            if self._dictionary is None:
+                self._dictionary = self._fallback()
+        return self._dictionary
+
+    def ping(self):
+        """
+        Exceptions:
+            raises OSError or SpellCheckProtocolException if the daemon doesn't answer
+        """
+        self._request(REQUEST_PING)
+
+    def spell_check(self, word):
+        """
+        see EnglishDictionary.spell_check
+        """
+        if self._dictionary is not None:
+            return self._dictionary.spell_check(word)
+        try:
+            return decode_results([word], self._request(REQUEST_SPELL_CHECK, word.encode('utf-8')))[0]
+        except (OSError, SpellCheckProtocolException) as e:
+            return self._fallback_dictionary(e).spell_check(word)
+
+    def spell_check_many(self, words):
+        """
+        see EnglishDictionary.spell_check_many
+        """
+        if self._dictionary is not None:
+            return self._dictionary.spell_check_many(words)
+        with METRICS.span('spellcheck_many') as span:
+            results, mode = self._spell_check_many(words)
+            report_spell_check_many(span, mode, results)
+        return results
+
+    def _spell_check_many(self, words):
+        """
+        see spell_check_many, without the instrumentation
+
+        :return:
+            list of spell_check results, 'daemon' if the daemon checked the words, 'fallback' if the fallback dictionary did
+        """
+        if len(words) == 0:
+            return [], 'daemon'
+        if any('\n' in word for word in words):
+            return [self.spell_check(word) for word in words], 'daemon'
+        try:
+            return decode_results(words, self._request(REQUEST_SPELL_CHECK_MANY, '\n'.join(words).encode('utf-8'))), 'daemon'
+        except (OSError, SpellCheckProtocolException) as e:
+            return self._fallback_dictionary(e).spell_check_many(words), 'fallback'
+
+    def close(self):
+        """
+        Closes the connections (and the fallback dictionary, if it was created)
+        """
+        with self._lock:
+            connections = list(self._connections)
+            del self._connections[:]
+        for sock, rfile in connections:
+            rfile.close()
+            sock.close()
+        if self._dictionary is not None:
+            self._dictionary.close()
+
+def is_daemon_running(path=None):
+    """
+    :param path: (Optional)
+        The socket path, SOCKET_PATH by default
+    :return:
+        True - a daemon answered a ping on the socket
+        False - it didn't
+    """
+    try:
+        client = DaemonSpellChecker(path)
+    except OSError:
+        return False
+    try:
+        client.ping()
+        return True
+    except (OSError, SpellCheckProtocolException):
+        return False
+    finally:
+        client.close()
+
+def load_spell_checker(path=None):
+    """
+    This function connects to the spell check daemon if it is running, and loads the dictionary in this process if not.
+    It is the default BackgroundDictionaryLoader factory of TakeHomeApplication.
+
+    :param path: (Optional)
+        The socket path, SOCKET_PATH by default
+    :return:
+        DaemonSpellChecker (falling back to EnglishDictionary if the daemon stops) or EnglishDictionary
+    """
+    if os.path.exists(path or SOCKET_PATH):
+        try:
+            client = DaemonSpellChecker(path, EnglishDictionary)
+        except OSError:
+            return EnglishDictionary()
+        try:
+            client.ping()
+            return client
+        except (OSError, SpellCheckProtocolException):
+            client.close()
+    return EnglishDictionary()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep the spell check dictionary loaded and serve it over a Unix socket')
+    parser.add_argument('--socket', default=SOCKET_PATH, help='the socket path')
+    args = parser.parse_args()
+    # Stop cleanly (removing the socket file) when terminated
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    daemon = SpellCheckDaemon(args.socket)
+    print("Serving spell checks on %s" % (daemon.path(),))
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
@@ -1,26 +1,161 @@
 """@package english_dict
 This package includes the EnglishDictionary class
 """
+from concurrent.futures import ProcessPoolExecutor
 import json
-import difflib
+import os
+import threading
+from spellcheck.compiled_words import CompiledWordList, StaleCompiledWordsException
+from spellcheck.culinary_lexicon import CulinaryLexicon
+from spellcheck.suggestion_cache import SuggestionCache
+from spellcheck.suggestion_index import NGramIndex
+from telemetry.metrics import METRICS
+
+## The dictionary owned by a spell_check_many worker process
+_worker_dictionary = None
+
+def report_spell_check_many(span, mode, results):
+    """
+    This function reports a spell_check_many call: the mode label of its 'spellcheck_many' span, the number of words and
+    misspelled words as span attributes and to the spellcheck_many_words_total and spellcheck_many_misses_total counters
+
+    :param span:
+        The call's span
+    :param mode:
+        How the words were checked, e.g. 'pool'
+    :param results:
+        The spell_check_many results
+    """
+    span.set_label('mode', mode)
+    if not METRICS.enabled:
+        return
+    misses = sum(1 for correct, _, _ in results if not correct)
+    span.set_attribute('words', len(results))
+    span.set_attribute('misses', misses)
+    METRICS.increment('spellcheck_many_words_total', len(results), mode=mode)
+    METRICS.increment('spellcheck_many_misses_total', misses, mode=mode)
+
+def _init_worker():
+    """
+    Process pool initializer, loads a warm copy of the dictionary once per worker process
+    """
+    global _worker_dictionary
+    _worker_dictionary = EnglishDictionary(persistent_cache=False)
+
+def _worker_suggestions(word):
+    """
+    Process pool task, finds the suggestions for one misspelled word
+
+    :param word:
+        The misspelled word (uppercase)
+
+    :return:
+        list containing suggestions (lowercase)
+    """
+    return _worker_dictionary._suggestions(word)
 
 class EnglishDictionary:
     """
     This class provides spell checking with suggestions if a word is misspelled
+
+    Words are checked against a small culinary lexicon first and then against the full dictionary.
+    Suggestions come from the lexicon if any lexicon word scores at least LEXICON_CUTOFF, otherwise from the full dictionary.
     """
-    def __init__(self):
+    DICTIONARY_PATH = './dictionary.json'
+    COMPILED_PATH = './dictionary.words'
+    SUGGESTION_CACHE_PATH = './dictionary.suggestions.sqlite'
+    ## Bump whenever the suggestion algorithm changes, so persisted suggestions get invalidated
+    SUGGESTION_VERSION = 2
+    ## Minimum similarity for a culinary lexicon suggestion to win over the full dictionary
+    LEXICON_CUTOFF = 0.75
+    ## Below this many distinct misspelled words, spell_check_many scores in-process since the pool round-trip costs more
+    PARALLEL_MIN_MISSES = 4
+    ## Worker processes in the spell_check_many pool, None means one per CPU
+    MAX_WORKERS = None
+
+    def __init__(self, persistent_cache=True):
         """
         Constructor function
 
-        Loads the 'dictionary.json' file and initializes self._eng_dict to the parsed contents in the file.
+        Memory maps the compiled 'dictionary.words' file and initializes self._eng_dict to it.
+        If the compiled file is missing or older than 'dictionary.json', the words are loaded from 'dictionary.json' instead
+        and the compiled file is rebuilt for the next time.
+
+        :param persistent_cache: (Optional)
+            True - suggestions are also cached in 'dictionary.suggestions.sqlite' and survive restarts
+            False - suggestions are only cached in memory
 
         Exceptions:
             raises JSONDecodeError if file is not a valid JSON string
-            raises FileNotFoundError if file is not present
+            raises FileNotFoundError if neither file is present
         """
         self._eng_dict = None
-        with open('./dictionary.json') as f:
-            self._eng_dict = json.load(f)
+        self._lexicon = CulinaryLexicon()
+        self._suggestion_index = None
+        self._pool = None
+        ## Guards the lazily created index and pool, so the dictionary can be shared by threads
+        self._lock = threading.Lock()
+        with METRICS.span('spellcheck_load') as span:
+            try:
+                self._eng_dict = CompiledWordList(EnglishDictionary.COMPILED_PATH, EnglishDictionary.DICTIONARY_PATH)
+                span.set_label('source', 'compiled')
+            except (OSError, ValueError, StaleCompiledWordsException):
+                self._eng_dict = self._load_json_words()
+                span.set_label('source', 'json')
+        self._suggestion_cache = SuggestionCache(self._fingerprint(),
+                                                 EnglishDictionary.SUGGESTION_CACHE_PATH if persistent_cache else None)
+
+    def _fingerprint(self):
+        """
+        This function identifies the dictionary file and suggestion algorithm, so cached suggestions from another
+        version of either are never used
+
+        :return:
+            fingerprint string
+        """
+        for path in [EnglishDictionary.DICTIONARY_PATH, EnglishDictionary.COMPILED_PATH]:
+            try:
+                stat = os.stat(path)
+                return "%s:%s:%s:%s" % (EnglishDictionary.SUGGESTION_VERSION, path, stat.st_size, stat.st_mtime_ns,)
+            except OSError:
+                pass
+        return "%s:%s" % (EnglishDictionary.SUGGESTION_VERSION, len(self._eng_dict),)
+
+    def _load_json_words(self):
+        """
+        This function loads the words from 'dictionary.json' (the definitions are dropped) and tries to rebuild the compiled file.
+        Failing to write the compiled file is not an error, it only means the next load will be slow too.
+
+        :return:
+            frozenset of the dictionary words
+        """
+        with open(EnglishDictionary.DICTIONARY_PATH) as f:
+            words = frozenset(json.load(f))
+        try:
+            CompiledWordList.write(words, EnglishDictionary.COMPILED_PATH, EnglishDictionary.DICTIONARY_PATH)
+        except OSError:
+            pass
+        return words
+
+    def _get_suggestion_index(self):
+        """
+        Accessor function for self._suggestion_index
+        The index is built on the first misspelled word, so correctly spelled input never pays for it
+
+        :return:
+            NGramIndex over the dictionary words
+        """
+        with self._lock:
+            if self._suggestion_index is None:
+                with METRICS.span('spellcheck_index_build'):
+                    self._suggestion_index = NGramIndex(self._eng_dict)
+            return self._suggestion_index
+
+    def warm_up(self):
+        """
+        This function builds the suggestion index now instead of on the first misspelled word, for long-lived processes
+        """
+        self._get_suggestion_index()
 
     def spell_check(self, word):
         """
@@ -33,7 +168,150 @@ class EnglishDictionary:
             Correct spelling - True, word, empty list
             Incorrect spelling - False, word, list containing suggestions (lowercase).
         """
-        if word.upper() in self._eng_dict:
+        if not METRICS.enabled:
+            return self._spell_check(word)
+        with METRICS.span('spellcheck') as span:
+            result = self._spell_check(word)
+            span.set_label('correct', result[0])
+        return result
+
+    def _spell_check(self, word):
+        """
+        see spell_check, without the instrumentation
+        """
+        if self._is_word(word.upper()):
             return True, word, []
-        suggestions = [x.lower() for x in difflib.get_close_matches(word.upper(), self._eng_dict.keys())]
-        return False, word, suggestions
\ No newline at end of file
+        return False, word, self._cached_suggestions(word.upper())
+
+    def _is_word(self, word):
+        """
+        :param word:
+            The word to look up (uppercase)
+
+        :return:
+            True - the word is in the culinary lexicon or the dictionary
+            False - the word is misspelled
+        """
+        return word in self._lexicon or word in self._eng_dict
+
+    def _cached_suggestions(self, word):
+        """
+        This function finds the suggestions for a misspelled word, going through the suggestion cache
+
+        :param word:
+            The misspelled word (uppercase)
+
+        :return:
+            list containing suggestions (lowercase)
+        """
+        suggestions = self._suggestion_cache.get(word)
+        if suggestions is None:
+            suggestions = self._suggestions(word)
+            self._suggestion_cache.put(word, suggestions)
+        return suggestions
+
+    def cache_stats(self):
+        """
+        :return:
+            dict with the suggestion cache hit/miss counters, see SuggestionCache.stats()
+        """
+        return self._suggestion_cache.stats()
+
+    def _suggestions(self, word):
+        """
+        This function finds the suggestions for a misspelled word
+        The culinary lexicon is tried first, the full dictionary is only searched if the lexicon has no close enough match
+
+        :param word:
+            The misspelled word (uppercase)
+
+        :return:
+            list containing suggestions (lowercase)
+        """
+        matches = self._lexicon.get_close_matches(word, cutoff=EnglishDictionary.LEXICON_CUTOFF)
+        if len(matches) == 0:
+            matches = self._get_suggestion_index().get_close_matches(word)
+        return [x.lower() for x in matches]
+
+    def _num_workers(self):
+        """
+        :return:
+            the number of worker processes in the spell_check_many pool
+        """
+        return EnglishDictionary.MAX_WORKERS or os.cpu_count() or 1
+
+    def _get_pool(self):
+        """
+        Accessor function for self._pool
+        The pool is created the first time it is needed, each worker loads its own copy of the dictionary once
+
+        :return:
+            ProcessPoolExecutor
+        """
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self._num_workers(), initializer=_init_worker)
+            return self._pool
+
+    def spell_check_many(self, words):
+        """
+        This function provides spell checking on many words at once
+
+        Duplicate words (case insensitive) are only checked once and cached suggestions are reused.
+        If there are at least PARALLEL_MIN_MISSES uncached misspelled words, their suggestions are found in parallel
+        on a process pool, otherwise in this process.
+
+        :param words:
+            The words to spell check. They are case insensitive
+
+        :return:
+            list with one spell_check result per word, in the same order as words
+        """
+        with METRICS.span('spellcheck_many') as span:
+            results, mode = self._spell_check_many(words)
+            report_spell_check_many(span, mode, results)
+        return results
+
+    def _spell_check_many(self, words):
+        """
+        see spell_check_many, without the instrumentation
+
+        :return:
+            list of spell_check results, 'pool' if the suggestions were found on the process pool, 'in_process' if not
+        """
+        suggestions = {}
+        misses = []
+        for upper_word in dict.fromkeys(word.upper() for word in words):
+            if self._is_word(upper_word):
+                continue
+            cached = self._suggestion_cache.get(upper_word)
+            if cached is not None:
+                suggestions[upper_word] = cached
+            else:
+                misses.append(upper_word)
+        mode = 'pool' if len(misses) >= EnglishDictionary.PARALLEL_MIN_MISSES else 'in_process'
+        if mode == 'pool':
+            chunksize = max(1, len(misses) // (self._num_workers() * 4))
+            found = zip(misses, self._get_pool().map(_worker_suggestions, misses, chunksize=chunksize))
+        else:
+            found = ((upper_word, self._suggestions(upper_word)) for upper_word in misses)
+        for upper_word, word_suggestions in found:
+            self._suggestion_cache.put(upper_word, word_suggestions)
+            suggestions[upper_word] = word_suggestions
+        results = []
+        for word in words:
+            upper_word = word.upper()
+            if upper_word in suggestions:
+                results.append((False, word, list(suggestions[upper_word])))
+            else:
+                results.append((True, word, []))
+        return results, mode
+
+    def close(self):
+        """
+        Shuts down the spell_check_many process pool, if it was started, and closes the suggestion cache
+        """
+        self._suggestion_cache.close()
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""@package suggestion_cache
+This package includes the SuggestionCache class
+"""
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+
+class SuggestionCache:
+    """
+    This class provides a bounded LRU cache of spelling suggestions, optionally backed by a SQLite file so it survives restarts.
+
+    The on-disk store is tagged with a fingerprint of the dictionary it was built from.
+    If the fingerprint changes (e.g. dictionary.json was replaced), the store is cleared when it is opened.
+    The store is only opened the first time it is needed.
+    """
+    MAX_ENTRIES = 1024
+
+    def __init__(self, fingerprint, path=None, max_entries=None):
+        """
+        Constructor function
+
+        :param fingerprint:
+            A string identifying the dictionary (and suggestion algorithm) the cached suggestions came from
+        :param path: (Optional)
+            The path of the SQLite store, no on-disk store if None
+        :param max_entries: (Optional)
+            The maximum number of entries kept in memory, MAX_ENTRIES by default
+        """
+        self._fingerprint = fingerprint
+        self._path = path
+        self._max_entries = max_entries or SuggestionCache.MAX_ENTRIES
+        self._entries = OrderedDict()
+        self._conn = None
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+
+    def _get_conn(self):
+        """
+        Accessor function for self._conn
+        Opens the SQLite store on first use and clears it if it was built from a different dictionary.
+        If the store can't be opened, the cache keeps working in memory only.
+
+        :return:
+            sqlite3 connection, None if there is no on-disk store
+        """
+        if self._conn is None and self._path is not None:
+            try:
+                conn = sqlite3.connect(self._path, timeout=5, check_same_thread=False)
+                conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+                conn.execute('CREATE TABLE IF NOT EXISTS suggestions (word TEXT PRIMARY KEY, suggestions TEXT)')
+                row = conn.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+                if row is None or row[0] != self._fingerprint:
+                    conn.execute('DELETE FROM suggestions')
+                    conn.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (self._fingerprint,))
+                conn.commit()
+                self._conn = conn
+            except sqlite3.Error:
+                self._path = None
+        return self._conn
+
+    def _remember(self, word, suggestions):
+        """
+        Adds an entry to the in-memory LRU, evicting the least recently used entry if it is full
+        """
+        self._entries[word] = suggestions
+        self._entries.move_to_end(word)
+        if len(self._entries) > self._max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, word):
+        """
+        This function looks up the cached suggestions for a word, first in memory then on disk
+
+        :param word:
+            The misspelled word
+
+        :return:
+            list containing suggestions, None if the word is not cached
+        """
+        with self._lock:
+            suggestions = self._entries.get(word)
+            if suggestions is not None:
+                self._entries.move_to_end(word)
+                self._hits += 1
+                return list(suggestions)
+            conn = self._get_conn()
+            if conn is not None:
+                row = conn.execute('SELECT suggestions FROM suggestions WHERE word = ?', (word,)).fetchone()
+                if row is not None:
+                    suggestions = json.loads(row[0])
+                    self._remember(word, suggestions)
+                    self._hits += 1
+                    self._disk_hits += 1
+                    return list(suggestions)
+            self._misses += 1
+            return None
+
+    def put(self, word, suggestions):
+        """
+        This function caches the suggestions for a word, in memory and on disk
+
+        :param word:
+            The misspelled word
+        :param suggestions:
+            list containing suggestions
+        """
+        with self._lock:
+            self._remember(word, list(suggestions))
+            conn = self._get_conn()
+            if conn is not None:
+                try:
+                    conn.execute('INSERT OR REPLACE INTO suggestions VALUES (?, ?)', (word, json.dumps(suggestions)))
+                    conn.commit()
+                except sqlite3.Error:
+                    pass
+
+    def stats(self):
+        """
+        :return:
+            dict with the hits (of which disk_hits came from the on-disk store), misses and in-memory size
+        """
+        with self._lock:
+            return {'hits': self._hits,
+                    'disk_hits': self._disk_hits,
+                    'misses': self._misses,
+                    'size': len(self._entries)}
+
+    def close(self):
+        """
+        Closes the on-disk store, if it was opened
+        """
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
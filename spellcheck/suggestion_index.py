@@ -0,0 +1,153 @@
+"""@package suggestion_index
+This package includes the NGramIndex class used to narrow down spelling suggestion candidates
+"""
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import difflib
+import heapq
+
+class NGramIndex:
+    """
+    This class provides a precomputed character index over a list of words, returning exactly what
+    difflib.get_close_matches would over the same words.
+
+    Scoring every dictionary word with difflib is slow, so the index counts, for every word at once, how many characters
+    it has in common with the misspelled word (as multisets). That count is the numerator of difflib's quick_ratio, an
+    upper bound of the real ratio, so words are scored by difflib in order of that bound and the search stops as soon as
+    the bound can no longer reach the cutoff or beat the n-th best match found so far.
+
+    A word with k occurrences of a character is posted under (character, 1) to (character, k), so the postings shared
+    with the misspelled word add up to the size of the multiset intersection.
+    Word ids are assigned in order of word length, so every posting list is also sorted by length and
+    can be sliced down to the lengths that could possibly reach the difflib cutoff.
+    """
+
+    def __init__(self, words):
+        """
+        Constructor function
+
+        Builds the character posting lists for every word
+
+        :param words:
+            An iterable of words to index
+        """
+        self._words = sorted(words, key=len)
+        self._lengths = [len(word) for word in self._words]
+        self._postings = {}
+        for word_id, word in enumerate(self._words):
+            for key in self._char_keys(word):
+                posting = self._postings.get(key)
+                if posting is None:
+                    posting = self._postings[key] = array('l')
+                posting.append(word_id)
+
+    def __len__(self):
+        return len(self._words)
+
+    def _char_keys(self, word):
+        """
+        This function splits a word into its numbered characters, e.g. 'ABBA' -> (A, 1), (B, 1), (B, 2), (A, 2)
+
+        :param word:
+            The word to split
+
+        :return:
+            list of (character, occurrence) pairs
+        """
+        seen = Counter()
+        keys = []
+        for char in word:
+            seen[char] += 1
+            keys.append((char, seen[char]))
+        return keys
+
+    def _length_window(self, word, cutoff):
+        """
+        This function finds the range of word ids whose length allows a similarity ratio of at least cutoff.
+        The ratio is 2*M/T where M <= min(len(a), len(b)), so anything outside of this range can never match.
+
+        :param word:
+            The word to find candidates for
+        :param cutoff:
+            The minimum similarity ratio
+
+        :return:
+            lowest word id, highest word id (exclusive)
+        """
+        if cutoff <= 0:
+            return 0, len(self._words)
+        # The closed form is only an estimate in floating point, so it is moved onto the exact
+        # boundary with the very same 2.0*M/T that difflib compares to the cutoff
+        word_len = len(word)
+        min_len = max(int(word_len * cutoff / (2 - cutoff)) - 1, 0)
+        while min_len < word_len and 2.0 * min_len / (min_len + word_len) < cutoff:
+            min_len += 1
+        max_len = int(word_len * (2 - cutoff) / cutoff) + 2
+        while max_len > word_len and 2.0 * word_len / (word_len + max_len) < cutoff:
+            max_len -= 1
+        return bisect_left(self._lengths, min_len), bisect_right(self._lengths, max_len)
+
+    def candidates(self, word, cutoff=0.6):
+        """
+        This function finds the words whose quick_ratio with word is at least cutoff
+
+        :param word:
+            The word to find candidates for
+        :param cutoff:
+            The minimum similarity ratio
+
+        :return:
+            list of (quick_ratio, word) pairs, highest quick_ratio first
+        """
+        lo, hi = self._length_window(word, cutoff)
+        shared = Counter()
+        for key in self._char_keys(word):
+            posting = self._postings.get(key)
+            if posting is not None:
+                shared.update(posting[bisect_left(posting, lo):bisect_left(posting, hi)])
+        if not shared:
+            return []
+        word_len = len(word)
+        lengths = self._lengths
+        # Nothing shorter than the window, so fewer shared characters than this can't reach the cutoff
+        min_count = int(cutoff * (word_len + lengths[lo]) / 2)
+        bounds = [(2.0 * count / (word_len + lengths[word_id]), word_id)
+                  for word_id, count in shared.items() if count >= min_count]
+        bounds.sort(reverse=True)
+        words = self._words
+        return [(bound, words[word_id]) for bound, word_id in bounds if bound >= cutoff]
+
+    def get_close_matches(self, word, n=3, cutoff=0.6):
+        """
+        Drop-in replacement for difflib.get_close_matches over the indexed words, same matches in the same order
+
+        :param word:
+            The word to find close matches for
+        :param n:
+            The maximum number of close matches to return
+        :param cutoff:
+            Words that don't score at least this similarity ratio are ignored
+
+        :return:
+            list of the best matches, sorted by similarity score (most similar first)
+        """
+        if word == '' or n <= 0 or not 0.0 < cutoff <= 1.0:
+            # Words sharing no character with word can only match here, difflib handles these (and bad arguments)
+            return difflib.get_close_matches(word, self._words, n, cutoff)
+        matcher = difflib.SequenceMatcher()
+        matcher.set_seq2(word)
+        best = []
+        for bound, candidate in self.candidates(word, cutoff):
+            # Ties are broken by the word like difflib's nlargest, so only a strictly lower bound ends the search
+            if len(best) == n and bound < best[0][0]:
+                break
+            matcher.set_seq1(candidate)
+            score = matcher.ratio()
+            if score < cutoff:
+                continue
+            if len(best) < n:
+                heapq.heappush(best, (score, candidate))
+            elif (score, candidate) > best[0]:
+                heapq.heapreplace(best, (score, candidate))
+        return [candidate for _, candidate in sorted(best, reverse=True)]
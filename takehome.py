@@ -1,9 +1,23 @@
 """@package takehome
 This package contains the main application
 """
-from api.food2fork_client import Food2ForkClient
+from api.caching_food2fork_client import CachingFood2ForkClient
+from api.recipe_mirror import LocalRecipeSource, RecipeMirror
+from api.retry_policy import RetryPolicy, CircuitBreaker
+from recipes.bitmap_index import IngredientBitmapIndex, CoverageRecipeSource
+from recipes.ingredient_matcher import IngredientMatcher
+from spellcheck.background_loader import BackgroundDictionaryLoader
+from spellcheck.daemon import load_spell_checker
 from spellcheck.english_dict import EnglishDictionary
+from telemetry.metrics import METRICS
+from telemetry.profiling import Profiler
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import deque
 from enum import Enum
+import argparse
+import http.client
+import json
+import sys
 import time
 
 class TakeHomeAppState(Enum):
@@ -29,6 +43,9 @@ class TakeHomeApplication:
     """
     MAX_API_ATTEMPTS = 4
     RETRY_WAIT_TIMEOUT = 5
+    MAX_SPELLING_SUGGESTIONS = 10
+    ## Number of top search hits whose ingredients are compared, the one missing the fewest is displayed
+    TOP_K_RECIPES = 1
 
     def app_state(self):
         """
@@ -38,15 +55,40 @@ class TakeHomeApplication:
         """
         return self._state
 
-    def __init__(self):
+    @staticmethod
+    def new_retry_policy():
+        """
+        :return:
+            RetryPolicy whose circuit breaker opens after MAX_API_ATTEMPTS consecutive failures, so once a request has used up
+            its attempts, the following ones fail fast instead of retrying all over again
+        """
+        return RetryPolicy(circuit_breaker=CircuitBreaker(failure_threshold=TakeHomeApplication.MAX_API_ATTEMPTS))
+
+    def __init__(self, top_k=None, food2fork_client=None, spell_checker_loader=None, retry_policy=None):
         """
         Constructor
 
-        Initializes the Food2Fork client, spell check dictionary and state
+        Initializes the (caching) Food2Fork client, spell check dictionary and state
+        The dictionary is loaded on a background thread, so the load overlaps with the user typing the first ingredient
+        The client, dictionary and retry policy can be passed in to share them between applications (see takehome_service)
         Initial State: ENTER_INGREDIENT
-        """
-        self._food2fork_client = Food2ForkClient()
-        self._spell_checker = EnglishDictionary()
+
+        :param top_k: (Optional)
+            The number of top search hits to compare, TOP_K_RECIPES by default
+        :param food2fork_client: (Optional)
+            The Food2Fork client, a new CachingFood2ForkClient by default
+        :param spell_checker_loader: (Optional)
+            The loader of the spell check dictionary, by default a new BackgroundDictionaryLoader that connects to the
+            spell check daemon if it is running and loads the dictionary in this process if not (see spellcheck.daemon)
+        :param retry_policy: (Optional)
+            The RetryPolicy, a new one by default (see new_retry_policy)
+        """
+        self._init_time = time.perf_counter()
+        self._first_prompt_time = None
+        self._spell_checker_loader = spell_checker_loader if spell_checker_loader is not None else BackgroundDictionaryLoader(load_spell_checker)
+        self._food2fork_client = food2fork_client if food2fork_client is not None else CachingFood2ForkClient()
+        self._retry_policy = retry_policy if retry_policy is not None else TakeHomeApplication.new_retry_policy()
+        self._top_k = max(1, top_k or TakeHomeApplication.TOP_K_RECIPES)
 
         self._state_func_map = {
             TakeHomeAppState.ERROR:                     self._state_on_error,
@@ -60,34 +102,113 @@ class TakeHomeApplication:
         self._state = TakeHomeAppState.ENTER_INGREDIENT
 
         self._curr_ingredients = []
+        self._ingredient_matcher = None
         self._spelling_suggestions = []
         self._entered_ingredient = []
         self._sorting = ''
         self._api_attempts = -1
         self._error_message = ''
         self._recipe_id = ''
+        self._recipe_ids = []
         self._recipe_title = ''
         self._recipe_f2f_url = ''
 
-    def _elaborate_possibilities(self, packed_suggestions, possibility=''):
+    def _get_spell_checker(self):
         """
-        This function will recursively create suggestions for the spelling of the entire ingredient based on the individual suggestions of each word.
+        Accessor function for the spell check dictionary
+        Blocks if the dictionary has not finished loading yet
 
-        PRECONDITION: self._spelling_suggestions = [] (This function fills this array)
+        :return:
+            EnglishDictionary, or the DaemonSpellChecker standing in for it
+        """
+        return self._spell_checker_loader.get()
+
+    def startup_timing_report(self):
+        """
+        This function builds a report of how long the dictionary load took and how much of it was hidden behind the first prompt
+
+        :return:
+            list of report lines
+        """
+        load_time = self._spell_checker_loader.load_time()
+        wait_time = self._spell_checker_loader.wait_time()
+        lines = ["--- Startup Timing ---"]
+        if self._first_prompt_time is not None:
+            lines.append("Time to first prompt: %.1f ms" % ((self._first_prompt_time - self._init_time) * 1000,))
+        if load_time is None:
+            lines.append("Dictionary load: not finished")
+            return lines
+        lines.append("Dictionary load: %.1f ms" % (load_time * 1000,))
+        lines.append("Blocked waiting for dictionary: %.1f ms" % (wait_time * 1000,))
+        lines.append("Hidden by overlap: %.1f ms" % (max(load_time - wait_time, 0.0) * 1000,))
+        return lines
+
+    def _elaborate_possibilities(self, packed_suggestions, max_possibilities=None):
+        """
+        This generator lazily creates suggestions for the spelling of the entire ingredient based on the individual suggestions of each word.
+
+        Each word's suggestions are ordered from most to least similar, so the combined rank of a possibility is the sum of the
+        positions of the suggestions it is made of. Possibilities are yielded best first (lowest combined rank, ties in the order
+        of the word lists) and only the words of the current possibility are held in memory.
+
+        :param packed_suggestions:
+            The array of suggestions for the spelling of each word in the ingredient, most similar first
+        :param max_possibilities: (Optional)
+            Stop after this many possibilities, no limit if None
+
+        :return:
+            generator of suggestions for the spelling of the entire ingredient
+        """
+        if any(len(suggestions) == 0 for suggestions in packed_suggestions):
+            return
+        max_rank = sum(len(suggestions) - 1 for suggestions in packed_suggestions)
+        count = 0
+        for rank in range(max_rank + 1):
+            for possibility in self._possibilities_with_rank(packed_suggestions, 0, rank, max_rank, []):
+                if max_possibilities is not None and count >= max_possibilities:
+                    return
+                count += 1
+                yield possibility
+
+    def _possibilities_with_rank(self, packed_suggestions, index, rank, max_rank, chosen):
+        """
+        This generator recursively creates the possibilities with exactly the given combined rank, see _elaborate_possibilities
 
         :param packed_suggestions:
             The array of suggestions for the spelling of each word in the ingredient
-        :param possibility:
-            The current formed suggestion that, when complete, represents a suggestion of the spelling of the entire ingredient
+        :param index:
+            The index of the word to choose a suggestion for
+        :param rank:
+            The combined rank left for the words from index onwards
+        :param max_rank:
+            The highest combined rank the words from index onwards can have
+        :param chosen:
+            The suggestions chosen for the words before index
+
+        :return:
+            generator of suggestions for the spelling of the entire ingredient
         """
-        if len(packed_suggestions) == 0:
-            self._spelling_suggestions.append(possibility)
+        if index == len(packed_suggestions):
+            yield ' '.join(chosen)
             return
-        head_suggestions = packed_suggestions[0]
-        if possibility != '':
-            possibility += ' '
-        for suggestion in head_suggestions:
-            self._elaborate_possibilities(packed_suggestions[1:], possibility + suggestion)
+        suggestions = packed_suggestions[index]
+        max_rank -= len(suggestions) - 1
+        for position in range(max(0, rank - max_rank), min(rank, len(suggestions) - 1) + 1):
+            chosen.append(suggestions[position])
+            yield from self._possibilities_with_rank(packed_suggestions, index + 1, rank - position, max_rank, chosen)
+            chosen.pop()
+
+    def _get_ingredient_matcher(self):
+        """
+        Accessor function for self._ingredient_matcher
+        The matcher is rebuilt only when the supplied ingredients change, so it is shared by every recipe that is diffed
+
+        :return:
+            IngredientMatcher of the supplied ingredients
+        """
+        if self._ingredient_matcher is None or self._ingredient_matcher.ingredients() != self._curr_ingredients:
+            self._ingredient_matcher = IngredientMatcher(self._curr_ingredients)
+        return self._ingredient_matcher
 
     def _is_ingredient_in_curr(self, ingredient):
         """
@@ -98,10 +219,16 @@ class TakeHomeApplication:
             True - is the ingredient
             False - is not the ingredient
         """
-        for curr_ingredient in self._curr_ingredients:
-            if ingredient.lower().find(curr_ingredient.lower()) != -1:
-                return True
-        return False
+        return self._get_ingredient_matcher().contains_any(ingredient)
+
+    def _count_missing_ingredients(self, recipe):
+        """
+        :param recipe:
+            The recipe dict, see Food2ForkClient.api_get_recipe
+        :return:
+            the number of the recipe's ingredients that weren't supplied
+        """
+        return sum(1 for ingredient in recipe['ingredients'] if not self._is_ingredient_in_curr(ingredient))
 
     def _get_numeric_selection(self, max_sel):
         """
@@ -112,37 +239,173 @@ class TakeHomeApplication:
             The maximum choice number
         :return:
         """
-        sel = input("Enter selection: ")
+        sel = self._read_line("Enter selection: ")
         if not sel.isdigit():
-            print("Invalid selection, must be a number")
+            self._output("Invalid selection, must be a number")
             return -1
         sel = int(sel)
         if sel < 1 or sel > max_sel:
-            print("Invalid selection, must be between 1 and %s" % (max_sel,))
+            self._output("Invalid selection, must be between 1 and %s" % (max_sel,))
             return -1
         return sel
 
+    def _read_line(self, prompt_text):
+        """
+        This function reads one line of user input, from the console
+        The state handlers only do I/O through _read_line, _output and _sleep, so other front ends can override them
+
+        :param prompt_text:
+            The prompt given to the user
+        :return:
+            the line entered
+        """
+        return input(prompt_text)
+
+    def _output(self, text):
+        """
+        This function shows one line of text to the user, on the console
+
+        :param text:
+            The line to show
+        """
+        print(text)
+
+    def _sleep(self, seconds):
+        """
+        This function waits before the next API attempt, blocking the console
+
+        :param seconds:
+            Seconds to wait
+        """
+        time.sleep(seconds)
+
     def _split_input(self, prompt_text):
         """
-        This function abstracts the input function and tokenizes the input into a list of words.
+        This function abstracts the input function (see _read_line) and tokenizes the input into a list of words.
         :param prompt_text:
             The prompt given to the user
         :return:
             list representing the tokenized input
         """
-        return input(prompt_text).split()
+        return self._read_line(prompt_text).split()
 
-    def _wait_api_attempts(self):
+    def _retry_delay(self, retry_after=None):
         """
-        This function waits for RETRY_WAIT_TIMEOUT seconds and then decrements the self._api_attempts variable
+        This function computes how long to wait before the next API attempt (see RetryPolicy.delay)
+        The backoff is capped at RETRY_WAIT_TIMEOUT seconds
+
+        :param retry_after: (Optional)
+            The server's Retry-After in seconds
+        :return:
+            seconds to wait
+        """
+        attempt = TakeHomeApplication.MAX_API_ATTEMPTS - self._api_attempts + 1
+        return self._retry_policy.delay(attempt, retry_after, TakeHomeApplication.RETRY_WAIT_TIMEOUT)
+
+    def _wait_api_attempts(self, delay=None):
+        """
+        This function decrements the self._api_attempts variable
         If it reaches 0, it transitions to the ERROR state.
-        Otherwise, it continues on in the current state.
+        Otherwise, it waits for the retry delay (exponential backoff with jitter, see _retry_delay) and continues on in the current state.
+
+        :param delay: (Optional)
+            Seconds to wait, computed by _retry_delay() by default
         """
-        time.sleep(TakeHomeApplication.RETRY_WAIT_TIMEOUT)
+        if delay is None:
+            delay = self._retry_delay()
         self._api_attempts -= 1
-        if self._api_attempts == 0:
+        if self._api_attempts <= 0:
+            METRICS.increment('takehome_api_attempts_exhausted_total')
             self._error_message = 'Maximum API attempts exceeded'
             self._state = TakeHomeAppState.ERROR
+            return
+        METRICS.increment('takehome_api_retries_total')
+        METRICS.observe('takehome_api_retry_delay_seconds', delay)
+        self._sleep(delay)
+
+    def _call_api(self, request, *args, **kwargs):
+        """
+        This function performs an API request and reports the outcome to the retry policy's circuit breaker
+        Connection errors are returned as RetryPolicy.CONNECTION_ERROR instead of being raised
+
+        :param request:
+            The Food2Fork client function to call
+        :return:
+            response status, response dict, the response's Retry-After in seconds (None if it had none)
+        """
+        with METRICS.span('takehome_api_call', request=getattr(request, '__name__', 'request')) as span:
+            try:
+                resp_status, obj_data = request(*args, **kwargs)
+            except (OSError, http.client.HTTPException):
+                resp_status, obj_data = RetryPolicy.CONNECTION_ERROR, None
+            if resp_status == 200 and obj_data is None:
+                resp_status = -1
+            span.set_label('status', resp_status)
+        # The client keeps the Retry-After per thread, so it is read on the thread that made the request
+        retry_after = self._food2fork_client.last_retry_after()
+        self._retry_policy.record(resp_status)
+        return resp_status, obj_data, retry_after
+
+    def _api_unavailable(self):
+        """
+        This function fails fast while the circuit breaker is open, transitioning to the ERROR state
+
+        :return:
+            True - Food2Fork is considered down, don't send the request
+            False - go ahead
+        """
+        if self._retry_policy.circuit_breaker.allow_request():
+            return False
+        self._error_message = 'Food2Fork is unavailable, try again later'
+        self._state = TakeHomeAppState.ERROR
+        return True
+
+    def _handle_api_failure(self, request_name, resp_status, retry_after=None):
+        """
+        This function handles a failed API request.
+        Fatal errors (e.g. a bad api key, or a Retry-After that is too long) transition to the ERROR state right away,
+        retryable ones wait for the retry delay and stay in the current state (see _wait_api_attempts)
+
+        :param request_name:
+            The name of the request for the messages
+        :param resp_status:
+            The response status
+        :param retry_after: (Optional)
+            The response's Retry-After in seconds, as returned by _call_api
+        """
+        if not self._retry_policy.is_retryable(resp_status, retry_after):
+            self._error_message = '%s Failed, status: %s' % (request_name, resp_status,)
+            self._state = TakeHomeAppState.ERROR
+            return
+        delay = self._retry_delay(retry_after)
+        if self._api_attempts > 1:
+            self._output("%s Failed, status: %s, retrying in %.1f seconds" % (request_name, resp_status, delay,))
+        self._wait_api_attempts(delay)
+
+    def _get_recipes(self, recipe_ids):
+        """
+        This function retrieves the recipes concurrently, so comparing several of them costs about one round trip
+
+        :param recipe_ids:
+            The recipe identifiers
+        :return:
+            list of (response status, response dict, Retry-After), in the order of recipe_ids
+        """
+        if len(recipe_ids) == 1:
+            return [self._call_api(self._food2fork_client.api_get_recipe, recipe_ids[0])]
+        with ThreadPoolExecutor(max_workers=len(recipe_ids)) as executor:
+            return list(executor.map(lambda rId: self._call_api(self._food2fork_client.api_get_recipe, rId), recipe_ids))
+
+    def _is_complete_recipe(self, obj_data):
+        """
+        :return:
+            True - the get recipe response has everything DISPLAY_RESULTS needs
+            False - it doesn't
+        """
+        return 'recipe' in obj_data and \
+               'ingredients' in obj_data['recipe'] and \
+               'title' in obj_data['recipe'] and \
+               'f2f_url' in obj_data['recipe']
 
     def _process_state(self):
         """
@@ -161,7 +424,8 @@ class TakeHomeApplication:
             return False
         elif self._state not in self._state_func_map:
             raise UnknownTakeHomeAppStateException('Unimplemented State')
-        self._state_func_map[self._state]()
+        with METRICS.span('takehome_state', state=self._state.name):
+            self._state_func_map[self._state]()
         return True
 
     def _state_enter_ingredient(self):
@@ -176,6 +440,8 @@ class TakeHomeApplication:
             API_SEARCH - if no input is entered
             SPELL_CHECK - if valid input is entered
         """
+        if self._first_prompt_time is None:
+            self._first_prompt_time = time.perf_counter()
         self._entered_ingredient = self._split_input("Enter single ingredient (leave blank if done): ")
         if len(self._entered_ingredient) == 0:
             self._sorting = 'r' # Sort by rating
@@ -185,7 +451,7 @@ class TakeHomeApplication:
         if False not in [x.isalpha() for x in self._entered_ingredient]:
             self._state = TakeHomeAppState.SPELL_CHECK
             return
-        print("Invalid input")
+        self._output("Invalid input")
 
     def _state_spell_check(self):
         """
@@ -196,17 +462,18 @@ class TakeHomeApplication:
             1. Add the ingredient to the list
             2. Return back to the ENTER_INGREDIENT state
         If any word is possibly misspelled, it will form a list of possibilities given the list of suggestions for each misspelled word in the ingredient
+        Only the best MAX_SPELLING_SUGGESTIONS possibilities are kept
         It will then transition to the SPELL_CHECK_SUGGESTIONS state to allow the user to choose from this list
         """
-        spelling_results = [self._spell_checker.spell_check(word) for word in self._entered_ingredient]
+        spelling_results = self._get_spell_checker().spell_check_many(self._entered_ingredient)
         packed_suggestions = []
         for (correct, word, suggestions) in spelling_results:
             if correct:
                 packed_suggestions.append([word])
             else:
                 packed_suggestions.append([word] + suggestions)
-        self._spelling_suggestions = []
-        self._elaborate_possibilities(packed_suggestions)
+        self._spelling_suggestions = list(self._elaborate_possibilities(packed_suggestions,
+                                                                        TakeHomeApplication.MAX_SPELLING_SUGGESTIONS))
         if len(self._spelling_suggestions) == 1:
             self._curr_ingredients.append(self._spelling_suggestions[0])
             self._state = TakeHomeAppState.ENTER_INGREDIENT
@@ -224,12 +491,12 @@ class TakeHomeApplication:
         If it fails to validate, it will stay in this state and make the user try again.
         Otherwise, it will transition back to the ENTER_INGREDIENT state
         """
-        print("Not sure if you spelled the ingredient correctly? Choose from below:")
+        self._output("Not sure if you spelled the ingredient correctly? Choose from below:")
         i = 1
         for suggestion in self._spelling_suggestions:
-            print("%s. %s" % (i, suggestion,))
+            self._output("%s. %s" % (i, suggestion,))
             i += 1
-        print("%s. Reenter ingredient" % (i,))
+        self._output("%s. Reenter ingredient" % (i,))
         sel = self._get_numeric_selection(i)
         if sel == -1:
             return
@@ -242,26 +509,29 @@ class TakeHomeApplication:
         API_SEARCH state handler function
 
         This state queries Food2Fork for a recipe that contains the supplied ingredients
-        It allows for MAX_API_ATTEMPTS if there's an error with the request, waits RETRY_WAIT_TIMEOUT between tries
+        It allows for MAX_API_ATTEMPTS if there's a retryable error with the request, backing off between tries (see _handle_api_failure)
         Validates the response, making sure there's a recipe
         If there is no recipe or another error, it stops here and goes to the ERROR state
-        Otherwise, it grabs the top recipe's id and transitions to the API_GET_RECIPE state
+        Otherwise, it grabs the ids of the top K (see TOP_K_RECIPES) recipes and transitions to the API_GET_RECIPE state
+        Only the top K recipes of the response are decoded, the rest of the page is never read
         """
         comma_sep_list = ''
         for ingredient in self._curr_ingredients:
             comma_sep_list += ingredient + ','
         comma_sep_list = comma_sep_list[:-1]
-        resp_status, obj_data = self._food2fork_client.api_search(q=comma_sep_list, sort=self._sorting)
-        if resp_status != 200 or obj_data is None:
-            print("API Search Failed, status: %s, retrying in %s seconds" % (resp_status,
-                                                                             TakeHomeApplication.RETRY_WAIT_TIMEOUT))
-            self._wait_api_attempts()
+        if self._api_unavailable():
+            return
+        resp_status, obj_data, retry_after = self._call_api(self._food2fork_client.api_search,
+                                                            q=comma_sep_list, sort=self._sorting, max_recipes=self._top_k)
+        if resp_status != 200:
+            self._handle_api_failure("API Search", resp_status, retry_after)
             return
         if 'recipes' not in obj_data or len(obj_data['recipes']) == 0 or 'recipe_id' not in obj_data['recipes'][0]:
             self._error_message = 'No recipe returned, you must have had some interesting ingredients'
             self._state = TakeHomeAppState.ERROR
             return
-        self._recipe_id = obj_data['recipes'][0]['recipe_id']
+        self._recipe_ids = [recipe['recipe_id'] for recipe in obj_data['recipes'][:self._top_k] if 'recipe_id' in recipe]
+        self._recipe_id = self._recipe_ids[0]
         self._api_attempts = TakeHomeApplication.MAX_API_ATTEMPTS
         self._state = TakeHomeAppState.API_GET_RECIPE
 
@@ -269,29 +539,32 @@ class TakeHomeApplication:
         """
         API_GET_RECIPE state handler function
 
-        This state retrieves the full recipe from Food2Fork.
-        The purpose is to find the full list of ingredients and compare that against the supplied
+        This state retrieves the full recipes of the top search hits from Food2Fork, concurrently.
+        The purpose is to find the full lists of ingredients and compare them against the supplied
+        The recipe missing the fewest ingredients is chosen, ties go to the better search rank
 
-        It allows for MAX_API_ATTEMPTS if there's an error with the request, waits RETRY_WAIT_TIMEOUT between tries
-        Validates the response and if there is another error, it stops here and goes to the ERROR state
+        It allows for MAX_API_ATTEMPTS if there's a retryable error with the request, backing off between tries (see _handle_api_failure)
+        Recipes that can't be retrieved are left out of the comparison, only if none can be it is an error
+        Validates the responses and if there is another error, it stops here and goes to the ERROR state
         Otherwise, it transitions to the DISPLAY_RESULTS state
         """
-        resp_status, obj_data = self._food2fork_client.api_get_recipe(self._recipe_id)
-        if resp_status != 200 or obj_data is None:
-            print("API Get Recipe Failed, status: %s, retrying in %s seconds" % (resp_status,
-                                                                                 TakeHomeApplication.RETRY_WAIT_TIMEOUT))
-            self._wait_api_attempts()
+        if self._api_unavailable():
             return
-        if 'recipe' not in obj_data or \
-           'ingredients' not in obj_data['recipe'] or \
-           'title' not in obj_data['recipe'] or \
-           'f2f_url' not in obj_data['recipe']:
+        responses = self._get_recipes(self._recipe_ids or [self._recipe_id])
+        recipes = [obj_data['recipe'] for resp_status, obj_data, _ in responses
+                   if resp_status == 200 and self._is_complete_recipe(obj_data)]
+        if len(recipes) == 0:
+            failed = [(resp_status, retry_after) for resp_status, _, retry_after in responses if resp_status != 200]
+            if len(failed) > 0:
+                self._handle_api_failure("API Get Recipe", *failed[0])
+                return
             self._error_message = "The recipe information did not get returned for some reason"
             self._state = TakeHomeAppState.ERROR
             return
-        self._recipe_ingredients = obj_data['recipe']['ingredients']
-        self._recipe_title = obj_data['recipe']['title']
-        self._recipe_f2f_url = obj_data['recipe']['f2f_url']
+        recipe = min(recipes, key=self._count_missing_ingredients)
+        self._recipe_ingredients = recipe['ingredients']
+        self._recipe_title = recipe['title']
+        self._recipe_f2f_url = recipe['f2f_url']
         self._state = TakeHomeAppState.DISPLAY_RESULTS
 
     def _state_display_results(self):
@@ -301,24 +574,24 @@ class TakeHomeApplication:
         Displays the ingredients that aren't in the supplied ingredients
         Then, it transitions to the FINISHED state
         """
-        print("Recipe Title: %s" % (self._recipe_title,))
-        print("Food2Fork URL: %s" % (self._recipe_f2f_url,))
+        self._output("Recipe Title: %s" % (self._recipe_title,))
+        self._output("Food2Fork URL: %s" % (self._recipe_f2f_url,))
 
-        print("Supplied ingredients:")
+        self._output("Supplied ingredients:")
         if len(self._curr_ingredients) == 0:
-            print("None")
+            self._output("None")
         else:
             for ingredient in self._curr_ingredients:
-                print("%s" % (ingredient,))
-        print("")
-        print("Recipe ingredients that weren't supplied:")
+                self._output("%s" % (ingredient,))
+        self._output("")
+        self._output("Recipe ingredients that weren't supplied:")
         at_least_one = False
         for ingredient in self._recipe_ingredients:
             if not self._is_ingredient_in_curr(ingredient):
                 at_least_one = True
-                print("%s" % (ingredient,))
+                self._output("%s" % (ingredient,))
         if not at_least_one:
-            print("None")
+            self._output("None")
         self._state = TakeHomeAppState.FINISHED
 
     def _state_on_error(self):
@@ -327,7 +600,7 @@ class TakeHomeApplication:
 
         Prints the error text and transitions to the FINISHED state
         """
-        print("Error: %s" % (self._error_message,))
+        self._output("Error: %s" % (self._error_message,))
         self._state = TakeHomeAppState.FINISHED
 
     def main(self):
@@ -339,6 +612,391 @@ class TakeHomeApplication:
         while self._process_state():
             pass
 
+class ScriptExhaustedException(Exception):
+    """
+    Raised by ProfiledTakeHomeApplication when the application asks for more input than its script has
+    """
+    pass
+
+class ProfiledTakeHomeApplication(TakeHomeApplication):
+    """
+    This class runs the application under a Profiler, with every state handler profiled as a section named after its
+    TakeHomeAppState and the dictionary load as DICTIONARY_LOAD.
+    Input can be replayed from a script (one input line per line), so profiles are reproducible without a human at the keyboard.
+
+    cProfile only sees the thread it is enabled on (and from Python 3.12 only one thread can be profiled at a time), so
+    everything runs on the calling thread: the dictionary is loaded in this process before the first prompt instead of on
+    a background thread or by the spell check daemon, and the top recipes are retrieved one after another. The profile
+    shows all of the work, but the wall times are those of a run without those overlaps.
+    """
+
+    def __init__(self, profiler, script=None, top_k=None, food2fork_client=None, retry_policy=None):
+        """
+        Constructor
+
+        :param profiler:
+            The Profiler, it must be started for anything to be recorded
+        :param script: (Optional)
+            list of input lines to replay, the console is read if None
+        :param top_k, food2fork_client, retry_policy: (Optional)
+            see TakeHomeApplication
+        """
+        self._profiler = profiler
+        self._script = deque(script) if script is not None else None
+        dictionary = self._load_dictionary()
+        loader = BackgroundDictionaryLoader(lambda: dictionary)
+        super(ProfiledTakeHomeApplication, self).__init__(top_k, food2fork_client, loader, retry_policy)
+
+    def _load_dictionary(self):
+        """
+        This function loads an EnglishDictionary in this process, on the calling thread, profiled as the DICTIONARY_LOAD section
+
+        :return:
+            EnglishDictionary
+        """
+        with self._profiler.section('DICTIONARY_LOAD'):
+            return EnglishDictionary()
+
+    def _read_line(self, prompt_text):
+        """
+        This function reads the next line of the script, echoing it after the prompt, or from the console without a script
+
+        Exceptions:
+            raises ScriptExhaustedException if the script has no lines left
+        """
+        if self._script is None:
+            return super(ProfiledTakeHomeApplication, self)._read_line(prompt_text)
+        if len(self._script) == 0:
+            raise ScriptExhaustedException(prompt_text)
+        line = self._script.popleft()
+        self._output(prompt_text + line)
+        return line
+
+    def _get_recipes(self, recipe_ids):
+        """
+        see TakeHomeApplication._get_recipes, one after another on this thread so the requests are in the API_GET_RECIPE profile
+        """
+        return [self._call_api(self._food2fork_client.api_get_recipe, rId) for rId in recipe_ids]
+
+    def _process_state(self):
+        """
+        see TakeHomeApplication._process_state, profiled as the section of the current state
+        """
+        name = self._state.name if isinstance(self._state, TakeHomeAppState) else 'UNKNOWN'
+        with self._profiler.section(name):
+            return super(ProfiledTakeHomeApplication, self)._process_state()
+
+    def main(self):
+        """
+        see TakeHomeApplication.main, a replayed session also ends when the script runs out
+        """
+        try:
+            super(ProfiledTakeHomeApplication, self).main()
+        except ScriptExhaustedException as e:
+            self._output("Script ended at prompt '%s'" % (str(e).strip(),))
+
+class BatchItemException(Exception):
+    """
+    Raised by TakeHomeBatchRunner when one ingredient list can't be turned into a result
+    """
+    pass
+
+class TakeHomeBatchRunner:
+    """
+    This class runs the application flow without prompts, for many ingredient lists at once.
+
+    Each input line is a JSON list of ingredients, or a JSON object with an "ingredients" list (and an optional "id" that
+    is copied to the result). Every misspelled word is replaced by its top suggestion, then the top recipes are searched
+    for, retrieved and diffed against the ingredients, exactly as in the interactive flow.
+    Lines are processed on a pool of WORKERS threads and one JSON result per line is streamed out, either in input order
+    or as soon as each is ready. Results have a "line" number and either the recipe or an "error".
+    """
+    WORKERS = 8
+
+    def __init__(self, food2fork_client=None, spell_checker_loader=None, workers=None, top_k=None):
+        """
+        Constructor function
+
+        :param food2fork_client: (Optional)
+            The Food2Fork client, a CachingFood2ForkClient by default (it must be safe to use from several threads)
+        :param spell_checker_loader: (Optional)
+            The loader of the spell check dictionary, a BackgroundDictionaryLoader of load_spell_checker by default (see spellcheck.daemon)
+        :param workers: (Optional)
+            The number of lines processed at once, WORKERS by default
+        :param top_k: (Optional)
+            The number of top search hits to compare, see TakeHomeApplication.TOP_K_RECIPES
+        """
+        self._food2fork_client = food2fork_client if food2fork_client is not None else CachingFood2ForkClient()
+        self._spell_checker_loader = spell_checker_loader if spell_checker_loader is not None else BackgroundDictionaryLoader(load_spell_checker)
+        self._workers = max(1, workers or TakeHomeBatchRunner.WORKERS)
+        self._top_k = max(1, top_k or TakeHomeApplication.TOP_K_RECIPES)
+        self._retry_policy = TakeHomeApplication.new_retry_policy()
+
+    def _spell_correct(self, ingredients):
+        """
+        This function corrects the spelling of every word of the ingredients, taking the top suggestion
+
+        :param ingredients:
+            list of ingredients, each one or more words
+        :return:
+            list of corrected ingredients, dict of the corrected ingredients by original ingredient
+
+        Exceptions:
+            raises BatchItemException if an ingredient is not made up of words
+        """
+        split_ingredients = [str(ingredient).split() for ingredient in ingredients]
+        for ingredient, words in zip(ingredients, split_ingredients):
+            if len(words) == 0 or False in [x.isalpha() for x in words]:
+                raise BatchItemException('Invalid ingredient: %s' % (ingredient,))
+        results = iter(self._spell_checker_loader.get().spell_check_many([word for words in split_ingredients for word in words]))
+        corrected = []
+        corrections = {}
+        for ingredient, words in zip(ingredients, split_ingredients):
+            corrected_words = []
+            for word in words:
+                correct, _, suggestions = next(results)
+                corrected_words.append(word if correct or len(suggestions) == 0 else suggestions[0])
+            corrected.append(' '.join(corrected_words))
+            if corrected[-1] != ' '.join(words):
+                corrections[str(ingredient)] = corrected[-1]
+        return corrected, corrections
+
+    def _request(self, request_name, request, *args, **kwargs):
+        """
+        This function performs an API request, retrying retryable errors like the interactive flow does
+        (MAX_API_ATTEMPTS attempts, backing off up to RETRY_WAIT_TIMEOUT seconds, see RetryPolicy)
+
+        :param request_name:
+            The name of the request for the error messages
+        :param request:
+            The Food2Fork client function to call
+        :return:
+            response dict
+
+        Exceptions:
+            raises BatchItemException if the request failed
+        """
+        for attempt in range(1, TakeHomeApplication.MAX_API_ATTEMPTS + 1):
+            if not self._retry_policy.circuit_breaker.allow_request():
+                raise BatchItemException('Food2Fork is unavailable, try again later')
+            try:
+                resp_status, obj_data = request(*args, **kwargs)
+            except (OSError, http.client.HTTPException):
+                resp_status, obj_data = RetryPolicy.CONNECTION_ERROR, None
+            if resp_status == 200 and obj_data is None:
+                resp_status = -1
+            self._retry_policy.record(resp_status)
+            if resp_status == 200:
+                return obj_data
+            retry_after = self._food2fork_client.last_retry_after()
+            if attempt == TakeHomeApplication.MAX_API_ATTEMPTS or not self._retry_policy.is_retryable(resp_status, retry_after):
+                break
+            delay = self._retry_policy.delay(attempt, retry_after, TakeHomeApplication.RETRY_WAIT_TIMEOUT)
+            METRICS.increment('takehome_api_retries_total')
+            METRICS.observe('takehome_api_retry_delay_seconds', delay)
+            time.sleep(delay)
+        raise BatchItemException('%s Failed, status: %s' % (request_name, resp_status,))
+
+    def process(self, ingredients):
+        """
+        This function runs the whole flow for one ingredient list
+
+        :param ingredients:
+            list of ingredients
+        :return:
+            result dict with the corrected ingredients, the corrections, the recipe and its missing ingredients
+
+        Exceptions:
+            raises BatchItemException if there is no result
+        """
+        with METRICS.span('takehome_batch_item'):
+            return self._process(ingredients)
+
+    def _process(self, ingredients):
+        """
+        see process, without the instrumentation
+        """
+        ingredients, corrections = self._spell_correct(ingredients)
+        obj_data = self._request('API Search', self._food2fork_client.api_search,
+                                 q=','.join(ingredients), sort='r', max_recipes=self._top_k)
+        recipe_ids = [recipe['recipe_id'] for recipe in obj_data.get('recipes', [])[:self._top_k] if 'recipe_id' in recipe]
+        if len(recipe_ids) == 0:
+            raise BatchItemException('No recipe returned, you must have had some interesting ingredients')
+        matcher = IngredientMatcher(ingredients)
+        best = None
+        failure = None
+        for recipe_id in recipe_ids:
+            try:
+                obj_data = self._request('API Get Recipe', self._food2fork_client.api_get_recipe, recipe_id)
+            except BatchItemException as e:
+                failure = e
+                continue
+            recipe = obj_data.get('recipe') if isinstance(obj_data, dict) else None
+            if recipe is None or 'ingredients' not in recipe or 'title' not in recipe or 'f2f_url' not in recipe:
+                continue
+            missing = [x for x in recipe['ingredients'] if not matcher.contains_any(x)]
+            if best is None or len(missing) < len(best['missing_ingredients']):
+                best = {'recipe_id': recipe_id, 'title': recipe['title'], 'f2f_url': recipe['f2f_url'],
+                        'missing_ingredients': missing}
+        if best is None:
+            raise failure or BatchItemException('The recipe information did not get returned for some reason')
+        return {'ingredients': ingredients, 'corrections': corrections, 'recipe': best}
+
+    def _process_line(self, line_number, line):
+        """
+        This function parses one input line and processes it, turning every failure into an error result
+
+        :return:
+            result dict
+        """
+        result = {'line': line_number}
+        try:
+            item = json.loads(line)
+        except ValueError:
+            result['error'] = 'Invalid JSON'
+            return result
+        try:
+            if isinstance(item, dict):
+                if 'id' in item:
+                    result['id'] = item['id']
+                item = item.get('ingredients')
+            if not isinstance(item, list):
+                raise BatchItemException('Expected a list of ingredients')
+            result.update(self.process(item))
+        except BatchItemException as e:
+            result['error'] = str(e)
+        except Exception as e:
+            # A bug processing one line must not end the whole batch
+            result['error'] = 'Unexpected error: %s: %s' % (type(e).__name__, e,)
+        return result
+
+    def run(self, lines, ordered=True):
+        """
+        This generator processes the input lines on the worker pool.
+        Input is read only a little ahead of the results, so large inputs are streamed
+
+        :param lines:
+            iterable of input lines, blank lines are skipped
+        :param ordered: (Optional)
+            True - results are yielded in input order
+            False - results are yielded as soon as they are ready
+
+        :return:
+            generator of result dicts
+        """
+        max_pending = self._workers * 2
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            pending = deque()
+            for line_number, line in enumerate(lines, 1):
+                if line.strip() == '':
+                    continue
+                pending.append(executor.submit(self._process_line, line_number, line))
+                while len(pending) >= max_pending:
+                    yield from self._completed(pending, ordered)
+            while len(pending) > 0:
+                yield from self._completed(pending, ordered)
+
+    def _completed(self, pending, ordered):
+        """
+        This generator waits for results, the oldest one if ordered or any finished ones otherwise, and removes them from pending
+        """
+        if ordered:
+            yield pending.popleft().result()
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            pending.remove(future)
+            yield future.result()
+
+    def run_to_file(self, in_file, out_file, ordered=True):
+        """
+        This function processes the input file and writes one JSON result per line to the output file, flushing each one
+        """
+        for result in self.run(in_file, ordered):
+            out_file.write(json.dumps(result) + '\n')
+            out_file.flush()
+
+    def close(self):
+        """
+        Closes the Food2Fork client and the spell check dictionary, if it was loaded
+        """
+        self._food2fork_client.close()
+        if self._spell_checker_loader.is_loaded():
+            self._spell_checker_loader.get().close()
+
 if __name__ == '__main__':
-    app = TakeHomeApplication()
-    app.main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description='Find the most popular recipe for a list of ingredients')
+    parser.add_argument('--timing', action='store_true', help='print a startup timing report when finished')
+    parser.add_argument('--top-k', type=int, default=TakeHomeApplication.TOP_K_RECIPES, metavar='K',
+                        help='compare the top K recipes and show the one missing the fewest ingredients')
+    parser.add_argument('--local', metavar='DB', help='answer from a local recipe mirror (see api.recipe_mirror) instead of Food2Fork')
+    parser.add_argument('--fewest-missing', action='store_true',
+                        help='rank the recipes of the local mirror by the fewest missing ingredients (requires --local)')
+    parser.add_argument('--api-domain', metavar='HOST[:PORT]',
+                        help='send Food2Fork requests to another server, e.g. a stand-in (see tests.food2fork_standin)')
+    parser.add_argument('--plain-http', action='store_true', help='talk plain HTTP to --api-domain instead of HTTPS')
+    parser.add_argument('--metrics', metavar='FILE',
+                        help='record metrics and trace spans, and write them to FILE when finished (Prometheus text if it ends '
+                             'with .prom or .txt, JSONL otherwise)')
+    parser.add_argument('--profile', metavar='DIR',
+                        help='run under cProfile and tracemalloc, attributed per state, and write pstats files and an '
+                             'allocation report to DIR')
+    parser.add_argument('--script', metavar='FILE', help='replay the input lines of FILE instead of reading the console')
+    parser.add_argument('--batch', metavar='FILE',
+                        help='process one JSON ingredient list per line of FILE (- for stdin) without prompts, writing JSONL results')
+    parser.add_argument('--workers', type=int, default=TakeHomeBatchRunner.WORKERS, help='batch mode worker threads')
+    parser.add_argument('--unordered', action='store_true', help='batch mode: write results as soon as they are ready')
+    args = parser.parse_args()
+    if args.batch is not None and (args.profile is not None or args.script is not None):
+        parser.error('--profile and --script only apply to the interactive mode')
+    if args.local is not None and (args.api_domain is not None or args.plain_http):
+        parser.error('--api-domain and --plain-http only apply to Food2Fork, not to --local')
+    if args.fewest_missing and args.local is None:
+        parser.error('--fewest-missing requires --local')
+    if args.metrics is not None:
+        METRICS.enable()
+    food2fork_client = None
+    if args.fewest_missing:
+        mirror = RecipeMirror(args.local)
+        food2fork_client = CoverageRecipeSource(IngredientBitmapIndex.build(mirror.all_recipes()))
+        mirror.close()
+    elif args.local is not None:
+        food2fork_client = LocalRecipeSource(args.local)
+    elif args.api_domain is not None or args.plain_http:
+        food2fork_client = CachingFood2ForkClient(api_domain=args.api_domain, use_ssl=not args.plain_http)
+    try:
+        if args.batch is not None:
+            runner = TakeHomeBatchRunner(food2fork_client, workers=args.workers, top_k=args.top_k)
+            try:
+                if args.batch == '-':
+                    runner.run_to_file(sys.stdin, sys.stdout, not args.unordered)
+                else:
+                    with open(args.batch) as f:
+                        runner.run_to_file(f, sys.stdout, not args.unordered)
+            finally:
+                runner.close()
+        elif args.profile is not None or args.script is not None:
+            script = None
+            if args.script is not None:
+                with open(args.script) as f:
+                    script = f.read().splitlines()
+            profiler = Profiler()
+            if args.profile is not None:
+                profiler.start()
+            app = ProfiledTakeHomeApplication(profiler, script, top_k=args.top_k, food2fork_client=food2fork_client)
+            app.main()
+            if args.profile is not None:
+                profiler.stop()
+                for line in profiler.summary():
+                    print(line)
+                for path in profiler.write(args.profile):
+                    print("Wrote %s" % (path,))
+        else:
+            app = TakeHomeApplication(top_k=args.top_k, food2fork_client=food2fork_client)
+            app.main()
+            if args.timing:
+                for line in app.startup_timing_report():
+                    print(line)
+    finally:
+        if args.metrics is not None:
+            METRICS.write(args.metrics)
@@ -0,0 +1,416 @@
+"""@package takehome_service
+This package contains the HTTP service mode of the application, serving many sessions of the state machine at once
+"""
+from api.caching_food2fork_client import CachingFood2ForkClient
+from api.recipe_mirror import LocalRecipeSource
+from spellcheck.background_loader import BackgroundDictionaryLoader
+from spellcheck.daemon import load_spell_checker
+from telemetry.metrics import METRICS
+from takehome import TakeHomeApplication, TakeHomeAppState
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+import argparse
+import asyncio
+import json
+import time
+import traceback
+import uuid
+
+class InputRequiredException(Exception):
+    """
+    Raised by TakeHomeSession when a state handler needs a line of input that has not arrived yet
+    """
+    pass
+
+class TakeHomeSession(TakeHomeApplication):
+    """
+    This class is one user's run of the application, driven by input sent over HTTP instead of the console.
+
+    The state handlers are the ones of TakeHomeApplication, only their I/O is replaced:
+        - output lines are collected and returned with the next response
+        - when a handler needs input that has not arrived, it stops (InputRequiredException) and is run again once the
+          input arrives, with the output it already produced suppressed up to the point it reads the input
+        - retry waits are handed back to the caller instead of blocking a thread
+    The Food2Fork client, dictionary and retry policy are shared with every other session.
+    """
+
+    def __init__(self, session_id, top_k=None, food2fork_client=None, spell_checker_loader=None, retry_policy=None):
+        """
+        Constructor function
+
+        :param session_id:
+            The session identifier
+        :param top_k, food2fork_client, spell_checker_loader, retry_policy:
+            see TakeHomeApplication, they should be shared between sessions
+        """
+        super(TakeHomeSession, self).__init__(top_k, food2fork_client, spell_checker_loader, retry_policy)
+        self.session_id = session_id
+        self.last_used = time.monotonic()
+        self.lock = asyncio.Lock()
+        self._inputs = deque()
+        self._outputs = []
+        self._prompt = None
+        self._waiting_for_input = False
+        self._replaying = False
+        self._pending_delay = None
+
+    def _read_line(self, prompt_text):
+        """
+        Takes the next line of input sent by the client
+
+        Exceptions:
+            raises InputRequiredException if no input is queued
+        """
+        self._replaying = False
+        if len(self._inputs) == 0:
+            self._prompt = prompt_text
+            raise InputRequiredException()
+        self._prompt = None
+        return self._inputs.popleft()
+
+    def _output(self, text):
+        """
+        Collects a line of output, unless the handler is replaying output the client already has
+        """
+        if not self._replaying:
+            self._outputs.append(text)
+
+    def _sleep(self, seconds):
+        """
+        Hands the wait back to the caller, see take_delay()
+        """
+        self._pending_delay = seconds
+
+    def add_input(self, line):
+        """
+        Queues a line of input
+
+        :param line:
+            The line, as it would have been typed on the console
+        """
+        self._inputs.append(line)
+
+    def advance(self):
+        """
+        This function runs the state machine until it needs input, has to wait before an API retry, or is finished
+        It blocks on API requests and the dictionary, so it should run on a worker thread
+        """
+        while self._state != TakeHomeAppState.FINISHED:
+            self._replaying = self._waiting_for_input
+            try:
+                self._process_state()
+            except InputRequiredException:
+                self._waiting_for_input = True
+                return
+            self._waiting_for_input = False
+            if self._pending_delay is not None:
+                return
+
+    def take_delay(self):
+        """
+        :return:
+            seconds to wait before advancing again, None if the session is not waiting on a retry
+        """
+        delay, self._pending_delay = self._pending_delay, None
+        return delay
+
+    def take_response(self):
+        """
+        This function builds the response to the client, handing over the output collected since the last response
+
+        :return:
+            response dict
+        """
+        outputs, self._outputs = self._outputs, []
+        return {'session': self.session_id,
+                'state': self._state.name,
+                'output': outputs,
+                'prompt': self._prompt if self._waiting_for_input else None,
+                'finished': self._state == TakeHomeAppState.FINISHED}
+
+class HTTPError(Exception):
+    """
+    Raised by TakeHomeService request handlers to reply with an error status
+    """
+    def __init__(self, status, message):
+        super(HTTPError, self).__init__(message)
+        self.status = status
+
+class TakeHomeService:
+    """
+    This class serves the application over HTTP/1.1 (asyncio, stdlib only), one TakeHomeSession per client session.
+
+    Endpoints (JSON bodies):
+        GET /health                 - status, number of sessions and of sessions in flight (being advanced)
+        GET /metrics                - the METRICS registry in the Prometheus text format (empty unless it is enabled)
+        POST /sessions              - starts a session, returns its first prompt
+        POST /sessions/<id>/input   - sends {"input": "<line>"}, returns the output and the next prompt
+        DELETE /sessions/<id>       - ends a session
+    Sessions that are finished are removed after their last response, idle ones after SESSION_TIMEOUT seconds.
+    State handlers run on a pool of WORKERS threads, so a session waiting on Food2Fork or on a retry delay doesn't hold up the others.
+    """
+    HOST = '127.0.0.1'
+    PORT = 8080
+    WORKERS = 16
+    MAX_SESSIONS = 1000
+    SESSION_TIMEOUT = 10 * 60
+    MAX_BODY_SIZE = 64 * 1024
+
+    def __init__(self, food2fork_client=None, spell_checker_loader=None, top_k=None, workers=None):
+        """
+        Constructor function
+
+        :param food2fork_client: (Optional)
+            The Food2Fork client shared by the sessions, a CachingFood2ForkClient by default
+        :param spell_checker_loader: (Optional)
+            The loader of the dictionary shared by the sessions, a BackgroundDictionaryLoader of load_spell_checker by default (see spellcheck.daemon)
+        :param top_k: (Optional)
+            see TakeHomeApplication
+        :param workers: (Optional)
+            The number of state handler threads, WORKERS by default
+        """
+        self._food2fork_client = food2fork_client if food2fork_client is not None else CachingFood2ForkClient()
+        self._spell_checker_loader = spell_checker_loader if spell_checker_loader is not None else BackgroundDictionaryLoader(load_spell_checker)
+        self._retry_policy = TakeHomeApplication.new_retry_policy()
+        self._top_k = top_k
+        self._executor = ThreadPoolExecutor(max_workers=workers or TakeHomeService.WORKERS)
+        self._sessions = {}
+        self._in_flight = 0
+        self._server = None
+
+    def health(self):
+        """
+        :return:
+            dict with the service status, for GET /health
+        """
+        return {'status': 'ok',
+                'sessions': len(self._sessions),
+                'in_flight': self._in_flight,
+                'dictionary_loaded': self._spell_checker_loader.is_loaded(),
+                'circuit': self._retry_policy.circuit_breaker.state()}
+
+    def _expire_sessions(self):
+        """
+        Removes the sessions that have been idle for more than SESSION_TIMEOUT seconds
+        """
+        now = time.monotonic()
+        for session_id in [x for x, session in self._sessions.items()
+                           if not session.lock.locked() and now - session.last_used > TakeHomeService.SESSION_TIMEOUT]:
+            del self._sessions[session_id]
+
+    async def _advance(self, session):
+        """
+        Advances a session on the worker pool, waiting out retry delays without holding a thread
+
+        :return:
+            response dict
+        """
+        loop = asyncio.get_running_loop()
+        async with session.lock:
+            self._in_flight += 1
+            try:
+                while True:
+                    await loop.run_in_executor(self._executor, session.advance)
+                    delay = session.take_delay()
+                    if delay is None:
+                        break
+                    await asyncio.sleep(delay)
+            finally:
+                self._in_flight -= 1
+            session.last_used = time.monotonic()
+            response = session.take_response()
+            if response['finished']:
+                self._sessions.pop(session.session_id, None)
+            return response
+
+    def _get_session(self, session_id):
+        """
+        :return:
+            the session with the identifier
+
+        Exceptions:
+            raises HTTPError (404) if there is no such session
+        """
+        session = self._sessions.get(session_id)
+        if session is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, 'Unknown session')
+        return session
+
+    async def _route(self, method, path, body):
+        """
+        This function dispatches a request to its endpoint
+
+        :return:
+            status, response dict (None for no body, a string for a plain text body)
+
+        Exceptions:
+            raises HTTPError if the request can't be served
+        """
+        parts = [x for x in path.split('?', 1)[0].split('/') if x != '']
+        if parts == ['health'] and method == 'GET':
+            return HTTPStatus.OK, self.health()
+        if parts == ['metrics'] and method == 'GET':
+            return HTTPStatus.OK, METRICS.to_prometheus()
+        if parts == ['sessions'] and method == 'POST':
+            self._expire_sessions()
+            if len(self._sessions) >= TakeHomeService.MAX_SESSIONS:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, 'Too many sessions')
+            session = TakeHomeSession(uuid.uuid4().hex, self._top_k, self._food2fork_client,
+                                      self._spell_checker_loader, self._retry_policy)
+            self._sessions[session.session_id] = session
+            return HTTPStatus.CREATED, await self._advance(session)
+        if len(parts) == 3 and parts[0] == 'sessions' and parts[2] == 'input' and method == 'POST':
+            session = self._get_session(parts[1])
+            try:
+                line = json.loads(body.decode('utf-8'))['input']
+            except (ValueError, KeyError, TypeError):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'Expected {"input": "<line>"}')
+            if not isinstance(line, str):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'Expected {"input": "<line>"}')
+            session.add_input(line)
+            return HTTPStatus.OK, await self._advance(session)
+        if len(parts) == 2 and parts[0] == 'sessions' and method == 'DELETE':
+            self._get_session(parts[1])
+            del self._sessions[parts[1]]
+            return HTTPStatus.NO_CONTENT, None
+        raise HTTPError(HTTPStatus.NOT_FOUND, 'Not found')
+
+    async def _read_request(self, reader):
+        """
+        This function reads one HTTP request
+
+        :return:
+            method, path, headers dict (lowercase names), body bytes; None if the client closed the connection
+
+        Exceptions:
+            raises HTTPError if the request is malformed
+        """
+        request_line = await reader.readline()
+        if request_line == b'':
+            return None
+        try:
+            method, path, _ = request_line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Malformed request line')
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, 'Invalid Content-Length')
+        if length < 0 or length > TakeHomeService.MAX_BODY_SIZE:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, 'Request body too large')
+        body = await reader.readexactly(length) if length > 0 else b''
+        return method, path, headers, body
+
+    def _write_response(self, writer, status, obj, keep_alive):
+        """
+        Writes an HTTP response with a JSON body, or a plain text one if obj is a string
+        """
+        if isinstance(obj, str):
+            payload = obj.encode('utf-8')
+        else:
+            payload = b'' if obj is None else json.dumps(obj).encode('utf-8')
+        head = ['HTTP/1.1 %s %s' % (status.value, status.phrase),
+                'Content-Length: %s' % (len(payload),),
+                'Connection: %s' % ('keep-alive' if keep_alive else 'close',)]
+        if isinstance(obj, str):
+            head.append('Content-Type: text/plain; version=0.0.4; charset=utf-8')
+        elif obj is not None:
+            head.append('Content-Type: application/json')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+
+    async def _handle_connection(self, reader, writer):
+        """
+        Serves the requests of one connection, keeping it alive until the client closes it or asks to.
+        A request failing unexpectedly is logged to stderr and answered with a 500, then the connection is closed
+        """
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                    if request is None:
+                        break
+                    method, path, headers, body = request
+                    keep_alive = headers.get('connection', '').lower() != 'close'
+                    status, obj = await self._route(method, path, body)
+                except HTTPError as e:
+                    status, obj, keep_alive = e.status, {'error': str(e)}, False
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except Exception:
+                    # A failing session must not drop the connection without a response or kill the server
+                    traceback.print_exc()
+                    status, obj, keep_alive = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': 'Internal server error'}, False
+                self._write_response(writer, status, obj, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host=None, port=None):
+        """
+        Starts listening
+
+        :param host: (Optional)
+            The address to listen on, HOST by default
+        :param port: (Optional)
+            The port to listen on, PORT by default (0 picks a free one)
+        :return:
+            the (host, port) listened on
+        """
+        self._server = await asyncio.start_server(self._handle_connection,
+                                                  host or TakeHomeService.HOST,
+                                                  port if port is not None else TakeHomeService.PORT)
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self):
+        """
+        Serves until cancelled, see start()
+        """
+        await self._server.serve_forever()
+
+    async def stop(self):
+        """
+        Stops listening and shuts down the worker pool
+        """
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+async def _main(args):
+    if args.metrics:
+        METRICS.enable()
+    food2fork_client = LocalRecipeSource(args.local) if args.local is not None else None
+    service = TakeHomeService(food2fork_client, top_k=args.top_k, workers=args.workers)
+    host, port = await service.start(args.host, args.port)
+    print("Serving on http://%s:%s" % (host, port,))
+    try:
+        await service.serve_forever()
+    finally:
+        await service.stop()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve the application over HTTP to many sessions at once')
+    parser.add_argument('--host', default=TakeHomeService.HOST, help='address to listen on')
+    parser.add_argument('--port', type=int, default=TakeHomeService.PORT, help='port to listen on')
+    parser.add_argument('--workers', type=int, default=TakeHomeService.WORKERS, help='state handler threads')
+    parser.add_argument('--top-k', type=int, default=TakeHomeApplication.TOP_K_RECIPES, metavar='K',
+                        help='compare the top K recipes and show the one missing the fewest ingredients')
+    parser.add_argument('--local', metavar='DB', help='answer from a local recipe mirror (see api.recipe_mirror) instead of Food2Fork')
+    parser.add_argument('--metrics', action='store_true', help='record metrics and trace spans, served at GET /metrics')
+    try:
+        asyncio.run(_main(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,324 @@
+"""@package metrics
+This package includes the instrumentation layer: counters, latency histograms and nested trace spans, kept in a
+MetricsRegistry and exported as JSONL or as Prometheus text.
+
+The application, the REST client and the spell checker report to the process-wide METRICS registry, which is disabled
+by default. While it is disabled, span() returns a shared no-op span and the other functions return right away.
+"""
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+class Histogram:
+    """
+    This class counts observed values (seconds) in cumulative buckets, like a Prometheus histogram
+    """
+    BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        """
+        Constructor function
+        """
+        self.count = 0
+        self.sum = 0.0
+        ## Number of observations in each bucket (not cumulative), the last one is +Inf
+        self._bucket_counts = [0] * (len(Histogram.BUCKETS) + 1)
+
+    def observe(self, value):
+        """
+        Counts a value
+        """
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(Histogram.BUCKETS):
+            if value <= bound:
+                self._bucket_counts[i] += 1
+                return
+        self._bucket_counts[-1] += 1
+
+    def buckets(self):
+        """
+        :return:
+            list of (upper bound, cumulative count), the last bound is float('inf')
+        """
+        cumulative = list(itertools.accumulate(self._bucket_counts))
+        return list(zip(list(Histogram.BUCKETS) + [float('inf')], cumulative))
+
+    def quantile(self, q):
+        """
+        :return:
+            upper bound of the bucket holding the q quantile (0 to 1), None if nothing was observed
+        """
+        if self.count == 0:
+            return None
+        for bound, cumulative in self.buckets():
+            if cumulative >= q * self.count:
+                return bound
+        return float('inf')
+
+class _NoopSpan:
+    """
+    The span returned while the registry is disabled
+    """
+
+    def set_label(self, name, value):
+        pass
+
+    def set_attribute(self, name, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """
+    This class times a block of code. Spans opened inside it on the same thread are its children.
+    When it exits, its duration is observed in the '<name>_seconds' histogram (with its labels) and it is kept as a trace
+    record. A span left through an exception gets an 'error' label with the exception type.
+    Attributes are only kept in the trace record, for values that would make too many histograms as labels (e.g. counts).
+    """
+
+    def __init__(self, registry, name, labels):
+        self._registry = registry
+        self.name = name
+        self.labels = labels
+        self.attributes = {}
+        self.span_id = None
+        self.parent_id = None
+        self.start = None
+        self.duration = None
+        self._thread = None
+
+    def set_label(self, name, value):
+        """
+        Adds a label known only once the block has run, e.g. the response status
+        """
+        self.labels[name] = value
+
+    def set_attribute(self, name, value):
+        """
+        Adds an attribute to the trace record, e.g. the number of words checked
+        """
+        self.attributes[name] = value
+
+    def __enter__(self):
+        self.span_id, self.parent_id = self._registry._push_span(self)
+        self.start = time.time()
+        self._perf_start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.duration = time.perf_counter() - self._perf_start
+        if exc_type is not None:
+            self.labels['error'] = exc_type.__name__
+        self._registry._pop_span(self)
+        return False
+
+    def to_dict(self):
+        """
+        :return:
+            the trace record of the span
+        """
+        return {'type': 'span', 'name': self.name, 'labels': self.labels, 'attributes': self.attributes, 'id': self.span_id,
+                'parent': self.parent_id, 'thread': self._thread, 'start': self.start, 'duration': self.duration}
+
+class MetricsRegistry:
+    """
+    This class keeps counters, histograms and the last MAX_SPANS finished spans. It can be shared by threads.
+
+    Metrics are identified by name and labels (keyword arguments), e.g.
+        METRICS.increment('takehome_api_retries_total')
+        with METRICS.span('rest_request', url='/api/get') as span:
+            ...
+            span.set_label('status', 200)
+    """
+    MAX_SPANS = 10000
+
+    def __init__(self, enabled=False):
+        """
+        Constructor function
+
+        :param enabled: (Optional)
+            True - record metrics
+            False - ignore them until enable() is called
+        """
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._span_ids = itertools.count(1)
+        self._counters = {}
+        self._histograms = {}
+        self._spans = deque(maxlen=MetricsRegistry.MAX_SPANS)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        """
+        Drops everything recorded so far
+        """
+        with self._lock:
+            self._counters = {}
+            self._histograms = {}
+            self._spans.clear()
+
+    def _key(self, name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def increment(self, name, value=1, **labels):
+        """
+        Adds value to a counter
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Counts a value (seconds) in a histogram
+        """
+        if not self.enabled:
+            return
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def span(self, name, **labels):
+        """
+        :return:
+            Span context manager timing its block (a no-op one while disabled)
+        """
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, labels)
+
+    def _push_span(self, span):
+        """
+        :return:
+            the span's id and its parent's (None for a root span)
+        """
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        parent_id = stack[-1].span_id if len(stack) > 0 else None
+        stack.append(span)
+        span._thread = threading.current_thread().name
+        return next(self._span_ids), parent_id
+
+    def _pop_span(self, span):
+        stack = self._local.stack
+        if len(stack) > 0 and stack[-1] is span:
+            stack.pop()
+        self.observe(span.name + '_seconds', span.duration, **span.labels)
+        with self._lock:
+            self._spans.append(span.to_dict())
+
+    def counters(self):
+        """
+        :return:
+            list of (name, labels dict, value)
+        """
+        with self._lock:
+            return [(name, dict(labels), value) for (name, labels), value in sorted(self._counters.items())]
+
+    def histograms(self):
+        """
+        :return:
+            list of (name, labels dict, Histogram)
+        """
+        with self._lock:
+            return [(name, dict(labels), histogram) for (name, labels), histogram in sorted(self._histograms.items())]
+
+    def spans(self):
+        """
+        :return:
+            list of span trace records, in the order they finished
+        """
+        with self._lock:
+            return list(self._spans)
+
+    def _prometheus_labels(self, labels, extra=None):
+        items = sorted(labels.items()) + (extra or [])
+        if len(items) == 0:
+            return ''
+        escaped = ['%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'),)
+                   for key, value in items]
+        return '{' + ','.join(escaped) + '}'
+
+    def to_prometheus(self):
+        """
+        This function exports the counters and histograms in the Prometheus text format (spans are not included)
+
+        :return:
+            string
+        """
+        lines = []
+        seen = set()
+        for name, labels, value in self.counters():
+            if name not in seen:
+                seen.add(name)
+                lines.append('# TYPE %s counter' % (name,))
+            lines.append('%s%s %s' % (name, self._prometheus_labels(labels), value,))
+        for name, labels, histogram in self.histograms():
+            if name not in seen:
+                seen.add(name)
+                lines.append('# TYPE %s histogram' % (name,))
+            for bound, cumulative in histogram.buckets():
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append('%s_bucket%s %s' % (name, self._prometheus_labels(labels, [('le', le)]), cumulative,))
+            lines.append('%s_sum%s %r' % (name, self._prometheus_labels(labels), histogram.sum,))
+            lines.append('%s_count%s %s' % (name, self._prometheus_labels(labels), histogram.count,))
+        return '\n'.join(lines) + '\n'
+
+    def _json_bound(self, bound):
+        return '+Inf' if bound == float('inf') else bound
+
+    def iter_jsonl(self):
+        """
+        This generator exports the counters, histograms and spans as JSON lines
+
+        :return:
+            generator of strings (without newlines)
+        """
+        for name, labels, value in self.counters():
+            yield json.dumps({'type': 'counter', 'name': name, 'labels': labels, 'value': value})
+        for name, labels, histogram in self.histograms():
+            yield json.dumps({'type': 'histogram', 'name': name, 'labels': labels, 'count': histogram.count,
+                              'sum': histogram.sum, 'p50': self._json_bound(histogram.quantile(0.5)),
+                              'p99': self._json_bound(histogram.quantile(0.99)),
+                              'buckets': [[self._json_bound(bound), cumulative] for bound, cumulative in histogram.buckets()]})
+        for span in self.spans():
+            yield json.dumps(span)
+
+    def write(self, path):
+        """
+        This function writes everything recorded to a file, as Prometheus text if the path ends with .prom or .txt,
+        as JSONL otherwise
+
+        :param path:
+            The file path
+        """
+        with open(path, 'w') as f:
+            if path.endswith(('.prom', '.txt')):
+                f.write(self.to_prometheus())
+            else:
+                for line in self.iter_jsonl():
+                    f.write(line + '\n')
+
+## The process-wide registry, disabled by default
+METRICS = MetricsRegistry()
@@ -0,0 +1,208 @@
+"""@package profiling
+This package includes the Profiler class, which runs cProfile and tracemalloc over named sections of a run (e.g. the
+states of TakeHomeApplication) and writes pstats files and allocation reports
+"""
+import contextlib
+import cProfile
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+
+class Profiler:
+    """
+    This class profiles named sections of code. Each section name gets its own cProfile profile, accumulated over every
+    time the section is entered, along with its number of entries, wall time, net allocated bytes and allocation peak.
+
+    Sections nest: the outer section's profile is paused while an inner one runs, so every function call is attributed
+    to the innermost section. A section only profiles the thread it was entered on, work handed to other threads is not
+    in it. Up to Python 3.11, sections can run on several threads at once (each thread has its own stack), but a section
+    name should only be active on one thread at a time. From Python 3.12, cProfile is built on sys.monitoring, which
+    allows one active profile per process: sections must only be entered on one thread, and not while another Profiler
+    (or cProfile) is running, otherwise entering them raises ValueError. Allocations are traced for the whole process,
+    so the allocation figures of sections overlapping on several threads are approximate, and entering a nested section
+    restarts the peak.
+
+    Usage:
+        profiler = Profiler()
+        profiler.start()
+        with profiler.section('load'):
+            ...
+        profiler.stop()
+        profiler.write('./profile')
+    """
+    TOP_ALLOCATIONS = 25
+    TRACEBACK_FRAMES = 1
+
+    def __init__(self, trace_allocations=True):
+        """
+        Constructor function
+
+        :param trace_allocations: (Optional)
+            True - also trace memory allocations with tracemalloc
+            False - only profile CPU
+        """
+        self._trace_allocations = trace_allocations
+        self._running = False
+        self._started_tracing = False
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._profiles = {}
+        ## Section name: dict of entries, seconds, allocated (net bytes) and peak (bytes)
+        self._sections = {}
+        self._snapshot = None
+
+    def start(self):
+        """
+        Starts tracing allocations, sections entered before start() or after stop() are not profiled
+        """
+        if self._trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start(Profiler.TRACEBACK_FRAMES)
+            self._started_tracing = True
+        self._running = True
+
+    def stop(self):
+        """
+        Stops profiling, taking the snapshot of the allocations that are still alive for the report
+        """
+        self._running = False
+        if tracemalloc.is_tracing():
+            self._snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            ])
+            if self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    @contextlib.contextmanager
+    def section(self, name):
+        """
+        This function profiles the block of a with statement as the named section
+
+        :param name:
+            The section name
+        """
+        if not self._running:
+            yield
+            return
+        stack = self._stack()
+        with self._lock:
+            profile = self._profiles.get(name)
+            if profile is None:
+                profile = self._profiles[name] = cProfile.Profile()
+                self._sections[name] = {'entries': 0, 'seconds': 0.0, 'allocated': 0, 'peak': 0}
+        if len(stack) > 0:
+            stack[-1].disable()
+        stack.append(profile)
+        tracing = tracemalloc.is_tracing()
+        start_memory = tracemalloc.get_traced_memory()[0] if tracing else 0
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - start
+            current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+            stack.pop()
+            with self._lock:
+                stats = self._sections[name]
+                stats['entries'] += 1
+                stats['seconds'] += elapsed
+                stats['allocated'] += current - start_memory
+                stats['peak'] = max(stats['peak'], peak - start_memory)
+            if len(stack) > 0:
+                stack[-1].enable()
+
+    def sections(self):
+        """
+        :return:
+            list of (section name, dict of entries, seconds, allocated and peak), slowest first
+        """
+        with self._lock:
+            return sorted(((name, dict(stats)) for name, stats in self._sections.items()), key=lambda x: -x[1]['seconds'])
+
+    def summary(self):
+        """
+        :return:
+            list of lines, a table of the sections
+        """
+        lines = ["%-28s  %8s  %10s  %12s  %12s" % ('section', 'entries', 'seconds', 'allocated', 'peak',)]
+        for name, stats in self.sections():
+            lines.append("%-28s  %8d  %10.4f  %12s  %12s" % (name, stats['entries'], stats['seconds'],
+                                                             self._format_size(stats['allocated']),
+                                                             self._format_size(stats['peak']),))
+        return lines
+
+    def _format_size(self, size):
+        for unit in ['B', 'KiB', 'MiB']:
+            if abs(size) < 1024 or unit == 'MiB':
+                return "%.1f %s" % (size, unit,) if unit != 'B' else "%d B" % (size,)
+            size /= 1024
+
+    def _file_name(self, name):
+        return re.sub('[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'section'
+
+    def top_allocations(self, n=None):
+        """
+        :param n: (Optional)
+            The number of source lines, TOP_ALLOCATIONS by default
+        :return:
+            list of lines, the source lines holding the most memory when profiling stopped
+        """
+        if self._snapshot is None:
+            return []
+        lines = []
+        for stat in self._snapshot.statistics('lineno')[:n or Profiler.TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            lines.append("%12s  %8d blocks  %s:%s" % (self._format_size(stat.size), stat.count, frame.filename, frame.lineno,))
+        return lines
+
+    def write(self, output_dir):
+        """
+        This function writes a pstats file per section (<section>.pstats), their union (total.pstats) and the allocation
+        report (allocations.txt) to a directory. pstats files can be read with pstats.Stats or e.g. snakeviz.
+
+        :param output_dir:
+            The directory, created if needed
+        :return:
+            list of the paths written
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        paths = []
+        profiles = []
+        for name, _ in self.sections():
+            profile = self._profiles[name]
+            profile.create_stats()
+            if len(profile.stats) == 0:
+                continue
+            path = os.path.join(output_dir, self._file_name(name) + '.pstats')
+            profile.dump_stats(path)
+            paths.append(path)
+            profiles.append(profile)
+        if len(profiles) > 0:
+            path = os.path.join(output_dir, 'total.pstats')
+            pstats.Stats(*profiles).dump_stats(path)
+            paths.append(path)
+        path = os.path.join(output_dir, 'allocations.txt')
+        with open(path, 'w') as f:
+            f.write("Sections (allocated is the net change of traced memory, peak is above the memory at entry)\n")
+            for line in self.summary():
+                f.write(line + '\n')
+            f.write("\nTop allocations still alive at the end of the run\n")
+            for line in self.top_allocations():
+                f.write(line + '\n')
+        paths.append(path)
+        return paths
@@ -4,6 +4,66 @@ This package includes the API module tests
 from tests.test_base import Test, TestSuite
 from api.rest_client import BasicRESTClient
 from api.food2fork_client import Food2ForkClient
+from api.connection_pool import ConnectionPool
+from api.async_rest_client import AsyncRESTClient
+from api.response_cache import ResponseCache
+from api.caching_food2fork_client import CachingFood2ForkClient
+from api.partial_json import PartialArrayDecoder
+from api.retry_policy import RetryPolicy, CircuitBreaker, parse_retry_after
+from api.search_iterator import SearchIterator, SearchPageException
+from api.recipe_mirror import RecipeMirror, RecipeSync, LocalRecipeSource
+from tests.food2fork_standin import Food2ForkStandIn, FaultProfile, parse_latency
+import gzip
+import os
+import tempfile
+import asyncio
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+import urllib.parse
+import zlib
+
+class LocalEchoHandler(BaseHTTPRequestHandler):
+    """
+    Echoes the urlencoded POST body back as JSON, along with the client port so tests can tell connections apart
+    """
+    protocol_version = 'HTTP/1.1'
+    ## Idle keep-alive connections are dropped after this many seconds
+    timeout = 0.2
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+        data = dict(urllib.parse.parse_qsl(body))
+        data['_port'] = self.client_address[1]
+        payload = json.dumps(data).encode('utf-8')
+        self.send_response(404 if self.path == '/missing' else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+class LocalServerTest(Test):
+    """
+    Base class for tests that need a local HTTP server (LocalEchoHandler) and a client that talks plain HTTP to it
+    """
+    HANDLER = LocalEchoHandler
+
+    def _setup(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self.HANDLER)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        self._host = '127.0.0.1:%s' % (self._server.server_address[1],)
+        self._client = BasicRESTClient(use_ssl=False)
+
+    def _tear_down(self):
+        self._client.close()
+        self._server.shutdown()
+        self._server.server_close()
 
 class BasicRestClientJSONDecodeTest(Test):
     TITLE = 'BasicRestClient._safe_json_decode'
@@ -25,15 +85,11 @@ class BasicRestClientJSONDecodeTest(Test):
     def _tear_down(self):
         self._client = None
 
-class BasicRestClientDoURLEncodedPostTest(Test):
+class BasicRestClientDoURLEncodedPostTest(LocalServerTest):
     TITLE = 'BasicRestClient._do_url_encoded_post'
 
-    API_DOMAIN = 'e1tfqyprxj.execute-api.us-east-1.amazonaws.com'
     API_URL = '/test_api_test/urlencoded_echo'
 
-    def _setup(self):
-        self._client = BasicRESTClient()
-
     def _run_test(self):
         test_dicts = [
             {},
@@ -41,24 +97,24 @@ class BasicRestClientDoURLEncodedPostTest(Test):
             {'tes$$$t': 'wor%%ld', 'c': 'wow()@#@#'}
         ]
         for test_dict in test_dicts:
-            result = self._client._do_url_encoded_post(
-                BasicRestClientDoURLEncodedPostTest.API_DOMAIN,
+            resp_status, obj_data = self._client._do_url_encoded_post(
+                self._host,
                 BasicRestClientDoURLEncodedPostTest.API_URL,
                 test_dict
             )
-            if (200, test_dict) != result:
-                print("FAILED: test_dict: %s - result: %s" % (test_dict, result,))
+            obj_data.pop('_port', None)
+            if (200, test_dict) != (resp_status, obj_data):
+                print("FAILED: test_dict: %s - result: %s" % (test_dict, (resp_status, obj_data),))
                 return False
         return True
 
-    def _tear_down(self):
-        self._client = None
-
 class Food2ForkClientAPIGetRecipeTest(Test):
     TITLE = 'Food2ForkClient.api_get_recipe'
 
     def _setup(self):
-        self._client = Food2ForkClient()
+        self._standin = Food2ForkStandIn()
+        self._standin.start()
+        self._client = Food2ForkClient(api_domain=self._standin.domain(), use_ssl=False)
 
     def _run_test(self):
         (resp_status, obj_data) = self._client.api_get_recipe('035865')
@@ -76,7 +132,8 @@ class Food2ForkClientAPIGetRecipeTest(Test):
         return True
 
     def _tear_down(self):
-        self._client = None
+        self._client.close()
+        self._standin.stop()
 
 class Food2ForkClientAPISearchTest(Test):
     TITLE = 'Food2ForkClient.api_search'
@@ -114,11 +171,578 @@ class Food2ForkClientAPISearchTest(Test):
     def _tear_down(self):
         self._client = None
 
+class ConnectionPoolTest(Test):
+    TITLE = 'ConnectionPool'
+
+    class DummyConnection:
+        def __init__(self, host):
+            self.host = host
+            self.closed = False
+
+        def close(self):
+            self.closed = True
+
+    def _run_test(self):
+        pool = ConnectionPool(ConnectionPoolTest.DummyConnection, max_idle_per_host=1, idle_timeout=0.1)
+        conn_a, reused = pool.acquire('a.com')
+        if reused or conn_a.host != 'a.com':
+            return False
+        conn_b, _ = pool.acquire('a.com')
+        pool.release('a.com', conn_a)
+        pool.release('a.com', conn_b)
+        # Only one idle connection per host is kept
+        if not conn_b.closed or pool.num_idle('a.com') != 1:
+            return False
+        if pool.acquire('a.com') != (conn_a, True):
+            return False
+        if pool.acquire('b.com')[1]:
+            return False
+        # Expired connections are closed instead of reused
+        pool.release('a.com', conn_a)
+        time.sleep(0.2)
+        conn_c, reused = pool.acquire('a.com')
+        if reused or conn_c is conn_a or not conn_a.closed:
+            return False
+        pool.release('a.com', conn_c)
+        pool.close()
+        if not conn_c.closed or pool.num_idle('a.com') != 0:
+            return False
+        return True
+
+class BasicRestClientKeepAliveTest(LocalServerTest):
+    TITLE = 'BasicRestClient keep-alive'
+
+    def _run_test(self):
+        status, first = self._client._do_url_encoded_post(self._host, '/echo', {'a': '1'})
+        if status != 200 or first['a'] != '1':
+            return False
+        status, second = self._client._do_url_encoded_post(self._host, '/echo', {'b': '2'})
+        if status != 200 or second['_port'] != first['_port']:
+            print("FAILED: the connection was not reused")
+            return False
+        # Non-200 responses also return the connection to the pool
+        if self._client._do_url_encoded_post(self._host, '/missing', {}) != (404, 'Not Found'):
+            return False
+        if self._client._connection_pool.num_idle(self._host) != 1:
+            return False
+        # Server drops the idle connection, the client reconnects transparently
+        time.sleep(LocalEchoHandler.timeout * 3)
+        status, third = self._client._do_url_encoded_post(self._host, '/echo', {'c': '3'})
+        if status != 200 or third['c'] != '3' or third['_port'] == first['_port']:
+            return False
+        return True
+
+class SlowEchoHandler(LocalEchoHandler):
+    """
+    Echo handler that takes a while to answer and records the peak number of requests in progress
+    """
+    in_flight = 0
+    peak_in_flight = 0
+    lock = threading.Lock()
+
+    ## Responses cut off or malformed after the status line
+    BROKEN_BODIES = {
+        '/truncated': b'Transfer-Encoding: chunked\r\n\r\n10\r\n{"i": ',
+        '/bad-chunk': b'Transfer-Encoding: chunked\r\n\r\nzz\r\n{}\r\n0\r\n\r\n',
+        '/short': b'Content-Length: 100\r\n\r\n{}',
+    }
+
+    def do_POST(self):
+        if self.path in ('/garbage', '/empty'):
+            # Not an HTTP response, or no response at all
+            self.wfile.write(b'garbage\r\n\r\n' if self.path == '/garbage' else b'')
+            self.close_connection = True
+            return
+        if self.path in SlowEchoHandler.BROKEN_BODIES:
+            self.wfile.write(b'HTTP/1.1 200 OK\r\nConnection: close\r\n' + SlowEchoHandler.BROKEN_BODIES[self.path])
+            self.close_connection = True
+            return
+        with SlowEchoHandler.lock:
+            SlowEchoHandler.in_flight += 1
+            SlowEchoHandler.peak_in_flight = max(SlowEchoHandler.peak_in_flight, SlowEchoHandler.in_flight)
+        time.sleep(0.05)
+        with SlowEchoHandler.lock:
+            SlowEchoHandler.in_flight -= 1
+        super(SlowEchoHandler, self).do_POST()
+
+class AsyncRESTClientTest(LocalServerTest):
+    TITLE = 'AsyncRESTClient._do_async_url_encoded_post'
+    HANDLER = SlowEchoHandler
+
+    class PlainAsyncRESTClient(AsyncRESTClient):
+        USE_SSL = False
+
+    async def _post_all(self, client, count):
+        return await asyncio.gather(*[client._do_async_url_encoded_post(self._host, '/echo', {'i': str(i)})
+                                      for i in range(count)])
+
+    def _run_test(self):
+        SlowEchoHandler.peak_in_flight = 0
+        client = AsyncRESTClientTest.PlainAsyncRESTClient(max_concurrency=4)
+        start = time.perf_counter()
+        results = asyncio.run(self._post_all(client, 16))
+        elapsed = time.perf_counter() - start
+        for i, (status, data) in enumerate(results):
+            if status != 200 or data['i'] != str(i):
+                return False
+        if SlowEchoHandler.peak_in_flight > 4 or SlowEchoHandler.peak_in_flight < 2:
+            print("FAILED: peak in flight: %s" % (SlowEchoHandler.peak_in_flight,))
+            return False
+        # 16 requests of 50 ms, 4 at a time, overlap into ~200 ms
+        if elapsed > 16 * 0.05:
+            print("FAILED: requests did not overlap (%.3f s)" % (elapsed,))
+            return False
+        if asyncio.run(client._do_async_url_encoded_post(self._host, '/missing', {})) != (404, 'Not Found'):
+            return False
+        # Malformed and missing status lines, cut off and malformed bodies are bad responses, not exceptions
+        for path in ['/garbage', '/empty'] + list(SlowEchoHandler.BROKEN_BODIES):
+            if asyncio.run(client._do_async_url_encoded_post(self._host, path, {})) != (-1, None):
+                print("FAILED: %s" % (path,))
+                return False
+        return True
+
+class ResponseCacheTest(Test):
+    TITLE = 'ResponseCache'
+
+    def _setup(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tmp_dir.name, 'responses.sqlite')
+
+    def _run_test(self):
+        cache = ResponseCache(self._path, max_memory_bytes=40)
+        cache.put('a', {'recipe': {'title': 'A'}}, 60)
+        result = cache.get('a')
+        if result != {'recipe': {'title': 'A'}}:
+            return False
+        # Hits return copies
+        result['recipe']['title'] = 'Changed'
+        if cache.get('a') != {'recipe': {'title': 'A'}}:
+            return False
+        # Over the memory budget, 'a' is evicted from memory but still on disk
+        cache.put('b', {'recipe': {'title': 'B'}}, 60)
+        if cache.stats()['size'] != 1 or cache.get('a') != {'recipe': {'title': 'A'}} or cache.stats()['disk_hits'] != 1:
+            return False
+        # Expired
+        cache.put('c', {'c': 1}, -1)
+        if cache.get('c') is not None or cache.get('missing') is not None:
+            return False
+        cache.close()
+        # Persisted across instances
+        cache = ResponseCache(self._path)
+        if cache.get('b') != {'recipe': {'title': 'B'}}:
+            return False
+        cache.close()
+        return True
+
+    def _tear_down(self):
+        self._tmp_dir.cleanup()
+
+class CachingFood2ForkClientTest(Test):
+    TITLE = 'CachingFood2ForkClient'
+
+    class CachingFood2ForkDummyClient(CachingFood2ForkClient):
+        def _do_url_encoded_post(self, api_domain, api_url, api_url_params):
+            self.requests.append(api_url_params)
+            if api_url_params.get('rId') == 'error':
+                return 500, 'Internal Server Error'
+            if api_url_params.get('rId') == 'limit':
+                return 200, {'error': 'limit'}
+            if 'rId' in api_url_params:
+                return 200, {'recipe': {'recipe_id': api_url_params['rId']}}
+            return 200, {'count': 1, 'recipes': [{'params': api_url_params}]}
+
+    def _setup(self):
+        self._client = CachingFood2ForkClientTest.CachingFood2ForkDummyClient(ResponseCache())
+        self._client.requests = []
+
+    def _run_test(self):
+        first = self._client.api_search(q='Chicken, broth', sort='r')
+        if first[0] != 200 or self._client.api_search(q='broth,chicken,chicken', sort='R', page=1) != first:
+            return False
+        if len(self._client.requests) != 1:
+            return False
+        self._client.api_search(q='broth,chicken', sort='r', page=2)
+        self._client.api_get_recipe('035865')
+        self._client.api_get_recipe('035865')
+        if len(self._client.requests) != 3:
+            return False
+        # Errors are not cached
+        self._client.api_get_recipe('error')
+        if self._client.api_get_recipe('error') != (500, 'Internal Server Error') or len(self._client.requests) != 5:
+            return False
+        # Neither are the errors Food2Fork returns with a 200 status
+        self._client.api_get_recipe('limit')
+        if self._client.api_get_recipe('limit') != (200, {'error': 'limit'}) or len(self._client.requests) != 7:
+            return False
+        # A client of another server sharing the cache doesn't get this server's responses
+        other = CachingFood2ForkClientTest.CachingFood2ForkDummyClient(self._client._cache, api_domain='127.0.0.1:8000',
+                                                                        use_ssl=False)
+        other.requests = []
+        other.api_search(q='Chicken, broth', sort='r')
+        other.api_get_recipe('035865')
+        if len(other.requests) != 2 or self._client._cache.stats()['size'] != 5:
+            return False
+        return True
+
+    def _tear_down(self):
+        self._client = None
+
+class PartialArrayDecoderTest(Test):
+    TITLE = 'PartialArrayDecoder'
+
+    DOCUMENT = {'count': 3, 'recipes': [{'recipe_id': '1', 'title': 'A "quoted" ]} title'},
+                                        {'recipe_id': '2', 'rating': 99.5},
+                                        {'recipe_id': '3', 'tags': [None, True]}], 'after': 12345}
+
+    def _decode(self, max_items, piece_size):
+        text = json.dumps(PartialArrayDecoderTest.DOCUMENT)
+        decoder = PartialArrayDecoder('recipes', max_items)
+        for start in range(0, len(text), piece_size):
+            if decoder.feed(text[start:start + piece_size], eof=start + piece_size >= len(text)):
+                return start + piece_size < len(text), decoder.result()
+        return False, None
+
+    def _run_test(self):
+        recipes = PartialArrayDecoderTest.DOCUMENT['recipes']
+        for piece_size in [1, 3, 7, 1000]:
+            stopped_early, result = self._decode(1, piece_size)
+            if result != {'count': 3, 'recipes': recipes[:1]} or (piece_size < 100 and not stopped_early):
+                print("FAILED: piece size %s - %s" % (piece_size, result,))
+                return False
+            if self._decode(5, piece_size)[1] != PartialArrayDecoderTest.DOCUMENT:
+                return False
+        decoder = PartialArrayDecoder('recipes', 1)
+        try:
+            decoder.feed('{"count": 3, "recipes": [{"recipe_id": ', eof=True)
+            return False
+        except json.JSONDecodeError:
+            pass
+        return True
+
+class CompressedSearchHandler(LocalEchoHandler):
+    """
+    Serves a gzip compressed search page of 30 recipes.
+    /truncated cuts the gzip body short, /deflate and /raw-deflate serve it deflate compressed with and without the zlib header
+    """
+    PAGE = {'count': 30, 'recipes': [{'recipe_id': str(i), 'title': 'Recipe %s' % (i,)} for i in range(30)]}
+
+    def _deflate(self, payload, wbits):
+        compressor = zlib.compressobj(wbits=wbits)
+        return compressor.compress(payload) + compressor.flush()
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        payload = json.dumps(CompressedSearchHandler.PAGE).encode('utf-8')
+        self.send_response(200)
+        if self.path == '/deflate' or self.path == '/raw-deflate':
+            payload = self._deflate(payload, zlib.MAX_WBITS if self.path == '/deflate' else -zlib.MAX_WBITS)
+            self.send_header('Content-Encoding', 'deflate')
+        elif 'gzip' in self.headers.get('Accept-Encoding', ''):
+            payload = gzip.compress(payload)
+            if self.path == '/truncated':
+                payload = payload[:len(payload) // 2]
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+class BasicRestClientCompressedStreamingTest(LocalServerTest):
+    TITLE = 'BasicRestClient compressed and partial responses'
+    HANDLER = CompressedSearchHandler
+
+    def _run_test(self):
+        if self._client._do_url_encoded_post(self._host, '/api/search', {}) != (200, CompressedSearchHandler.PAGE):
+            return False
+        saved_chunk_size = BasicRESTClient.READ_CHUNK_SIZE
+        BasicRESTClient.READ_CHUNK_SIZE = 16
+        try:
+            result = self._client._do_url_encoded_post_partial(self._host, '/api/search', {}, 'recipes', 1)
+        finally:
+            BasicRESTClient.READ_CHUNK_SIZE = saved_chunk_size
+        if result != (200, {'count': 30, 'recipes': CompressedSearchHandler.PAGE['recipes'][:1]}):
+            print("FAILED: %s" % (result,))
+            return False
+        # The rest of the short body is drained, so the connection is kept alive
+        if self._client._connection_pool.num_idle(self._host) != 1:
+            return False
+        # Also when it was all read in one go
+        result = self._client._do_url_encoded_post_partial(self._host, '/api/search', {}, 'recipes', 1)
+        if result[0] != 200 or self._client._connection_pool.num_idle(self._host) != 1:
+            return False
+        # A body too long to drain closes it
+        saved_drain_limit = BasicRESTClient.DRAIN_LIMIT
+        saved_chunk_size = BasicRESTClient.READ_CHUNK_SIZE
+        BasicRESTClient.DRAIN_LIMIT = 0
+        BasicRESTClient.READ_CHUNK_SIZE = 16
+        try:
+            self._client._do_url_encoded_post_partial(self._host, '/api/search', {}, 'recipes', 1)
+        finally:
+            BasicRESTClient.DRAIN_LIMIT = saved_drain_limit
+            BasicRESTClient.READ_CHUNK_SIZE = saved_chunk_size
+        if self._client._connection_pool.num_idle(self._host) != 0:
+            return False
+        result = self._client._do_url_encoded_post_partial(self._host, '/api/search', {}, 'recipes', 50)
+        if result != (200, CompressedSearchHandler.PAGE):
+            return False
+        # Deflate bodies are accepted with or without the zlib header
+        for path in ['/deflate', '/raw-deflate']:
+            if self._client._do_url_encoded_post(self._host, path, {}) != (200, CompressedSearchHandler.PAGE):
+                print("FAILED: %s" % (path,))
+                return False
+        # A truncated body is a bad response, not an exception
+        if self._client._do_url_encoded_post(self._host, '/truncated', {}) != (-1, None):
+            return False
+        if self._client._do_url_encoded_post_partial(self._host, '/truncated', {}, 'recipes', 50) != (-1, None):
+            return False
+        if asyncio.run(AsyncRESTClient(use_ssl=False)._do_async_url_encoded_post(self._host, '/truncated', {})) != (-1, None):
+            return False
+        return True
+
+class RetryPolicyTest(Test):
+    TITLE = 'RetryPolicy'
+
+    def _run_test(self):
+        policy = RetryPolicy(base_delay=1.0, max_delay=4.0, rand=lambda: 0.5)
+        for status in [-2, -1, 429, 500, 503]:
+            if not policy.is_retryable(status):
+                return False
+        for status in [200, 400, 401, 403, 404]:
+            if policy.is_retryable(status):
+                return False
+        if policy.is_retryable(503, retry_after=RetryPolicy.MAX_RETRY_AFTER + 1):
+            return False
+        # Exponential, capped, with jitter
+        if [policy.delay(attempt) for attempt in [1, 2, 3, 4, 5]] != [0.5, 1.0, 2.0, 2.0, 2.0]:
+            return False
+        if policy.delay(1, retry_after=3.0) != 3.0 or policy.delay(3, max_delay=1.0) != 0.5:
+            return False
+        if parse_retry_after('120') != 120.0 or parse_retry_after(None) is not None or parse_retry_after('soon') is not None:
+            return False
+        if parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') != 0.0:
+            return False
+        return True
+
+class CircuitBreakerTest(Test):
+    TITLE = 'CircuitBreaker'
+
+    def _run_test(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+        breaker.record_failure()
+        if breaker.state() != CircuitBreaker.CLOSED or not breaker.allow_request():
+            return False
+        breaker.record_failure()
+        if breaker.state() != CircuitBreaker.OPEN or breaker.allow_request():
+            return False
+        time.sleep(0.15)
+        # Half open allows one trial request, which fails and opens the circuit again
+        if not breaker.allow_request() or breaker.state() != CircuitBreaker.HALF_OPEN or breaker.allow_request():
+            return False
+        breaker.record_failure()
+        if breaker.state() != CircuitBreaker.OPEN:
+            return False
+        time.sleep(0.15)
+        breaker.allow_request()
+        breaker.record_success()
+        if breaker.state() != CircuitBreaker.CLOSED or not breaker.allow_request():
+            return False
+        # 404s mean the service is up
+        policy = RetryPolicy(circuit_breaker=CircuitBreaker(failure_threshold=1))
+        policy.record(404)
+        if policy.circuit_breaker.state() != CircuitBreaker.CLOSED:
+            return False
+        policy.record(503)
+        if policy.circuit_breaker.state() != CircuitBreaker.OPEN:
+            return False
+        return True
+
+class SearchIteratorTest(Test):
+    TITLE = 'Food2ForkClient.iter_search'
+
+    class PagedDummyClient(Food2ForkClient):
+        NUM_RECIPES = 75
+
+        def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+            with self.lock:
+                self.requests.append((page, max_recipes))
+            time.sleep(0.05)
+            if q == 'error' and page == 2:
+                return 500, 'Internal Server Error'
+            first = (page - 1) * SearchIterator.PAGE_SIZE
+            last = min(first + (max_recipes or SearchIterator.PAGE_SIZE), SearchIteratorTest.PagedDummyClient.NUM_RECIPES)
+            return 200, {'count': max(last - first, 0), 'recipes': [{'recipe_id': str(i)} for i in range(first, last)]}
+
+    def _setup(self):
+        self._client = SearchIteratorTest.PagedDummyClient()
+        self._client.lock = threading.Lock()
+        self._client.requests = []
+
+    def _run_test(self):
+        recipes = [recipe['recipe_id'] for recipe in self._client.iter_search(q='chicken')]
+        # The end of the results is only known at the short page 3, so up to `lookahead` pages past it may be fetched
+        if recipes != [str(i) for i in range(75)] or sorted(self._client.requests)[:3] != [(1, None), (2, None), (3, None)]:
+            return False
+        if len(self._client.requests) > 3 + SearchIterator.LOOKAHEAD:
+            return False
+        # Only the recipes needed are decoded from the last page
+        self._client.requests = []
+        if len(list(self._client.iter_search(q='chicken', max_results=40, lookahead=4))) != 40:
+            return False
+        if sorted(self._client.requests) != [(1, None), (2, 10)]:
+            return False
+        # Page 2 is fetched while page 1 is consumed, and nothing more is fetched once the consumer stops
+        self._client.requests = []
+        for _ in self._client.iter_search(q='chicken', lookahead=1):
+            time.sleep(0.1)
+            if (2, None) not in self._client.requests:
+                return False
+            break
+        time.sleep(0.15)
+        if sorted(self._client.requests) != [(1, None), (2, None)]:
+            return False
+        try:
+            list(self._client.iter_search(q='error'))
+            return False
+        except SearchPageException as e:
+            if e.page != 2 or e.resp_status != 500:
+                return False
+        return True
+
+    def _tear_down(self):
+        self._client = None
+
+class RecipeMirrorTest(Test):
+    TITLE = 'RecipeMirror and LocalRecipeSource'
+
+    class MirrorDummyClient(SearchIteratorTest.PagedDummyClient):
+        INGREDIENTS = [['2 cups chicken broth', '1 onion'], ['4 ripe tomatoes, chopped', '1 onion'], ['1 cup sugar']]
+
+        def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+            resp_status, obj_data = super(RecipeMirrorTest.MirrorDummyClient, self).api_search(q, sort, page, max_recipes)
+            for recipe in obj_data['recipes']:
+                recipe['social_rank'] = int(recipe['recipe_id'])
+            return resp_status, obj_data
+
+        def api_get_recipe(self, rId):
+            self.fetched.append(rId)
+            ingredients = RecipeMirrorTest.MirrorDummyClient.INGREDIENTS[int(rId) % 3]
+            return 200, {'recipe': {'recipe_id': rId, 'title': 'Recipe %s' % (rId,), 'f2f_url': 'url', 'ingredients': ingredients}}
+
+    def _setup(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._client = RecipeMirrorTest.MirrorDummyClient()
+        self._client.lock = threading.Lock()
+        self._client.requests = []
+        self._client.fetched = []
+        self._mirror = RecipeMirror(os.path.join(self._dir.name, 'recipes.sqlite'))
+
+    def _run_test(self):
+        sync = RecipeSync(self._client, self._mirror)
+        if sync.sync('chicken', max_results=40) != {'seen': 40, 'fetched': 40, 'skipped': 0, 'failed': 0}:
+            return False
+        # Only new recipes are fetched again
+        self._client.fetched = []
+        if sync.sync('chicken', max_results=50) != {'seen': 50, 'fetched': 10, 'skipped': 40, 'failed': 0}:
+            return False
+        if sorted(self._client.fetched, key=int) != [str(i) for i in range(40, 50)] or len(self._mirror) != 50:
+            return False
+        source = LocalRecipeSource(self._mirror)
+        resp_status, obj_data = source.api_search(q='Tomato, onion', sort='r')
+        ids = [recipe['recipe_id'] for recipe in obj_data['recipes']]
+        if resp_status != 200 or ids != [str(i) for i in range(49, -1, -1) if i % 3 == 1] or obj_data['count'] != 17:
+            return False
+        if source.api_search(q='broth', page=2)[1]['count'] != 0 or source.api_search(q='onion', page=2)[1]['count'] != 4:
+            return False
+        if [x['recipe_id'] for x in source.api_search(q='sugar', max_recipes=2)[1]['recipes']] != ['47', '44']:
+            return False
+        if source.api_get_recipe('5')[1]['recipe']['ingredients'] != ['1 cup sugar'] or source.api_get_recipe('x')[0] != 404:
+            return False
+        return True
+
+    def _tear_down(self):
+        self._mirror.close()
+        self._dir.cleanup()
+
+class Food2ForkStandInTest(Test):
+    TITLE = 'Food2ForkStandIn'
+
+    def _setup(self):
+        self._standin = Food2ForkStandIn(faults=FaultProfile(retry_after=3, drip_chunk=256, drip_delay=0.001))
+        self._standin.start()
+        self._client = Food2ForkClient(api_domain=self._standin.domain(), use_ssl=False)
+
+    def _run_test(self):
+        try:
+            parse_latency('normal:1')
+            return False
+        except ValueError:
+            pass
+        if parse_latency('const:5')(None) != 0.005 or parse_latency(None)(None) != 0.0:
+            return False
+        status, first = self._client.api_search(q='sugar')
+        status2, second = self._client.api_search(q='sugar', page=2)
+        if status != 200 or status2 != 200 or first['count'] != 30 or len(second['recipes']) == 0:
+            return False
+        ids = [x['recipe_id'] for x in first['recipes'] + second['recipes']]
+        ranks = [x['social_rank'] for x in first['recipes'] + second['recipes']]
+        if len(set(ids)) != len(ids) or ranks != sorted(ranks, reverse=True) or '35865' not in ids:
+            return False
+        # Throttled requests come back as 429 with the server's Retry-After
+        self._standin.faults.throttle_rate = 1.0
+        status, _ = self._client.api_get_recipe('35865')
+        if status != 429 or self._client.last_retry_after() != 3:
+            return False
+        # A request that fails without a response doesn't report the previous response's Retry-After
+        try:
+            self._client._do_url_encoded_post('127.0.0.1:1', '/api/get', {})
+            return False
+        except OSError:
+            pass
+        if self._client.last_retry_after() is not None:
+            return False
+        self._standin.faults.throttle_rate = 0.0
+        self._standin.faults.error_rate = 1.0
+        if self._client.api_get_recipe('35865')[0] not in (500, 502, 503):
+            return False
+        # Slowly dripped bodies are still decoded, partially when only a few recipes are wanted
+        self._standin.faults.error_rate = 0.0
+        self._standin.faults.drip_rate = 1.0
+        status, obj_data = self._client.api_search(q='sugar', max_recipes=2)
+        if status != 200 or [x['recipe_id'] for x in obj_data['recipes']] != ids[:2]:
+            return False
+        # Connections dropped after a keep-alive response are replaced transparently
+        self._standin.faults.drip_rate = 0.0
+        self._standin.faults.drop_rate = 1.0
+        for _ in range(3):
+            if self._client.api_get_recipe('35865')[0] != 200:
+                return False
+        stats = self._standin.stats()
+        if stats['throttled'] != 1 or stats['errors'] != 1 or stats['dripped'] != 1 or stats['dropped'] != 3:
+            print("FAILED: stats %s" % (stats,))
+            return False
+        return True
+
+    def _tear_down(self):
+        self._client.close()
+        self._standin.stop()
+
 class APITestSuite(TestSuite):
     TITLE = 'API Tests'
     TESTS = [
         BasicRestClientJSONDecodeTest,
         BasicRestClientDoURLEncodedPostTest,
         Food2ForkClientAPIGetRecipeTest,
-        Food2ForkClientAPISearchTest
+        Food2ForkClientAPISearchTest,
+        ConnectionPoolTest,
+        BasicRestClientKeepAliveTest,
+        AsyncRESTClientTest,
+        ResponseCacheTest,
+        CachingFood2ForkClientTest,
+        PartialArrayDecoderTest,
+        BasicRestClientCompressedStreamingTest,
+        RetryPolicyTest,
+        CircuitBreakerTest,
+        SearchIteratorTest,
+        RecipeMirrorTest,
+        Food2ForkStandInTest
     ]
\ No newline at end of file
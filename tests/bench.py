@@ -0,0 +1,144 @@
+"""@package bench
+This package includes the microbenchmarks, run with 'python3 run_tests.py bench'
+"""
+from tests.bench_base import Benchmark, BenchmarkSuite
+from api.rest_client import BasicRESTClient
+from spellcheck.english_dict import EnglishDictionary
+from takehome import TakeHomeApplication
+import json
+import random
+import tracemalloc
+
+class EnglishDictionaryLoadBenchmark(Benchmark):
+    TITLE = 'EnglishDictionary load'
+    WARMUP = 1
+    REPEAT = 5
+
+    def _run_once(self, case):
+        EnglishDictionary(persistent_cache=False).close()
+
+    def _extra_metrics(self, case):
+        tracemalloc.start()
+        try:
+            eng_dict = EnglishDictionary(persistent_cache=False)
+            peak = tracemalloc.get_traced_memory()[1]
+            eng_dict.close()
+        finally:
+            tracemalloc.stop()
+        return {'peak_memory_mb': peak / (1024 * 1024)}
+
+class EnglishDictionarySpellCheckBenchmark(Benchmark):
+    TITLE = 'EnglishDictionary.spell_check'
+    REPEAT = 50
+
+    def _setup(self):
+        self._eng_dict = EnglishDictionary(persistent_cache=False)
+        rand = random.Random(0)
+        words = [x for x in self._eng_dict._eng_dict if 5 <= len(x) <= 9 and x.isalpha()]
+        self._misspellings = []
+        for word in rand.sample(words, min(len(words), 4 * (self.WARMUP + self.REPEAT))):
+            position = rand.randrange(len(word))
+            misspelling = (word[:position] + word[position + 1:]).lower()
+            if not self._eng_dict._is_word(misspelling.upper()):
+                self._misspellings.append(misspelling)
+
+    def _cases(self):
+        return [('hit', 'hit'), ('miss, uncached', 'miss'), ('miss, cached', 'cached')]
+
+    def _run_once(self, case):
+        if case == 'hit':
+            self._eng_dict.spell_check('cream')
+        elif case == 'miss':
+            # A new word every time, so the suggestions are always computed
+            self._eng_dict.spell_check(self._misspellings.pop())
+        else:
+            self._eng_dict.spell_check('suga')
+
+    def _tear_down(self):
+        self._eng_dict.close()
+
+class ElaboratePossibilitiesBenchmark(Benchmark):
+    TITLE = 'TakeHomeApplication._elaborate_possibilities'
+    REPEAT = 500
+    ## (words in the ingredient, misspelled words), each misspelled word has SUGGESTIONS suggestions
+    SIZES = [(1, 1), (2, 1), (3, 2), (4, 4), (6, 6), (8, 8)]
+    SUGGESTIONS = 5
+
+    def _setup(self):
+        self._app = TakeHomeApplication()
+
+    def _cases(self):
+        cases = []
+        for num_words, num_typos in ElaboratePossibilitiesBenchmark.SIZES:
+            packed = [['word%s' % (i,)] + (['suggestion%s_%s' % (i, j) for j in range(self.SUGGESTIONS)] if i < num_typos else [])
+                      for i in range(num_words)]
+            cases.append(('%s words, %s typos' % (num_words, num_typos,), packed))
+        return cases
+
+    def _run_once(self, case):
+        list(self._app._elaborate_possibilities(case, TakeHomeApplication.MAX_SPELLING_SUGGESTIONS))
+
+    def _tear_down(self):
+        self._app = None
+
+class IngredientDiffBenchmark(Benchmark):
+    TITLE = 'TakeHomeApplication._is_ingredient_in_curr'
+    REPEAT = 2000
+    RECIPE = ['2 cups chicken broth', '1 large onion, diced', '3 cloves garlic, minced', '1 tsp salt', '1/2 tsp black pepper',
+              '2 tbsp olive oil', '1 lb boneless chicken thighs', '1 cup long grain rice', '1 can diced tomatoes',
+              '1 tsp ground cumin', '1/4 cup fresh cilantro, chopped', '1 lime, juiced']
+
+    def _setup(self):
+        self._app = TakeHomeApplication()
+
+    def _cases(self):
+        return [('%s supplied, %s lines' % (len(supplied), len(IngredientDiffBenchmark.RECIPE),), supplied)
+                for supplied in [['chicken'], ['chicken', 'onion', 'garlic', 'rice', 'lime'],
+                                 ['chicken', 'onion', 'garlic', 'rice', 'lime', 'tomatoes', 'cumin', 'salt', 'pepper', 'butter']]]
+
+    def _run_once(self, case):
+        self._app._curr_ingredients = case
+        for ingredient in IngredientDiffBenchmark.RECIPE:
+            self._app._is_ingredient_in_curr(ingredient)
+
+    def _tear_down(self):
+        self._app = None
+
+class SafeJSONDecodeBenchmark(Benchmark):
+    TITLE = 'BasicRESTClient._safe_json_decode'
+    REPEAT = 1000
+
+    def _setup(self):
+        self._client = BasicRESTClient()
+        recipe = {'publisher': 'Closet Cooking', 'f2f_url': 'http://food2fork.com/view/35382',
+                  'title': 'Jalapeno Popper Grilled Cheese Sandwich', 'source_url': 'http://www.closetcooking.com/2011/04/jalapeno-popper-grilled-cheese-sandwich.html',
+                  'recipe_id': '35382', 'image_url': 'http://static.food2fork.com/Jalapeno2BPopper2BGrilled2BCheese2BSandwich2B12B500fd186186.jpg',
+                  'social_rank': 100.0, 'publisher_url': 'http://closetcooking.com'}
+        search = {'count': 30, 'recipes': [dict(recipe, recipe_id=str(35382 + i)) for i in range(30)]}
+        full_recipe = {'recipe': dict(recipe, ingredients=['2 jalapeno peppers, cut in half lengthwise and seeded',
+                                                           '2 slices sour dough bread', '1 tablespoon butter, room temperature',
+                                                           '2 tablespoons cream cheese, room temperature',
+                                                           '1/2 cup jack and cheddar cheese, shredded',
+                                                           '1 tablespoon tortilla chips, crumbled'] * 2)}
+        self._payloads = {'search': json.dumps(search), 'recipe': json.dumps(full_recipe), 'invalid': json.dumps(search)[:-10]}
+
+    def _cases(self):
+        return [('search page, %s bytes' % (len(self._payloads['search']),), 'search'),
+                ('recipe, %s bytes' % (len(self._payloads['recipe']),), 'recipe'),
+                ('truncated search page', 'invalid')]
+
+    def _run_once(self, case):
+        self._client._safe_json_decode(self._payloads[case])
+
+    def _tear_down(self):
+        self._client.close()
+
+class BenchmarkTestSuite(BenchmarkSuite):
+    TITLE = 'Microbenchmarks'
+    BENCHMARKS = [
+        EnglishDictionaryLoadBenchmark,
+        EnglishDictionarySpellCheckBenchmark,
+        ElaboratePossibilitiesBenchmark,
+        IngredientDiffBenchmark,
+        SafeJSONDecodeBenchmark
+    ]
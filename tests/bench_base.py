@@ -0,0 +1,146 @@
+"""@package bench_base
+This package includes the base functionally for the microbenchmarks
+"""
+import gc
+import time
+
+class Benchmark:
+    """
+    The base benchmark class used for each microbenchmark
+
+    A benchmark has one or more cases (e.g. increasing input sizes). Each case is run WARMUP times untimed, then REPEAT
+    times timed one by one, so the latency percentiles are of single operations.
+    """
+    TITLE = 'Untitled Benchmark'
+    WARMUP = 3
+    REPEAT = 200
+
+    def _setup(self):
+        """
+        The purpose of this is to setup the environment for the benchmark. It will be invoked prior to running any case
+        """
+        pass
+
+    def _cases(self):
+        """
+        :return:
+            list of (case label, case argument), a single unlabelled case by default
+        """
+        return [('', None)]
+
+    def _run_once(self, case):
+        """
+        Performs the operation being measured once
+
+        :param case:
+            The case argument
+        """
+        pass
+
+    def _extra_metrics(self, case):
+        """
+        :return:
+            dict of additional (untimed) measurements of the case, e.g. memory use
+        """
+        return {}
+
+    def _tear_down(self):
+        """
+        Cleanup from the benchmark. It will be invoked after all cases have run.
+        """
+        pass
+
+    def _percentile(self, sorted_samples, percent):
+        """
+        :return:
+            the nearest-rank percentile of the sorted samples
+        """
+        rank = max(int(-(-percent * len(sorted_samples) // 100)), 1)
+        return sorted_samples[rank - 1]
+
+    def _measure(self, case):
+        """
+        Runs one case
+
+        :return:
+            dict with the latency percentiles (ms) and throughput of the case
+        """
+        for _ in range(self.WARMUP):
+            self._run_once(case)
+        samples = []
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            for _ in range(self.REPEAT):
+                start = time.perf_counter()
+                self._run_once(case)
+                samples.append(time.perf_counter() - start)
+        finally:
+            if gc_enabled:
+                gc.enable()
+        samples.sort()
+        total = sum(samples)
+        return {'runs': len(samples),
+                'p50_ms': self._percentile(samples, 50) * 1000,
+                'p95_ms': self._percentile(samples, 95) * 1000,
+                'p99_ms': self._percentile(samples, 99) * 1000,
+                'mean_ms': total / len(samples) * 1000,
+                'ops_per_sec': len(samples) / total if total > 0 else float('inf')}
+
+    def run_benchmark(self):
+        """
+        Run every case of the benchmark
+
+        :return:
+            list of result dicts, one per case
+        """
+        print("Running '%s' benchmark" % (self.TITLE,))
+        self._setup()
+        results = []
+        try:
+            for label, case in self._cases():
+                result = {'name': self.TITLE + (' [%s]' % (label,) if label else '')}
+                result.update(self._measure(case))
+                result.update(self._extra_metrics(case))
+                results.append(result)
+        finally:
+            self._tear_down()
+        return results
+
+class BenchmarkSuite:
+    """
+    The benchmark suite class encapsulates a collection of related microbenchmarks
+    """
+    TITLE = 'Untitled Suite'
+    BENCHMARKS = []
+
+    @classmethod
+    def run_suite(cls):
+        """
+        Runs all benchmarks in the suite
+
+        :return:
+            Title of the suite, list of result dicts
+        """
+        results = []
+        for benchmark in cls.BENCHMARKS:
+            results.extend(benchmark().run_benchmark())
+        return cls.TITLE, results
+
+    @staticmethod
+    def format_table(results):
+        """
+        :param results:
+            list of result dicts, see run_suite
+        :return:
+            list of report lines
+        """
+        name_width = max([len(result['name']) for result in results] + [9])
+        lines = ['%-*s %8s %10s %10s %10s %12s' % (name_width, 'Benchmark', 'Runs', 'p50 ms', 'p95 ms', 'p99 ms', 'ops/sec')]
+        for result in results:
+            line = '%-*s %8s %10.4f %10.4f %10.4f %12.1f' % (name_width, result['name'], result['runs'], result['p50_ms'],
+                                                             result['p95_ms'], result['p99_ms'], result['ops_per_sec'])
+            if 'peak_memory_mb' in result:
+                line += '   peak %.1f MB' % (result['peak_memory_mb'],)
+            lines.append(line)
+        return lines
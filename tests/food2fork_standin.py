@@ -0,0 +1,353 @@
+"""@package food2fork_standin
+This package includes a local stand-in for the Food2Fork API with latency and fault injection, for offline and load tests
+
+Usage:
+    python3 -m tests.food2fork_standin --port 8000 --latency exp:20 --error-rate 0.01 --throttle-rate 0.05
+    python3 takehome.py --api-domain 127.0.0.1:8000 --plain-http
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import gzip
+import json
+import random
+import ssl
+import threading
+import time
+import urllib.parse
+
+## A recipe the API tests look for, the rest of the default corpus is generated
+CHOCOLATE_CAKE = {
+    'publisher': 'All Recipes', 'f2f_url': 'http://food2fork.com/view/35865', 'title': 'The Best Chocolate Cake',
+    'source_url': 'http://allrecipes.com/Recipe/The-Best-Chocolate-Cake/Detail.aspx', 'recipe_id': '35865',
+    'image_url': 'http://static.food2fork.com/1020317e24.jpg', 'social_rank': 99.99, 'publisher_url': 'http://allrecipes.com',
+    'ingredients': ['2 cups white sugar', '1 3/4 cups all-purpose flour', '3/4 cup unsweetened cocoa powder',
+                    '1 1/2 teaspoons baking powder', '1 1/2 teaspoons baking soda', '1 teaspoon salt', '2 eggs', '1 cup milk',
+                    '1/2 cup vegetable oil', '2 teaspoons vanilla extract', '1 cup boiling water', '2 cups sugar']
+}
+
+FIXTURE_INGREDIENTS = ['chicken breast', 'chicken broth', 'onion', 'garlic', 'tomatoes', 'sugar', 'butter', 'flour', 'eggs',
+                       'milk', 'salt', 'black pepper', 'rice', 'black beans', 'cheddar cheese', 'basil', 'lemon juice',
+                       'olive oil', 'soy sauce', 'ginger', 'carrots', 'celery', 'potatoes', 'bacon', 'spinach', 'mushrooms',
+                       'cream', 'honey', 'cinnamon', 'vanilla extract', 'parmesan', 'pasta', 'ground beef', 'cumin', 'lime']
+
+def generate_corpus(size=300, seed=0):
+    """
+    This function generates a deterministic fixture corpus of full recipes
+
+    :param size: (Optional)
+        The number of recipes
+    :param seed: (Optional)
+        The random seed
+    :return:
+        list of recipe dicts, in the shape of Food2ForkClient.api_get_recipe's obj_data['recipe']
+    """
+    rand = random.Random(seed)
+    corpus = [dict(CHOCOLATE_CAKE)]
+    for i in range(1, size):
+        ingredients = rand.sample(FIXTURE_INGREDIENTS, rand.randint(3, 10))
+        corpus.append({'publisher': 'Stand-in Kitchen', 'f2f_url': 'http://food2fork.com/view/%s' % (i,),
+                       'title': ' '.join(x.title() for x in ingredients[:2]) + ' Recipe %s' % (i,),
+                       'source_url': 'http://example.com/recipes/%s' % (i,), 'recipe_id': str(i),
+                       'image_url': 'http://example.com/recipes/%s.jpg' % (i,),
+                       'social_rank': round(rand.uniform(30, 99.9), 2), 'publisher_url': 'http://example.com',
+                       'ingredients': ['%s %s' % (rand.choice(['1 cup', '2 tbsp', '1 tsp', '3', '1/2 lb']), x) for x in ingredients]})
+    return corpus
+
+def parse_latency(spec):
+    """
+    This function parses a latency distribution, in milliseconds
+
+    :param spec:
+        const:MS, uniform:MIN,MAX, exp:MEAN or lognormal:MU,SIGMA (of the log of the milliseconds); None for no latency
+    :return:
+        callable taking a random.Random and returning seconds
+
+    Exceptions:
+        raises ValueError if the spec is invalid
+    """
+    if spec is None:
+        return lambda rand: 0.0
+    kind, _, params = spec.partition(':')
+    values = [float(x) for x in params.split(',') if x != '']
+    if kind == 'const' and len(values) == 1:
+        return lambda rand: values[0] / 1000
+    if kind == 'uniform' and len(values) == 2:
+        return lambda rand: rand.uniform(values[0], values[1]) / 1000
+    if kind == 'exp' and len(values) == 1 and values[0] > 0:
+        return lambda rand: rand.expovariate(1 / values[0]) / 1000
+    if kind == 'lognormal' and len(values) == 2:
+        return lambda rand: rand.lognormvariate(values[0], values[1]) / 1000
+    raise ValueError("Invalid latency distribution: %s" % (spec,))
+
+class FaultProfile:
+    """
+    This class describes the faults the stand-in injects. Rates are the fraction of requests (0 to 1) affected.
+
+    latency - distribution of the delay before each response (see parse_latency)
+    error_rate - answered with a random 500, 502 or 503
+    throttle_rate - answered with 429 and a Retry-After of retry_after seconds
+    drip_rate - body sent in drip_chunk byte pieces, drip_delay seconds apart
+    drop_rate - the connection is closed after the response although it was advertised as kept alive,
+                so the client's next request on it finds it dropped
+    """
+
+    def __init__(self, latency=None, error_rate=0.0, throttle_rate=0.0, retry_after=1, drip_rate=0.0, drip_chunk=64,
+                 drip_delay=0.01, drop_rate=0.0):
+        self.latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.drip_rate = drip_rate
+        self.drip_chunk = drip_chunk
+        self.drip_delay = drip_delay
+        self.drop_rate = drop_rate
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves /api/search and /api/get like Food2Fork, from the server's Food2ForkStandIn
+    """
+    protocol_version = 'HTTP/1.1'
+    ## Idle keep-alive connections are closed after this many seconds
+    timeout = 5
+
+    def _params(self):
+        length = int(self.headers.get('Content-Length', 0))
+        body = self.rfile.read(length).decode('utf-8') if length > 0 else ''
+        params = dict(urllib.parse.parse_qsl(urllib.parse.urlsplit(self.path).query))
+        params.update(urllib.parse.parse_qsl(body))
+        return params
+
+    def _send(self, status, payload, headers=None, drip=False, drop=False):
+        standin = self.server.standin
+        if 'gzip' in self.headers.get('Accept-Encoding', '') and status == 200:
+            payload = gzip.compress(payload)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if drip:
+            chunk = standin.faults.drip_chunk
+            for start in range(0, len(payload), chunk):
+                self.wfile.write(payload[start:start + chunk])
+                self.wfile.flush()
+                time.sleep(standin.faults.drip_delay)
+        else:
+            self.wfile.write(payload)
+        if drop:
+            self.close_connection = True
+
+    def _handle(self):
+        standin = self.server.standin
+        params = self._params()
+        faults = standin.faults
+        delay, fault, error_status, drip, drop = standin.draw()
+        if delay > 0:
+            time.sleep(delay)
+        path = urllib.parse.urlsplit(self.path).path
+        if fault == 'throttle':
+            standin.count('throttled')
+            return self._send(429, b'Too Many Requests', {'Retry-After': str(faults.retry_after)}, drop=drop)
+        if fault == 'error':
+            standin.count('errors')
+            return self._send(error_status, b'Server Error', drop=drop)
+        if standin.api_key is not None and params.get('key') != standin.api_key:
+            standin.count('errors')
+            return self._send(403, b'Forbidden', drop=drop)
+        if path == '/api/search':
+            obj = standin.search(params.get('q'), params.get('sort'), params.get('page'))
+        elif path == '/api/get':
+            obj = standin.get_recipe(params.get('rId'))
+        else:
+            standin.count('errors')
+            return self._send(404, b'Not Found', drop=drop)
+        standin.count('ok')
+        self._send(200, json.dumps(obj).encode('utf-8'), drip=drip, drop=drop)
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        self._handle()
+
+    def log_message(self, format, *args):
+        pass
+
+class Food2ForkStandIn:
+    """
+    This class runs a local HTTP(S) server answering the Food2Fork search and get endpoints from a fixture corpus,
+    with the faults of a FaultProfile injected, so the clients can be tested offline and under controlled load.
+
+    Usage:
+        standin = Food2ForkStandIn(faults=FaultProfile(latency='exp:20', throttle_rate=0.1))
+        standin.start()
+        client = Food2ForkClient(api_domain=standin.domain(), use_ssl=False)
+        ...
+        standin.stop()
+    """
+    PAGE_SIZE = 30
+
+    def __init__(self, corpus=None, faults=None, host='127.0.0.1', port=0, api_key=None, certfile=None, keyfile=None, seed=0):
+        """
+        Constructor function
+
+        :param corpus: (Optional)
+            list of full recipe dicts, generate_corpus() by default
+        :param faults: (Optional)
+            The FaultProfile, no faults by default
+        :param host: (Optional)
+            The address to listen on
+        :param port: (Optional)
+            The port to listen on, a free one by default
+        :param api_key: (Optional)
+            The api key requests must have, any by default
+        :param certfile, keyfile: (Optional)
+            Certificate and key to serve HTTPS instead of HTTP
+        :param seed: (Optional)
+            The random seed of the injected faults
+        """
+        self.faults = faults if faults is not None else FaultProfile()
+        self.api_key = api_key
+        self._corpus = corpus if corpus is not None else generate_corpus()
+        self._recipes = dict((str(recipe['recipe_id']), recipe) for recipe in self._corpus)
+        self._rand = random.Random(seed)
+        self._lock = threading.Lock()
+        self._counts = {'requests': 0, 'ok': 0, 'errors': 0, 'throttled': 0, 'dripped': 0, 'dropped': 0}
+        self._server = ThreadingHTTPServer((host, port), StandInHandler)
+        self._server.daemon_threads = True
+        self._server.standin = self
+        if certfile is not None:
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(certfile, keyfile)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+        self._thread = None
+
+    def domain(self):
+        """
+        :return:
+            'host:port' to point a client's api_domain at
+        """
+        host, port = self._server.server_address[:2]
+        return '%s:%s' % (host, port,)
+
+    def draw(self):
+        """
+        This function draws the faults of one request
+
+        :return:
+            delay in seconds, fault ('throttle', 'error' or None), error status (None unless fault is 'error'),
+            drip the body, drop the connection
+        """
+        faults = self.faults
+        with self._lock:
+            self._counts['requests'] += 1
+            delay = faults.latency(self._rand)
+            roll = self._rand.random()
+            fault = None
+            if roll < faults.throttle_rate:
+                fault = 'throttle'
+            elif roll < faults.throttle_rate + faults.error_rate:
+                fault = 'error'
+            error_status = self._rand.choice([500, 502, 503]) if fault == 'error' else None
+            drip = self._rand.random() < faults.drip_rate
+            drop = self._rand.random() < faults.drop_rate
+            self._counts['dripped'] += 1 if drip and fault is None else 0
+            self._counts['dropped'] += 1 if drop else 0
+        return max(delay, 0.0), fault, error_status, drip, drop
+
+    def count(self, outcome):
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def stats(self):
+        """
+        :return:
+            dict with the number of requests and of each outcome and fault
+        """
+        with self._lock:
+            return dict(self._counts)
+
+    def _summary(self, recipe):
+        return dict((key, value) for key, value in recipe.items() if key != 'ingredients')
+
+    def search(self, q=None, sort=None, page=None):
+        """
+        :return:
+            search response dict, the recipes having every comma separated ingredient of q (as a substring)
+        """
+        ingredients = [x.strip().lower() for x in (q or '').split(',') if x.strip() != '']
+        matches = [recipe for recipe in self._corpus
+                   if all(any(x in line.lower() for line in recipe['ingredients']) for x in ingredients)]
+        if sort != 't':
+            matches = sorted(matches, key=lambda recipe: -recipe.get('social_rank', 0))
+        try:
+            page = max(int(page or 1), 1)
+        except ValueError:
+            page = 1
+        start = (page - 1) * Food2ForkStandIn.PAGE_SIZE
+        recipes = [self._summary(recipe) for recipe in matches[start:start + Food2ForkStandIn.PAGE_SIZE]]
+        return {'count': len(recipes), 'recipes': recipes}
+
+    def get_recipe(self, rId):
+        """
+        :return:
+            get response dict, {'recipe': []} for an unknown recipe like Food2Fork
+        """
+        recipe = self._recipes.get(str(rId)) or self._recipes.get(str(rId).lstrip('0'))
+        return {'recipe': recipe if recipe is not None else []}
+
+    def start(self):
+        """
+        Starts serving on a background thread
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='food2fork-standin', daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stops serving and closes the listening socket
+        """
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve a local stand-in for the Food2Fork API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--corpus', help='JSON file with a list of full recipes, a generated corpus by default')
+    parser.add_argument('--corpus-size', type=int, default=300, help='size of the generated corpus')
+    parser.add_argument('--latency', help='const:MS, uniform:MIN,MAX, exp:MEAN or lognormal:MU,SIGMA')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--throttle-rate', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=int, default=1)
+    parser.add_argument('--drip-rate', type=float, default=0.0)
+    parser.add_argument('--drip-chunk', type=int, default=64)
+    parser.add_argument('--drip-delay', type=float, default=0.01)
+    parser.add_argument('--drop-rate', type=float, default=0.0)
+    parser.add_argument('--api-key', help='require this api key')
+    parser.add_argument('--certfile', help='serve HTTPS with this certificate')
+    parser.add_argument('--keyfile', help='the key of --certfile')
+    args = parser.parse_args()
+    corpus = None
+    if args.corpus is not None:
+        with open(args.corpus) as f:
+            corpus = json.load(f)
+    standin = Food2ForkStandIn(corpus or generate_corpus(args.corpus_size),
+                               FaultProfile(args.latency, args.error_rate, args.throttle_rate, args.retry_after,
+                                            args.drip_rate, args.drip_chunk, args.drip_delay, args.drop_rate),
+                               args.host, args.port, args.api_key, args.certfile, args.keyfile)
+    print("Serving the Food2Fork stand-in on %s://%s" % ('https' if args.certfile else 'http', standin.domain(),))
+    try:
+        standin.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        standin.stop()
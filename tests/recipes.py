@@ -0,0 +1,74 @@
+"""@package recipes_tests
+This package includes the recipes module tests
+"""
+from tests.test_base import Test, TestSuite
+from recipes.ingredient_matcher import IngredientMatcher
+from recipes.bitmap_index import IngredientBitmapIndex, CoverageRecipeSource, normalize_terms
+
+class IngredientMatcherTest(Test):
+    TITLE = 'IngredientMatcher'
+
+    def _setup(self):
+        self._matcher = IngredientMatcher(['Butter', 'peanut butter', 'nut', 'he', 'she', 'his', 'hers'])
+
+    def _run_test(self):
+        if self._matcher.matches('2 tbsp Peanut Butter') != ['Butter', 'peanut butter', 'nut']:
+            return False
+        # Overlapping patterns found through failure links
+        if self._matcher.matches('ushers') != ['he', 'she', 'hers']:
+            return False
+        if self._matcher.matches('1 cup flour') != [] or self._matcher.contains_any('1 cup flour'):
+            return False
+        if not self._matcher.contains_any('a pinch of nutmeg'):
+            return False
+        # Same answers as a case insensitive substring search of every pair
+        lines = ['1 cup BUTTERMILK', 'shish kebab', 'walnuts, chopped', '', 'h', 'pea']
+        for line in lines:
+            expected = [x for x in self._matcher.ingredients() if line.lower().find(x.lower()) != -1]
+            if self._matcher.matches(line) != expected:
+                return False
+        if IngredientMatcher([]).contains_any('anything') or not IngredientMatcher(['']).contains_any('anything'):
+            return False
+        return True
+
+class IngredientBitmapIndexTest(Test):
+    TITLE = 'IngredientBitmapIndex'
+
+    RECIPES = [
+        ['2 cups chicken broth', '1 onion', '3 cloves garlic', '1 tsp salt'],
+        ['1 whole chicken', '2 onions, sliced'],
+        ['1 cup sugar', '2 eggs', '1 cup flour'],
+        ['4 ripe tomatoes', '1 onion', '2 tbsp olive oil'],
+        ['1 lb chicken breasts', '1 onion']
+    ]
+
+    def _setup(self):
+        self._index = IngredientBitmapIndex.build(({'recipe_id': str(i)}, {'recipe_id': str(i), 'ingredients': ingredients})
+                                                  for i, ingredients in enumerate(IngredientBitmapIndexTest.RECIPES))
+
+    def _run_test(self):
+        if normalize_terms('3 Cloves of Garlic, minced') != ['garlic'] or normalize_terms('2 ripe tomatoes') != ['ripe', 'tomato']:
+            return False
+        ranked = [(summary['recipe_id'], missing, matched) for summary, _, missing, matched in
+                  self._index.top_recipes(['chicken', 'onion', 'chicken broth'])]
+        # 'chicken' and 'chicken broth' share a line of recipe 0, which is only counted once, so it lacks garlic and salt
+        if ranked != [('1', 0, 2), ('4', 0, 2), ('0', 2, 3), ('3', 2, 1)]:
+            return False
+        if [x[0]['recipe_id'] for x in self._index.top_recipes(['chicken', 'onion'], n=2, offset=1)] != ['4', '0']:
+            return False
+        if self._index.top_recipes(['caviar']) != [] or self._index.top_recipes(['of']) != []:
+            return False
+        source = CoverageRecipeSource(self._index)
+        resp_status, obj_data = source.api_search(q='tomato,olive oil,onion', max_recipes=1)
+        if resp_status != 200 or obj_data['recipes'] != [{'recipe_id': '3', 'missing_ingredients': 0}]:
+            return False
+        if source.api_get_recipe('2')[1]['recipe']['ingredients'][0] != '1 cup sugar' or source.api_get_recipe('9')[0] != 404:
+            return False
+        return True
+
+class RecipesTestSuite(TestSuite):
+    TITLE = 'Recipes Tests'
+    TESTS = [
+        IngredientMatcherTest,
+        IngredientBitmapIndexTest
+    ]
@@ -3,12 +3,29 @@ This package includes the spellcheck module tests
 """
 from tests.test_base import Test, TestSuite
 from spellcheck.english_dict import EnglishDictionary
+from spellcheck.suggestion_index import NGramIndex
+from spellcheck.compiled_words import CompiledWordList, StaleCompiledWordsException
+from spellcheck.background_loader import BackgroundDictionaryLoader
+from spellcheck.suggestion_cache import SuggestionCache
+from spellcheck.culinary_lexicon import CulinaryLexicon
+from spellcheck.daemon import SpellCheckDaemon, DaemonSpellChecker, is_daemon_running, load_spell_checker
+from telemetry.metrics import METRICS
+from concurrent.futures import ThreadPoolExecutor
+import difflib
+import functools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
 
 class EnglishDictionarySpellCheckTest(Test):
     TITLE = 'EnglishDictionary.spell_check'
+    SHARED_FIXTURES = {'english_dictionary': functools.partial(EnglishDictionary, persistent_cache=False)}
 
     def _setup(self):
-        self._eng_dict = EnglishDictionary()
+        self._eng_dict = self._fixture('english_dictionary')
 
     def _run_test(self):
         if self._eng_dict.spell_check('home') != (True, 'home', []):
@@ -17,9 +34,9 @@ class EnglishDictionarySpellCheckTest(Test):
             return False
         if self._eng_dict.spell_check('cream') != (True, 'cream', []):
             return False
-        if self._eng_dict.spell_check('suga') != (False, 'suga', ['sugar', 'sug', 'sura']):
+        if self._eng_dict.spell_check('suga') != (False, 'suga', ['sugar']):
             return False
-        if self._eng_dict.spell_check('flor') != (False, 'flor', ['fluor', 'flour', 'flora']):
+        if self._eng_dict.spell_check('flor') != (False, 'flor', ['flour']):
             return False
         if self._eng_dict.spell_check('wonderfull') != (False, 'wonderfull', ['wonderful', 'wonderly', 'overfull']):
             return False
@@ -28,8 +45,313 @@ class EnglishDictionarySpellCheckTest(Test):
     def _tear_down(self):
         self._eng_dict = None
 
+class EnglishDictionarySpellCheckManyTest(Test):
+    TITLE = 'EnglishDictionary.spell_check_many'
+
+    WORDS = ['home', 'suga', 'Suga', 'flor', 'cream', 'wonderfull', 'suga', 'oange', 'HOME', 'flur']
+
+    def _setup(self):
+        # Its own dictionary, since the test changes and closes it, without the persistent cache shared by processes
+        self._eng_dict = EnglishDictionary(persistent_cache=False)
+        self._saved_min_misses = EnglishDictionary.PARALLEL_MIN_MISSES
+
+    def _run_test(self):
+        expected = [self._eng_dict.spell_check(word) for word in EnglishDictionarySpellCheckManyTest.WORDS]
+        # In-process
+        EnglishDictionary.PARALLEL_MIN_MISSES = len(EnglishDictionarySpellCheckManyTest.WORDS) + 1
+        if self._eng_dict.spell_check_many(EnglishDictionarySpellCheckManyTest.WORDS) != expected:
+            return False
+        # Process pool
+        EnglishDictionary.PARALLEL_MIN_MISSES = 1
+        if self._eng_dict.spell_check_many(EnglishDictionarySpellCheckManyTest.WORDS) != expected:
+            return False
+        if self._eng_dict.spell_check_many([]) != []:
+            return False
+        return True
+
+    def _tear_down(self):
+        EnglishDictionary.PARALLEL_MIN_MISSES = self._saved_min_misses
+        self._eng_dict.close()
+        self._eng_dict = None
+
+class NGramIndexGetCloseMatchesTest(Test):
+    TITLE = 'NGramIndex.get_close_matches'
+
+    WORDS = ['SUGAR', 'SUG', 'SURA', 'FLUOR', 'FLOUR', 'FLORA', 'FLOOR', 'WONDERFUL', 'WONDERLY', 'OVERFULL',
+             'BUTTER', 'BATTER', 'BITTER', 'CREAM', 'SCREAM', 'TARTAR', 'ORANGE', 'RANGE', 'A', 'I']
+
+    def _setup(self):
+        self._index = NGramIndex(NGramIndexGetCloseMatchesTest.WORDS)
+
+    def _run_test(self):
+        if len(self._index) != len(NGramIndexGetCloseMatchesTest.WORDS):
+            return False
+        for word in ['SUGA', 'FLOR', 'WONDERFULL', 'BUTER', 'CRAEM', 'OANGE', 'XYZ', 'A', '']:
+            expected = difflib.get_close_matches(word, NGramIndexGetCloseMatchesTest.WORDS)
+            result = self._index.get_close_matches(word)
+            if result != expected:
+                print("FAILED: word: %s - expected: %s - result: %s" % (word, expected, result,))
+                return False
+        return True
+
+    def _tear_down(self):
+        self._index = None
+
+class NGramIndexRandomTyposTest(Test):
+    TITLE = 'NGramIndex.get_close_matches (random typos)'
+
+    ## Few letters, so that many words are close to each other and the best matches tie
+    LETTERS = 'ABCDEOPT'
+
+    def _setup(self):
+        self._random = random.Random(1)
+        self._words = sorted({self._random_word(self._random.randint(1, 12)) for _ in range(3000)})
+        self._index = NGramIndex(self._words)
+
+    def _random_word(self, length):
+        return ''.join(self._random.choice(NGramIndexRandomTyposTest.LETTERS) for _ in range(length))
+
+    def _typo(self, word):
+        chars = list(word)
+        for _ in range(self._random.randint(1, 2)):
+            pos = self._random.randrange(len(chars) + 1)
+            edit = self._random.randrange(3)
+            if edit == 0 and pos < len(chars):
+                del chars[pos]
+            elif edit == 1:
+                chars.insert(pos, self._random.choice(NGramIndexRandomTyposTest.LETTERS))
+            elif pos < len(chars):
+                chars[pos] = self._random.choice(NGramIndexRandomTyposTest.LETTERS)
+        return ''.join(chars)
+
+    def _run_test(self):
+        for _ in range(50):
+            word = self._typo(self._random.choice(self._words))
+            for n, cutoff in [(3, 0.6), (5, 0.8), (1, 0.3)]:
+                expected = difflib.get_close_matches(word, self._words, n, cutoff)
+                result = self._index.get_close_matches(word, n, cutoff)
+                if result != expected:
+                    print("FAILED: word: %s, n: %s, cutoff: %s - expected: %s - result: %s" %
+                          (word, n, cutoff, expected, result,))
+                    return False
+        return True
+
+    def _tear_down(self):
+        self._index = None
+
+class CompiledWordListTest(Test):
+    TITLE = 'CompiledWordList'
+
+    WORDS = {'SUGAR': 'Def', 'FLOUR': 'Def', 'CR\u00c8ME': 'Def', 'A': 'Def', 'BUTTER': 'Def'}
+
+    def _setup(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._json_path = os.path.join(self._tmp_dir.name, 'dictionary.json')
+        self._words_path = os.path.join(self._tmp_dir.name, 'dictionary.words')
+        with open(self._json_path, 'w') as f:
+            json.dump(CompiledWordListTest.WORDS, f)
+
+    def _run_test(self):
+        if CompiledWordList.build(self._json_path, self._words_path) != len(CompiledWordListTest.WORDS):
+            return False
+        word_list = CompiledWordList(self._words_path, self._json_path)
+        if len(word_list) != len(CompiledWordListTest.WORDS):
+            return False
+        for word in CompiledWordListTest.WORDS:
+            if word not in word_list:
+                print("FAILED: %s not in word list" % (word,))
+                return False
+        for word in ['', 'SUGA', 'SUGARS', 'AA', 'ZZZ', 'sugar']:
+            if word in word_list:
+                print("FAILED: %s in word list" % (word,))
+                return False
+        if sorted(word_list) != sorted(CompiledWordListTest.WORDS):
+            return False
+        word_list.close()
+        with open(self._json_path, 'w') as f:
+            json.dump({'CHANGED': 'Def'}, f)
+        try:
+            CompiledWordList(self._words_path, self._json_path).close()
+            return False
+        except StaleCompiledWordsException:
+            pass
+        return True
+
+    def _tear_down(self):
+        self._tmp_dir.cleanup()
+
+class BackgroundDictionaryLoaderTest(Test):
+    TITLE = 'BackgroundDictionaryLoader'
+
+    @staticmethod
+    def _slow_factory():
+        time.sleep(0.2)
+        return 'dictionary'
+
+    @staticmethod
+    def _failing_factory():
+        raise FileNotFoundError('dictionary.json')
+
+    def _run_test(self):
+        loader = BackgroundDictionaryLoader(BackgroundDictionaryLoaderTest._slow_factory)
+        if loader.is_loaded() or loader.load_time() is not None:
+            return False
+        if loader.get() != 'dictionary':
+            return False
+        if not loader.is_loaded() or loader.wait_time() <= 0 or loader.load_time() < loader.wait_time():
+            return False
+        loader = BackgroundDictionaryLoader(BackgroundDictionaryLoaderTest._failing_factory)
+        try:
+            loader.get()
+            return False
+        except FileNotFoundError:
+            pass
+        return True
+
+class SuggestionCacheTest(Test):
+    TITLE = 'SuggestionCache'
+
+    def _setup(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._tmp_dir.name, 'suggestions.sqlite')
+
+    def _run_test(self):
+        # In-memory LRU eviction
+        cache = SuggestionCache('v1', max_entries=2)
+        cache.put('SUGA', ['sugar'])
+        cache.put('FLOR', ['flour'])
+        if cache.get('SUGA') != ['sugar']:
+            return False
+        cache.put('OANGE', ['orange'])
+        if cache.get('FLOR') is not None or cache.get('SUGA') != ['sugar'] or cache.get('OANGE') != ['orange']:
+            return False
+        if cache.stats() != {'hits': 3, 'disk_hits': 0, 'misses': 1, 'size': 2}:
+            print("FAILED: stats: %s" % (cache.stats(),))
+            return False
+        # Persisted across instances
+        cache = SuggestionCache('v1', self._path)
+        cache.put('SUGA', ['sugar', 'sug'])
+        cache.close()
+        cache = SuggestionCache('v1', self._path)
+        if cache.get('SUGA') != ['sugar', 'sug'] or cache.stats()['disk_hits'] != 1:
+            return False
+        cache.close()
+        # Invalidated when the fingerprint changes
+        cache = SuggestionCache('v2', self._path)
+        if cache.get('SUGA') is not None:
+            return False
+        cache.close()
+        return True
+
+    def _tear_down(self):
+        self._tmp_dir.cleanup()
+
+class CulinaryLexiconTest(Test):
+    TITLE = 'CulinaryLexicon'
+
+    def _setup(self):
+        self._lexicon = CulinaryLexicon()
+
+    def _run_test(self):
+        for word in ['SUGAR', 'FLOUR', 'PARMESAN', 'ZUCCHINI']:
+            if word not in self._lexicon:
+                return False
+        if 'SURA' in self._lexicon or 'sugar' in self._lexicon:
+            return False
+        if self._lexicon.get_close_matches('PARMESEAN', cutoff=0.75) != ['PARMESAN']:
+            return False
+        if self._lexicon.get_close_matches('BROCOLI', cutoff=0.75) != ['BROCCOLI']:
+            return False
+        if self._lexicon.get_close_matches('WONDERFULL', cutoff=0.75) != []:
+            return False
+        return True
+
+    def _tear_down(self):
+        self._lexicon = None
+
+class SpellCheckDaemonTest(Test):
+    TITLE = 'SpellCheckDaemon and DaemonSpellChecker'
+    SHARED_FIXTURES = EnglishDictionarySpellCheckTest.SHARED_FIXTURES
+
+    WORDS = ['home', 'suga', 'Suga', 'flor', 'cream', 'cr\u00e8me', 'wonderfull', '', 'oange']
+
+    def _setup(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._path = os.path.join(self._dir.name, 'spellcheck.sock')
+        self._eng_dict = self._fixture('english_dictionary')
+        self._daemon = SpellCheckDaemon(self._path, EnglishDictionary(persistent_cache=False))
+        self._daemon.start()
+        self._client = None
+
+    def _run_test(self):
+        expected = [self._eng_dict.spell_check(word) for word in SpellCheckDaemonTest.WORDS]
+        if not is_daemon_running(self._path) or is_daemon_running(os.path.join(self._dir.name, 'missing.sock')):
+            return False
+        self._client = load_spell_checker(self._path)
+        if not isinstance(self._client, DaemonSpellChecker):
+            return False
+        if [self._client.spell_check(word) for word in SpellCheckDaemonTest.WORDS] != expected:
+            return False
+        if self._client.spell_check_many(SpellCheckDaemonTest.WORDS) != expected or self._client.spell_check_many([]) != []:
+            return False
+        # Each thread gets its own connection, closed once the thread exits
+        barrier = threading.Barrier(3)
+
+        def check_together(words):
+            barrier.wait()
+            results = self._client.spell_check_many(words)
+            barrier.wait()
+            return results, len(self._client._connections)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            results = list(executor.map(check_together, [SpellCheckDaemonTest.WORDS] * 3))
+        if results != [(expected, 4)] * 3 or len(self._client._connections) != 1:
+            return False
+        # Both the client and the dictionary report spellcheck_many spans (the daemon's own are on its handler threads)
+        METRICS.enable()
+        self._client.spell_check_many(SpellCheckDaemonTest.WORDS)
+        self._eng_dict.spell_check_many(SpellCheckDaemonTest.WORDS)
+        spans = [(span['labels']['mode'], span['attributes']) for span in METRICS.spans()
+                 if span['name'] == 'spellcheck_many' and span['thread'] == threading.current_thread().name]
+        misses = sum(1 for correct, _, _ in expected if not correct)
+        if spans != [('daemon', {'words': 9, 'misses': misses}), ('in_process', {'words': 9, 'misses': misses})]:
+            print("FAILED: %s" % (spans,))
+            return False
+        METRICS.disable()
+        # A second daemon can't take over the socket
+        try:
+            SpellCheckDaemon(self._path, self._eng_dict)
+            return False
+        except OSError:
+            pass
+        # Once the daemon is gone, the client falls back to the dictionary and new clients load it themselves
+        self._daemon.stop()
+        self._daemon = None
+        if self._client.spell_check_many(SpellCheckDaemonTest.WORDS) != expected:
+            return False
+        fallback = load_spell_checker(self._path)
+        result = isinstance(fallback, EnglishDictionary)
+        fallback.close()
+        return result
+
+    def _tear_down(self):
+        METRICS.disable()
+        METRICS.reset()
+        if self._client is not None:
+            self._client.close()
+        if self._daemon is not None:
+            self._daemon.stop()
+        self._dir.cleanup()
+
 class SpellCheckTestSuite(TestSuite):
     TITLE = 'Spell Check/English Dictionary Tests'
     TESTS = [
-        EnglishDictionarySpellCheckTest
+        EnglishDictionarySpellCheckTest,
+        EnglishDictionarySpellCheckManyTest,
+        NGramIndexGetCloseMatchesTest,
+        NGramIndexRandomTyposTest,
+        CompiledWordListTest,
+        BackgroundDictionaryLoaderTest,
+        SuggestionCacheTest,
+        CulinaryLexiconTest,
+        SpellCheckDaemonTest
     ]
\ No newline at end of file
@@ -0,0 +1,145 @@
+"""@package telemetry_tests
+This package includes the telemetry module tests
+"""
+from tests.test_base import Test, TestSuite
+from tests.food2fork_standin import Food2ForkStandIn
+from api.food2fork_client import Food2ForkClient
+from telemetry.metrics import MetricsRegistry, METRICS
+from telemetry.profiling import Profiler
+from takehome import ProfiledTakeHomeApplication
+import json
+import os
+import pstats
+import tempfile
+
+class MetricsRegistryTest(Test):
+    TITLE = 'MetricsRegistry'
+
+    def _setup(self):
+        self._registry = MetricsRegistry()
+        self._standin = Food2ForkStandIn()
+        self._standin.start()
+        self._client = Food2ForkClient(api_domain=self._standin.domain(), use_ssl=False)
+
+    def _run_test(self):
+        registry = self._registry
+        # Nothing is recorded while disabled
+        registry.increment('hits_total')
+        with registry.span('work') as span:
+            span.set_label('status', 200)
+        if registry.counters() != [] or registry.histograms() != [] or registry.spans() != []:
+            return False
+        registry.enable()
+        registry.increment('hits_total', kind='a')
+        registry.increment('hits_total', 2, kind='a')
+        registry.observe('wait_seconds', 0.003)
+        registry.observe('wait_seconds', 20)
+        with registry.span('outer', step=1):
+            with registry.span('inner') as span:
+                span.set_label('status', 200)
+                span.set_attribute('bytes', 1234)
+        try:
+            with registry.span('failing'):
+                raise ValueError()
+        except ValueError:
+            pass
+        if registry.counters() != [('hits_total', {'kind': 'a'}, 3)]:
+            return False
+        spans = dict((span['name'], span) for span in registry.spans())
+        if [span['name'] for span in registry.spans()] != ['inner', 'outer', 'failing']:
+            return False
+        if spans['inner']['parent'] != spans['outer']['id'] or spans['outer']['parent'] is not None:
+            return False
+        if spans['inner']['labels'] != {'status': 200} or spans['failing']['labels'] != {'error': 'ValueError'}:
+            return False
+        # Attributes are only in the trace record
+        if spans['inner']['attributes'] != {'bytes': 1234} or 'bytes' in registry.to_prometheus():
+            return False
+        histograms = dict((name, histogram) for name, labels, histogram in registry.histograms())
+        if histograms['wait_seconds'].count != 2 or histograms['wait_seconds'].quantile(0.5) != 0.005:
+            return False
+        if histograms['wait_seconds'].quantile(1.0) != float('inf') or 'outer_seconds' not in histograms:
+            return False
+        text = registry.to_prometheus()
+        for line in ['# TYPE hits_total counter', 'hits_total{kind="a"} 3', '# TYPE wait_seconds histogram',
+                     'wait_seconds_bucket{le="0.005"} 1', 'wait_seconds_bucket{le="+Inf"} 2', 'wait_seconds_count 2',
+                     'inner_seconds_count{status="200"} 1']:
+            if line not in text.split('\n'):
+                print("FAILED: %s not in %s" % (line, text,))
+                return False
+        records = [json.loads(line) for line in registry.iter_jsonl()]
+        if [record['type'] for record in records].count('span') != 3 or records[0]['value'] != 3:
+            return False
+        # The REST client reports every round trip to the process-wide registry
+        METRICS.enable()
+        self._client.api_get_recipe('35865')
+        self._client.api_search(q='sugar', max_recipes=1)
+        requests = [span for span in METRICS.spans() if span['name'] == 'rest_request']
+        if [(span['labels']['url'], span['labels']['status']) for span in requests] != [('/api/get', 200), ('/api/search', 200)]:
+            return False
+        return True
+
+    def _tear_down(self):
+        METRICS.disable()
+        METRICS.reset()
+        self._client.close()
+        self._standin.stop()
+
+class ProfilerTest(Test):
+    TITLE = 'Profiler and ProfiledTakeHomeApplication'
+
+    class QuietProfiledTakeHomeApplication(ProfiledTakeHomeApplication):
+        def __init__(self, *args, **kwargs):
+            self.lines = []
+            super(ProfilerTest.QuietProfiledTakeHomeApplication, self).__init__(*args, **kwargs)
+
+        def _output(self, text):
+            self.lines.append(text)
+
+    def _setup(self):
+        self._dir = tempfile.TemporaryDirectory()
+        self._standin = Food2ForkStandIn()
+        self._standin.start()
+        self._client = Food2ForkClient(api_domain=self._standin.domain(), use_ssl=False)
+
+    def _run_test(self):
+        profiler = Profiler()
+        profiler.start()
+        app = ProfilerTest.QuietProfiledTakeHomeApplication(profiler, ['milk', ''], top_k=3, food2fork_client=self._client)
+        app.main()
+        profiler.stop()
+        if 'Enter single ingredient (leave blank if done): milk' not in app.lines:
+            return False
+        sections = dict(profiler.sections())
+        for name in ['DICTIONARY_LOAD', 'ENTER_INGREDIENT', 'SPELL_CHECK', 'API_SEARCH', 'API_GET_RECIPE', 'DISPLAY_RESULTS']:
+            if name not in sections:
+                print("FAILED: no %s section in %s" % (name, sorted(sections),))
+                return False
+        if sections['ENTER_INGREDIENT']['entries'] != 2 or profiler.top_allocations() == []:
+            return False
+        paths = profiler.write(self._dir.name)
+        if os.path.join(self._dir.name, 'API_SEARCH.pstats') not in paths:
+            return False
+        stats = pstats.Stats(os.path.join(self._dir.name, 'total.pstats'))
+        if not any(function == '_state_api_search' for _, _, function in stats.stats):
+            return False
+        # The top recipes are retrieved on the profiled thread
+        stats = pstats.Stats(os.path.join(self._dir.name, 'API_GET_RECIPE.pstats'))
+        if not any(function == 'api_get_recipe' for _, _, function in stats.stats):
+            return False
+        # A script that runs out ends the session
+        app = ProfilerTest.QuietProfiledTakeHomeApplication(Profiler(), ['milk'], food2fork_client=self._client)
+        app.main()
+        return app.lines[-1] == "Script ended at prompt 'Enter single ingredient (leave blank if done):'"
+
+    def _tear_down(self):
+        self._client.close()
+        self._standin.stop()
+        self._dir.cleanup()
+
+class TelemetryTestSuite(TestSuite):
+    TITLE = 'Telemetry Tests'
+    TESTS = [
+        MetricsRegistryTest,
+        ProfilerTest
+    ]
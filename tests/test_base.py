@@ -1,12 +1,72 @@
 """@package test_base
 This package includes the base functionally for the test suites and tests
 """
+from concurrent.futures import ProcessPoolExecutor
+import contextlib
+import io
+import multiprocessing
+import time
+import traceback
+
+## Shared fixture instances of this process, by name
+_fixtures = {}
+
+def get_fixture(name, factory):
+    """
+    This function returns the process-wide instance of a shared fixture, creating it on first use
+
+    :param name:
+        The name of the fixture
+    :param factory:
+        callable creating the fixture
+    :return:
+        The fixture
+    """
+    if name not in _fixtures:
+        _fixtures[name] = factory()
+    return _fixtures[name]
+
+def preload_fixtures(test_classes):
+    """
+    This function creates the shared fixtures of the tests ahead of time, so processes forked afterwards inherit them
+
+    :param test_classes:
+        iterable of Test subclasses
+    """
+    for test_class in test_classes:
+        for name, factory in test_class.SHARED_FIXTURES.items():
+            get_fixture(name, factory)
+
+def time_test(test_class, capture_output=False):
+    """
+    This function runs a test and times it. An exception raised by the test fails it.
+
+    :param test_class:
+        The Test subclass to run
+    :param capture_output: (Optional)
+        True - return what the test printed instead of printing it
+        False - print as the test runs
+    :return:
+        passed, wall time in seconds, printed output (None unless captured)
+    """
+    output = io.StringIO() if capture_output else None
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output) if capture_output else contextlib.nullcontext():
+        try:
+            passed = test_class().run_test()
+        except Exception:
+            traceback.print_exc(file=output)
+            print("**** Test Failed! ****")
+            passed = False
+    return bool(passed), time.perf_counter() - start, output.getvalue() if capture_output else None
 
 class Test:
     """
     The base test class used for each unit test
     """
     TITLE = 'Untitled Test'
+    ## Fixtures the test only reads, by name: factory. They are created once per process and shared by the tests.
+    SHARED_FIXTURES = {}
 
     def _setup(self):
         """
@@ -30,6 +90,13 @@ class Test:
         """
         pass
 
+    def _fixture(self, name):
+        """
+        :return:
+            the shared fixture named in SHARED_FIXTURES
+        """
+        return get_fixture(name, self.SHARED_FIXTURES[name])
+
     def run_test(self):
         """
         Run the test.
@@ -51,16 +118,92 @@ class TestSuite:
     TESTS = []
 
     @classmethod
-    def run_suite(cls):
+    def run_suite(cls, timings=None):
         """
         Runs all tests in the test suite
 
+        :param timings: (Optional)
+            list to append (suite title, test title, seconds, passed) to for each test
+
         :return:
             Title of test suite, number of passing tests, total number of tests
         """
         num_success = 0
         for test in cls.TESTS:
-            t = test()
-            if t.run_test():
+            passed, elapsed, _ = time_test(test)
+            if passed:
                 num_success += 1
-        return cls.TITLE, num_success, len(cls.TESTS)
\ No newline at end of file
+            if timings is not None:
+                timings.append((cls.TITLE, test.TITLE, elapsed, passed))
+        return cls.TITLE, num_success, len(cls.TESTS)
+
+class ParallelTestRunner:
+    """
+    This class runs the tests of several suites on a process pool.
+
+    Shared fixtures are created before the pool is started, so with the fork start method every worker inherits them
+    instead of loading its own. Each test's output is captured and printed in suite and test order once it is done,
+    so the output and results are the same as a serial run whatever order the tests finish in.
+    """
+    WORKERS = 4
+
+    def __init__(self, workers=None):
+        """
+        Constructor function
+
+        :param workers: (Optional)
+            The number of worker processes, WORKERS by default
+        """
+        self._workers = workers or ParallelTestRunner.WORKERS
+        ## (suite title, test title, seconds, passed) of each test run, in order
+        self.timings = []
+
+    def _mp_context(self):
+        """
+        :return:
+            the fork multiprocessing context where available, the default one otherwise
+        """
+        if 'fork' in multiprocessing.get_all_start_methods():
+            return multiprocessing.get_context('fork')
+        return multiprocessing.get_context()
+
+    def run(self, suites):
+        """
+        Runs all tests of the suites
+
+        :param suites:
+            list of TestSuite subclasses
+
+        :return:
+            list of (title of test suite, number of passing tests, total number of tests)
+        """
+        preload_fixtures(test for suite in suites for test in suite.TESTS)
+        results = []
+        with ProcessPoolExecutor(max_workers=self._workers, mp_context=self._mp_context()) as executor:
+            futures = [[executor.submit(time_test, test, True) for test in suite.TESTS] for suite in suites]
+            for suite, suite_futures in zip(suites, futures):
+                num_success = 0
+                for test, future in zip(suite.TESTS, suite_futures):
+                    passed, elapsed, output = future.result()
+                    print(output, end='')
+                    if passed:
+                        num_success += 1
+                    self.timings.append((suite.TITLE, test.TITLE, elapsed, passed))
+                results.append((suite.TITLE, num_success, len(suite.TESTS)))
+        return results
+
+def format_slowest(timings, n):
+    """
+    This function formats the slowest tests as a table
+
+    :param timings:
+        list of (suite title, test title, seconds, passed)
+    :param n:
+        The number of tests to list
+    :return:
+        list of lines
+    """
+    lines = ["%-10s  %-6s  %s" % ('seconds', 'result', 'test',)]
+    for suite_title, test_title, elapsed, passed in sorted(timings, key=lambda x: -x[2])[:n]:
+        lines.append("%10.3f  %-6s  %s: %s" % (elapsed, 'pass' if passed else 'FAIL', suite_title, test_title,))
+    return lines
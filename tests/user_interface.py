@@ -2,7 +2,14 @@
 This package includes the UI state machine and text processing tests
 """
 from tests.test_base import Test, TestSuite
-from takehome import TakeHomeApplication, TakeHomeAppState, UnknownTakeHomeAppStateException
+from takehome import TakeHomeApplication, TakeHomeAppState, UnknownTakeHomeAppStateException, TakeHomeBatchRunner
+from takehome_service import TakeHomeService
+import asyncio
+import http.client
+import io
+import json
+import threading
+import time
 
 class InvalidTakeHomeAppStateTest(Test):
     TITLE = 'InvalidTakeHomeAppState'
@@ -174,9 +181,19 @@ class TakeHomeAppElaboratePossibilitiesTest(Test):
         self._app = TakeHomeApplication()
 
     def _run_test(self):
-        self._app._spelling_suggestions = []
-        self._app._elaborate_possibilities([['peanut', 'cocoa'], ['butter', 'something']])
-        if self._app._spelling_suggestions != ['peanut butter', 'peanut something', 'cocoa butter', 'cocoa something']:
+        possibilities = list(self._app._elaborate_possibilities([['peanut', 'cocoa'], ['butter', 'something']]))
+        if possibilities != ['peanut butter', 'peanut something', 'cocoa butter', 'cocoa something']:
+            return False
+        # Ordered by combined rank, stops at max_possibilities
+        possibilities = list(self._app._elaborate_possibilities([['a', 'b', 'c'], ['x'], ['1', '2', '3']], 5))
+        if possibilities != ['a x 1', 'a x 2', 'b x 1', 'a x 3', 'b x 2']:
+            print("FAILED: %s" % (possibilities,))
+            return False
+        if list(self._app._elaborate_possibilities([['flour']])) != ['flour']:
+            return False
+        # Lazy, the first possibility doesn't depend on the number of words
+        possibilities = self._app._elaborate_possibilities([['word', 'suggestion']] * 200)
+        if next(possibilities) != ' '.join(['word'] * 200):
             return False
         return True
 
@@ -224,6 +241,270 @@ class TakeHomeAppWaitAPIAttemptsTest(Test):
         TakeHomeApplication.RETRY_WAIT_TIMEOUT = self._saved_timeout
         self._app = None
 
+class DummyFood2ForkClient:
+    """
+    Stands in for the Food2Fork client, answering every request with the next queued response
+    """
+    def __init__(self, responses, retry_after=None):
+        self.responses = list(responses)
+        self.retry_after = retry_after
+        self.num_requests = 0
+
+    def _next_response(self):
+        self.num_requests += 1
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+        return self._next_response()
+
+    def api_get_recipe(self, rId):
+        return self._next_response()
+
+    def last_retry_after(self):
+        return self.retry_after
+
+class TakeHomeAppAPIRetryTest(StateTest):
+    TITLE = 'TakeHome AppState - API retries'
+
+    def _setup(self):
+        super(TakeHomeAppAPIRetryTest, self)._setup()
+        self._saved_timeout = TakeHomeApplication.RETRY_WAIT_TIMEOUT
+        TakeHomeApplication.RETRY_WAIT_TIMEOUT = 0.01
+
+    def _search(self, responses, retry_after=None):
+        self._app._food2fork_client = DummyFood2ForkClient(responses, retry_after)
+        self._app._api_attempts = TakeHomeApplication.MAX_API_ATTEMPTS
+        self._app._state = TakeHomeAppState.API_SEARCH
+        while self._app.app_state() == TakeHomeAppState.API_SEARCH:
+            self._app._process_state()
+        return self._app._food2fork_client.num_requests
+
+    def _run_test(self):
+        # Retryable errors (including connection errors) are retried until one succeeds
+        if self._search([(503, 'Service Unavailable'), ConnectionResetError(), (200, {'recipes': [{'recipe_id': '1'}]})]) != 3:
+            return False
+        if self._app.app_state() != TakeHomeAppState.API_GET_RECIPE or self._app._recipe_id != '1':
+            return False
+        # Fatal errors are not retried
+        if self._search([(403, 'Forbidden')]) != 1 or self._app.app_state() != TakeHomeAppState.ERROR:
+            return False
+        # Neither is a Retry-After that is too long
+        if self._search([(429, 'Too Many Requests')], retry_after=3600) != 1:
+            return False
+        # Gives up after MAX_API_ATTEMPTS (after a success, which closes the circuit)
+        self._app._retry_policy.circuit_breaker.record_success()
+        if self._search([(500, 'Internal Server Error')] * 10) != TakeHomeApplication.MAX_API_ATTEMPTS:
+            return False
+        if self._app._error_message != 'Maximum API attempts exceeded':
+            return False
+        # Which also opens the circuit breaker, so the next search fails fast
+        if self._search([(200, {'recipes': [{'recipe_id': '1'}]})]) != 0 or self._app.app_state() != TakeHomeAppState.ERROR:
+            return False
+        return True
+
+    def _tear_down(self):
+        TakeHomeApplication.RETRY_WAIT_TIMEOUT = self._saved_timeout
+        super(TakeHomeAppAPIRetryTest, self)._tear_down()
+
+class TakeHomeAppTopKRecipesTest(StateTest):
+    TITLE = 'TakeHome AppState - API_GET_RECIPE top K'
+
+    class RecipeDummyClient(DummyFood2ForkClient):
+        RECIPES = {
+            '1': ['1 cup sugar', '2 eggs', '1 cup flour', '1 tsp vanilla'],
+            '2': ['1 cup sugar', '1 cup butter'],
+            '3': ['1 cup sugar', '1 cup milk']
+        }
+
+        def api_get_recipe(self, rId):
+            self.num_requests += 1
+            if rId == 'error':
+                return 500, 'Internal Server Error'
+            time.sleep(0.1)
+            return 200, {'recipe': {'title': rId, 'f2f_url': 'url', 'ingredients': self.RECIPES[rId]}}
+
+    class ThrottledDummyClient(DummyFood2ForkClient):
+        """
+        Answers 429 with a Retry-After that is only visible to the thread that made the request, like BasicRESTClient
+        """
+        def __init__(self, retry_after):
+            super(TakeHomeAppTopKRecipesTest.ThrottledDummyClient, self).__init__([])
+            self._local = threading.local()
+            self._throttle_retry_after = retry_after
+
+        def api_get_recipe(self, rId):
+            self._local.retry_after = self._throttle_retry_after
+            return 429, 'Too Many Requests'
+
+        def last_retry_after(self):
+            return getattr(self._local, 'retry_after', None)
+
+    def _run_test(self):
+        self._app._food2fork_client = TakeHomeAppTopKRecipesTest.RecipeDummyClient([])
+        self._app._curr_ingredients = ['sugar', 'butter']
+        self._app._recipe_ids = ['1', 'error', '3', '2']
+        self._app._api_attempts = TakeHomeApplication.MAX_API_ATTEMPTS
+        self._app._state = TakeHomeAppState.API_GET_RECIPE
+        start = time.perf_counter()
+        self._app._process_state()
+        # Fetched concurrently, in about one round trip
+        if time.perf_counter() - start > 0.25 or self._app._food2fork_client.num_requests != 4:
+            return False
+        # '2' misses no ingredients, '3' misses one
+        if self._app.app_state() != TakeHomeAppState.DISPLAY_RESULTS or self._app._recipe_title != '2':
+            return False
+        # Ties go to the better search rank
+        self._app._curr_ingredients = ['sugar']
+        self._app._recipe_ids = ['1', '3', '2']
+        self._app._state = TakeHomeAppState.API_GET_RECIPE
+        self._app._process_state()
+        if self._app._recipe_title != '3':
+            return False
+        # The Retry-After of a recipe fetched on a pool thread is honoured, one that is too long is fatal
+        self._app._food2fork_client = TakeHomeAppTopKRecipesTest.ThrottledDummyClient(3600)
+        self._app._api_attempts = TakeHomeApplication.MAX_API_ATTEMPTS
+        self._app._state = TakeHomeAppState.API_GET_RECIPE
+        self._app._process_state()
+        if self._app.app_state() != TakeHomeAppState.ERROR or self._app._api_attempts != TakeHomeApplication.MAX_API_ATTEMPTS:
+            return False
+        return True
+
+class TakeHomeBatchRunnerTest(Test):
+    TITLE = 'TakeHomeBatchRunner'
+
+    class DummySpellChecker:
+        SUGGESTIONS = {'suga': ['sugar', 'saga'], 'buter': ['butter']}
+
+        def get(self):
+            return self
+
+        def is_loaded(self):
+            return True
+
+        def close(self):
+            pass
+
+        def spell_check_many(self, words):
+            return [(word not in self.SUGGESTIONS, word, self.SUGGESTIONS.get(word, [])) for word in words]
+
+    class BatchDummyClient(TakeHomeAppTopKRecipesTest.RecipeDummyClient):
+        def api_search(self, q=None, sort=None, page=None, max_recipes=None):
+            if q == 'nothing':
+                return 200, {'count': 0, 'recipes': []}
+            if q == 'boom':
+                raise ValueError('bad page')
+            # Later lines finish first
+            time.sleep(0.1 if 'sugar' in q else 0.0)
+            return 200, {'count': 3, 'recipes': [{'recipe_id': '1'}, {'recipe_id': '3'}, {'recipe_id': '2'}][:max_recipes]}
+
+        def close(self):
+            pass
+
+    def _setup(self):
+        self._runner = TakeHomeBatchRunner(TakeHomeBatchRunnerTest.BatchDummyClient([]),
+                                           TakeHomeBatchRunnerTest.DummySpellChecker(), workers=4, top_k=3)
+        self._lines = ['["suga", "buter"]', '', 'not json', '{"id": 7, "ingredients": ["nothing"]}', '["sugar", "42"]',
+                       '{"ingredients": ["milk"]}', '["boom"]']
+
+    def _run_test(self):
+        out = io.StringIO()
+        self._runner.run_to_file(self._lines, out)
+        results = [json.loads(line) for line in out.getvalue().splitlines()]
+        if [result['line'] for result in results] != [1, 3, 4, 5, 6, 7]:
+            return False
+        first = results[0]
+        if first['ingredients'] != ['sugar', 'butter'] or first['corrections'] != {'suga': 'sugar', 'buter': 'butter'}:
+            return False
+        if first['recipe']['recipe_id'] != '2' or first['recipe']['missing_ingredients'] != []:
+            return False
+        if results[1]['error'] != 'Invalid JSON' or results[2]['id'] != 7 or 'No recipe' not in results[2]['error']:
+            return False
+        if results[3]['error'] != 'Invalid ingredient: 42' or results[4]['recipe']['recipe_id'] != '3':
+            return False
+        # An unexpected exception is only reported as that line's error, not as bad JSON
+        if results[5]['error'] != 'Unexpected error: ValueError: bad page':
+            return False
+        unordered = [result['line'] for result in self._runner.run(self._lines, ordered=False)]
+        if sorted(unordered) != [1, 3, 4, 5, 6, 7] or unordered[-1] != 1:
+            return False
+        return True
+
+    def _tear_down(self):
+        self._runner.close()
+
+class TakeHomeServiceTest(Test):
+    TITLE = 'TakeHomeService'
+
+    def _setup(self):
+        self._service = TakeHomeService(TakeHomeBatchRunnerTest.BatchDummyClient([]), TakeHomeBatchRunnerTest.DummySpellChecker())
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._port = asyncio.run_coroutine_threadsafe(self._service.start('127.0.0.1', 0), self._loop).result()[1]
+
+    def _request(self, conn, method, path, obj=None):
+        conn.request(method, path, body=None if obj is None else json.dumps(obj))
+        response = conn.getresponse()
+        data = response.read()
+        return response.status, json.loads(data) if data else None
+
+    def _raise_error(self):
+        raise RuntimeError('Session failure')
+
+    def _run_test(self):
+        conn = http.client.HTTPConnection('127.0.0.1', self._port, timeout=5)
+        status, first = self._request(conn, 'POST', '/sessions')
+        if status != 201 or first['state'] != 'ENTER_INGREDIENT' or not first['prompt'].startswith('Enter single ingredient'):
+            return False
+        other_conn = http.client.HTTPConnection('127.0.0.1', self._port, timeout=5)
+        second = self._request(other_conn, 'POST', '/sessions')[1]
+        if self._request(conn, 'GET', '/health')[1]['sessions'] != 2:
+            return False
+        # The suggestions are output once, then the prompt for the selection
+        session_url = '/sessions/%s/input' % (first['session'],)
+        response = self._request(conn, 'POST', session_url, {'input': 'suga'})[1]
+        if response['state'] != 'SPELL_CHECK_SUGGESTIONS' or response['output'][1:3] != ['1. suga', '2. sugar']:
+            return False
+        response = self._request(conn, 'POST', session_url, {'input': '9'})[1]
+        if response['output'] != ['Invalid selection, must be between 1 and 4', 'Not sure if you spelled the ingredient correctly? Choose from below:',
+                                  '1. suga', '2. sugar', '3. saga', '4. Reenter ingredient']:
+            return False
+        self._request(conn, 'POST', session_url, {'input': '2'})
+        response = self._request(conn, 'POST', session_url, {'input': ''})[1]
+        if not response['finished'] or response['output'][0] != 'Recipe Title: 1' or response['prompt'] is not None:
+            return False
+        # Finished sessions are removed, the other session is unaffected
+        if self._request(conn, 'POST', session_url, {'input': ''})[0] != 404:
+            return False
+        if self._request(other_conn, 'POST', '/sessions/%s/input' % (second['session'],), {'input': 'milk'})[1]['state'] != 'ENTER_INGREDIENT':
+            return False
+        if self._request(other_conn, 'DELETE', '/sessions/%s' % (second['session'],))[0] != 204:
+            return False
+        health = self._request(other_conn, 'GET', '/health')[1]
+        if health['sessions'] != 0 or health['in_flight'] != 0 or self._request(other_conn, 'GET', '/missing')[0] != 404:
+            return False
+        # A session raising gets a 500 and its connection closed, the service keeps serving
+        third = self._request(other_conn, 'POST', '/sessions')[1]
+        self._service._sessions[third['session']].advance = self._raise_error
+        other_conn.request('POST', '/sessions/%s/input' % (third['session'],), body=json.dumps({'input': 'milk'}))
+        response = other_conn.getresponse()
+        if response.status != 500 or response.getheader('Connection') != 'close' or 'error' not in json.loads(response.read()):
+            return False
+        if self._request(other_conn, 'GET', '/health')[1]['in_flight'] != 0:
+            return False
+        conn.close()
+        other_conn.close()
+        return True
+
+    def _tear_down(self):
+        asyncio.run_coroutine_threadsafe(self._service.stop(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
 class UserInterfaceTestSuite(TestSuite):
     TITLE = 'User Interface/State Machine Tests'
     TESTS = [
@@ -234,5 +515,9 @@ class UserInterfaceTestSuite(TestSuite):
         TakeHomeAppSpellingSuggestionStateTest,
         TakeHomeAppElaboratePossibilitiesTest,
         TakeHomeAppIsIngredientInCurrTest,
-        TakeHomeAppWaitAPIAttemptsTest
+        TakeHomeAppWaitAPIAttemptsTest,
+        TakeHomeAppAPIRetryTest,
+        TakeHomeAppTopKRecipesTest,
+        TakeHomeBatchRunnerTest,
+        TakeHomeServiceTest
     ]
\ No newline at end of file